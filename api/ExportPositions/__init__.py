@@ -0,0 +1,91 @@
+import azure.functions as func
+import json
+import re
+from datetime import datetime
+
+from ..shared_code import assignment_stats, position_export, position_index, timing
+
+FORMATS = {
+    'csv': ('text/csv', position_export.write_csv),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', position_export.write_xlsx),
+}
+
+
+def _filename(req, report, fmt):
+    name = req.params.get('filename')
+    if not name:
+        if report == 'travel_aging':
+            name = f"Travel_Aging_Report_{datetime.utcnow().date().isoformat()}"
+        else:
+            name = 'Updated_Positions'
+    name = re.sub(r'[^\w.\- ]', '_', name)
+    return name if name.lower().endswith('.' + fmt) else f"{name}.{fmt}"
+
+
+@timing.timed
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    GET: open positions with their levers, margin, next step, AV open date,
+    scheduled interviews and session log, as a file download: the columns
+    the page's Export buttons write.
+
+    ?format=csv (default) or xlsx
+    ?report=travel_aging: the Travel Aging Report (16+ days open, travel
+    nursing, at most one lever pulled) instead of every position
+    ?systems= ?facilities= ?categories= ?specialties= ?sources= ?q=: the
+    same filters as GetPositions
+    ?tz=: the viewer's getTimezoneOffset(), for days past
+    ?filename=: download name
+
+    Positions are read from the database in batches rather than from the
+    positions cache, so the export reflects the tables as they are now.
+    """
+    try:
+        fmt = req.params.get('format', 'csv')
+        report = req.params.get('report', 'positions')
+        if fmt not in FORMATS or report not in position_export.REPORTS:
+            return func.HttpResponse(
+                json.dumps({'error': f"Unsupported export: format={fmt}, report={report}"}),
+                mimetype="application/json",
+                status_code=400
+            )
+        if fmt == 'xlsx' and position_export.openpyxl is None:
+            return func.HttpResponse(
+                json.dumps({'error': 'XLSX export is not available; use format=csv'}),
+                mimetype="application/json",
+                status_code=400
+            )
+
+        try:
+            selections = position_index.parse_selections(req.params)
+            now = assignment_stats.local_now(int(req.params.get('tz', '0')))
+        except ValueError as e:
+            return func.HttpResponse(
+                json.dumps({'error': str(e)}),
+                mimetype="application/json",
+                status_code=400
+            )
+
+        mimetype, write = FORMATS[fmt]
+        rows = position_export.iter_rows(selections, req.params.get('q'), report, now)
+        body, count = write(rows, report)
+        print(f"Exported {count} positions ({report}, {fmt}, {len(body)} bytes)")
+
+        return func.HttpResponse(
+            body,
+            mimetype=mimetype,
+            status_code=200,
+            headers={
+                'Content-Disposition': f'attachment; filename="{_filename(req, report, fmt)}"',
+                'X-Export-Rows': str(count),
+            }
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
@@ -0,0 +1,67 @@
+import azure.functions as func
+import json
+import os
+
+from ..shared_code import cache, open_positions, responses, timing
+
+# Short-lived: candidates are opened one position at a time, often repeatedly
+candidates_cache = cache.get_cache(
+    'candidates',
+    ttl_seconds=int(os.environ.get('CANDIDATES_CACHE_TTL', '60')),
+    check_seconds=int(os.environ.get('CANDIDATES_CACHE_TTL', '60')),
+    max_entries=int(os.environ.get('CANDIDATES_CACHE_ENTRIES', '500'))
+)
+
+# Upper bound on positions per call, to keep the single IN list parameter sane
+MAX_IDS = 2000
+
+@timing.timed
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Candidates (submissions) for one or more open positions, in the same
+    shape GetPositions nests them under each position.
+
+    GET ?id=<position id> or ?ids=<id>,<id>,...
+    POST {"ids": [...]} for batches too long for a URL.
+
+    Returns {"candidates": {"<position id>": [ ... ], ...}}.
+    """
+    try:
+        if req.method == 'POST':
+            try:
+                ids = (req.get_json() or {}).get('ids') or []
+            except ValueError:
+                ids = []
+        else:
+            ids = (req.params.get('ids') or req.params.get('id') or '').split(',')
+
+        ids = sorted({str(i).strip() for i in ids if str(i).strip()})
+        if not ids:
+            return func.HttpResponse(
+                json.dumps({'error': 'No position ids given'}),
+                mimetype="application/json",
+                status_code=400
+            )
+        if len(ids) > MAX_IDS:
+            return func.HttpResponse(
+                json.dumps({'error': f'At most {MAX_IDS} position ids per request'}),
+                mimetype="application/json",
+                status_code=400
+            )
+
+        # No version check: entries simply expire after the TTL
+        body = candidates_cache.get(
+            ','.join(ids),
+            lambda: None,
+            lambda: open_positions.candidates_body(ids)
+        )
+        return responses.json_response(req, body)
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
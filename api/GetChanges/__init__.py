@@ -1,41 +1,144 @@
 import azure.functions as func
-import pyodbc
-import os
+import base64
 import json
+import os
+
+from ..shared_code import current_state, db, payloads, timing
+
+PAGE_SIZE = int(os.environ.get('CHANGES_PAGE_SIZE', '1000'))
+MAX_PAGE_SIZE = 5000
+
+CHANGES_SQL = '''
+    SELECT TOP (?) id, timestamp, jobid, change_type, change_data, user_name, change_blob
+    FROM dbo.ghr_changes
+    WHERE {where}
+    ORDER BY timestamp, id
+'''
+
+# Only the newest change per (job, type, state key): replaying these gives
+# the same levers, margins and next steps as replaying the full history
+LATEST_SQL = '''
+    WITH ranked AS (
+        SELECT id, timestamp, jobid, change_type, change_data, user_name, change_blob,
+               ROW_NUMBER() OVER (
+                   PARTITION BY jobid, change_type, {state_key}
+                   ORDER BY timestamp DESC, id DESC
+               ) AS rn
+        FROM dbo.ghr_changes
+        WHERE {filters}
+    )
+    SELECT TOP (?) id, timestamp, jobid, change_type, change_data, user_name, change_blob
+    FROM ranked
+    WHERE {where}
+    ORDER BY timestamp, id
+'''
+
+KEYSET = '(timestamp > ? OR (timestamp = ? AND id > ?))'
+
+# Query parameter -> column compared
+FILTERS = (
+    ('jobId', 'jobid = ?'),
+    ('type', 'change_type = ?'),
+    ('user', 'user_name = ?'),
+    ('from', 'timestamp >= ?'),
+    ('to', 'timestamp < ?'),
+)
+
+
+def _timestamp_text(value):
+    # Millisecond text converts back to DATETIME and DATETIME2 exactly
+    if hasattr(value, 'isoformat'):
+        if value.microsecond % 1000 == 0:
+            return value.isoformat(sep=' ', timespec='milliseconds')
+        return value.isoformat(sep=' ')
+    return str(value)
+
+
+def _encode_cursor(row):
+    return base64.urlsafe_b64encode(json.dumps([_timestamp_text(row[1]), row[0]]).encode('utf-8')).decode('ascii')
+
 
+def _decode_cursor(cursor):
+    timestamp, change_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return timestamp, change_id
+
+
+def _encode_change(row):
+    # change_data is already JSON (SaveChange wrote it with json.dumps), so
+    # splice it in rather than parsing and re-encoding every payload
+    return (
+        '{"id": ' + json.dumps(row[0]) +
+        ', "timestamp": ' + json.dumps(row[1].isoformat() if row[1] else None) +
+        ', "jobId": ' + json.dumps(row[2]) +
+        ', "type": ' + json.dumps(row[3]) +
+        ', "data": ' + (payloads.decode(row[6], row[4]) or '{}') +
+        ', "user": ' + json.dumps(row[5]) + '}'
+    )
+
+
+@timing.timed
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Saved changes, oldest first, one page at a time. Pass the response's
+    nextCursor back as ?cursor= for the next page; it is null on the last.
+
+    ?limit=      page size (default CHANGES_PAGE_SIZE, at most 5000)
+    ?jobId= ?type= ?user=   exact matches
+    ?from= ?to=  timestamp range, from inclusive, to exclusive
+    ?mode=latest only the newest change per job and lever/candidate/field,
+                 enough to rebuild the current state of every position
+    """
     try:
-        conn = pyodbc.connect(
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={os.environ['DB_HOST']};"
-            f"DATABASE={os.environ['CHANGES_DB']};"
-            f"UID={os.environ['DB_USER']};"
-            f"PWD={os.environ['DB_PASSWORD']};"
-            f"TrustServerCertificate=yes"
-        )
-        
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, timestamp, jobid, change_type, change_data, user_name
-            FROM dbo.ghr_changes
-            ORDER BY timestamp ASC
-        ''')
-        
-        changes = []
-        for row in cursor.fetchall():
-            change = {
-                'id': row[0],
-                'timestamp': row[1].isoformat() if row[1] else None,
-                'jobId': row[2],
-                'type': row[3],
-                'data': json.loads(row[4]) if row[4] else {},
-                'user': row[5]
-            }
-            changes.append(change)
-        
-        conn.close()
+        try:
+            limit = min(max(int(req.params.get('limit') or PAGE_SIZE), 1), MAX_PAGE_SIZE)
+            after = _decode_cursor(req.params['cursor']) if req.params.get('cursor') else None
+        except (ValueError, TypeError):
+            return func.HttpResponse(
+                json.dumps({'error': 'Invalid limit or cursor', 'changes': []}),
+                mimetype="application/json",
+                status_code=400
+            )
+
+        filters = []
+        params = []
+        for name, predicate in FILTERS:
+            value = req.params.get(name)
+            if value:
+                filters.append(predicate)
+                params.append(value)
+
+        keyset = [KEYSET] if after else []
+        keyset_params = [after[0], after[0], after[1]] if after else []
+
+        if req.params.get('mode') == 'latest':
+            sql = LATEST_SQL.format(
+                state_key=current_state.STATE_KEY_SQL,
+                filters=' AND '.join(filters) or '1 = 1',
+                where=' AND '.join(['rn = 1'] + keyset)
+            )
+            params = params + [limit + 1] + keyset_params
+        else:
+            sql = CHANGES_SQL.format(where=' AND '.join(filters + keyset) or '1 = 1')
+            params = [limit + 1] + params + keyset_params
+
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
+            with timing.phase('changes execute'):
+                cursor.execute(sql, params)
+            with timing.phase('changes fetch') as phase:
+                rows = cursor.fetchall()
+                phase.rows = len(rows)
+
+        next_cursor = _encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        with timing.phase('serialize') as phase:
+            body = (
+                '{"changes": [' + ', '.join(_encode_change(row) for row in rows[:limit]) + ']' +
+                ', "nextCursor": ' + json.dumps(next_cursor) + '}'
+            )
+            phase.bytes = len(body)
+
         return func.HttpResponse(
-            json.dumps({'changes': changes}),
+            body,
             mimetype="application/json",
             status_code=200
         )
@@ -44,4 +147,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({'error': str(e), 'changes': []}),
             mimetype="application/json",
             status_code=200
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,29 @@
+import azure.functions as func
+import json
+
+from ..shared_code import current_state, db, responses, timing
+
+@timing.timed
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    The current state of every changed position, from
+    dbo.position_current_state: {"jobs": {"<job id>": [changes...]}}.
+    Each job's list holds only the newest change per lever / field /
+    candidate, in the GetChanges format, so replaying it in order gives the
+    same position as replaying the full change log.
+    """
+    try:
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
+            with timing.phase('current state') as phase:
+                body = current_state.load_body(cursor)
+                phase.bytes = len(body)
+        
+        return responses.json_response(req, body)
+    except Exception as e:
+        print(f"Error: {e}")
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
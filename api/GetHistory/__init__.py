@@ -1,39 +1,43 @@
 import azure.functions as func
-import pyodbc
-import os
 import json
 
+from ..shared_code import db, history
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    GET: the newest 100 snapshots, newest first, as metadata only
+    (id, timestamp, changeCount).
+
+    GET ?id=<snapshot id>: that one snapshot with its change list in
+    ``data``, rebuilt from the nearest checkpoint if need be.
+    """
     try:
-        conn = pyodbc.connect(
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={os.environ['DB_HOST']};"
-            f"DATABASE={os.environ['CHANGES_DB']};"
-            f"UID={os.environ['DB_USER']};"
-            f"PWD={os.environ['DB_PASSWORD']};"
-            f"TrustServerCertificate=yes"
-        )
+        snapshot_id = req.params.get('id')
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
+            if snapshot_id:
+                row = history.load_snapshot(cursor, int(snapshot_id)) if snapshot_id.isdigit() else None
+                if row is None:
+                    return func.HttpResponse(
+                        json.dumps({'error': f'History snapshot {snapshot_id} not found'}),
+                        mimetype="application/json",
+                        status_code=404
+                    )
+                body = {
+                    'id': row['id'],
+                    'timestamp': row['timestamp'],
+                    'changeCount': row['changeCount'],
+                    'data': row['data'] or {}
+                }
+            else:
+                body = [{
+                    'id': row['id'],
+                    'timestamp': row['timestamp'],
+                    'changeCount': row['changeCount']
+                } for row in reversed(history.load_snapshots(cursor))]
         
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT TOP 100 id, snapshot_timestamp, change_count, snapshot_data
-            FROM dbo.ghr_history_snapshots
-            ORDER BY snapshot_timestamp DESC
-        ''')
-        
-        snapshots = []
-        for row in cursor.fetchall():
-            snapshot = {
-                'id': row[0],
-                'timestamp': row[1].isoformat() if row[1] else None,
-                'changeCount': row[2],
-                'data': json.loads(row[3]) if row[3] else {}
-            }
-            snapshots.append(snapshot)
-        
-        conn.close()
         return func.HttpResponse(
-            json.dumps(snapshots),
+            json.dumps(body),
             mimetype="application/json",
             status_code=200
         )
@@ -42,4 +46,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({'error': str(e)}),
             mimetype="application/json",
             status_code=500
-        )
\ No newline at end of file
+        )
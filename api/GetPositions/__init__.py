@@ -1,336 +1,278 @@
 import azure.functions as func
-import pyodbc
-import os
+import hashlib
 import json
+import os
+import threading
+from collections import OrderedDict
+
+from ..shared_code import cache, columnar, health_systems, open_positions, position_index, responses, timing
+
+positions_cache = cache.get_cache(
+    'positions',
+    ttl_seconds=int(os.environ.get('POSITIONS_CACHE_TTL', '900')),
+    check_seconds=int(os.environ.get('POSITIONS_CACHE_CHECK_SECONDS', '30'))
+)
+
+# Per-position fingerprints of recent snapshots, keyed by delta cursor
+CURSOR_HEADER = 'X-Positions-Cursor'
+DELTA_HISTORY = int(os.environ.get('POSITIONS_DELTA_HISTORY', '20'))
+_cursor_history = OrderedDict()
+_cursor_history_lock = threading.Lock()
+
+# Filter, sort and page parameters (see _query_body)
+QUERY_PARAMS = tuple(position_index.FACETS) + ('q', 'sort', 'page', 'pageSize')
+QUERY_PAGE_SIZE = int(os.environ.get('POSITIONS_QUERY_PAGE_SIZE', '50'))
+QUERY_MAX_PAGE_SIZE = 500
+
+
+def _stream_ndjson():
+    """
+    Every open position as one JSON line, built from fetchmany batches. The
+    v1 HTTP binding needs the whole body before it responds, so the encoded
+    lines are kept; the rows, dicts and candidate lists are not.
+    """
+    lines = []
+    count = 0
+    for position in open_positions.iter_positions():
+        lines.append(json.dumps(position, default=str))
+        lines.append('\n')
+        count += 1
+    print(f"Streamed {count} positions as NDJSON")
+    return ''.join(lines)
+
+
+def _data_version():
+    # Saved mappings change every position's health_system_normalized
+    return (open_positions.data_version(), health_systems.version())
+
+
+def _fingerprint(encoded):
+    # Not hash(): that is salted per process (PYTHONHASHSEED)
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _build_payload():
+    positions = open_positions.load_positions()
+
+    b4_count = len([p for p in positions if p.get('source_system') == 'B4'])
+    vndly_count = len([p for p in positions if p.get('source_system') == 'VNDLY'])
+    print(f"Built {len(positions)} positions (B4: {b4_count}, VNDLY: {vndly_count})")
+
+    # Encode each position once; the full body and delta responses reuse the fragments
+    with timing.phase('serialize') as phase:
+        entries = []
+        for position in positions:
+            encoded = json.dumps(position, default=str)
+            entries.append((position['position_id'], encoded, _fingerprint(encoded)))
+
+        body = '[' + ', '.join(encoded for _, encoded, _ in entries) + ']'
+        phase.rows = len(entries)
+        phase.bytes = len(body)
+    etag = responses.etag_for(body)
+    cursor = etag.strip('"')
+
+    fingerprints = {position_id: fingerprint for position_id, _, fingerprint in entries}
+    with _cursor_history_lock:
+        _cursor_history[cursor] = fingerprints
+        _cursor_history.move_to_end(cursor)
+        while len(_cursor_history) > DELTA_HISTORY:
+            _cursor_history.popitem(last=False)
+
+    return {
+        'body': body,
+        'etag': etag,
+        'cursor': cursor,
+        'entries': entries,
+        'positions': positions,
+        'variants': {},
+        'lock': threading.Lock(),
+    }
+
+
+def _slim_entries(payload):
+    """Each position's slim JSON, in payload['entries'] order, encoded on first use."""
+    with payload['lock']:
+        if 'slim_entries' not in payload:
+            with timing.phase('serialize slim entries') as phase:
+                payload['slim_entries'] = [json.dumps(_slim(p), default=str) for p in payload['positions']]
+                phase.rows = len(payload['positions'])
+        return payload['slim_entries']
+
+
+def _slim(position):
+    """
+    A position without its candidate list. The submit dates of candidates
+    still in play are kept for the pending-days KPI; GetCandidates serves
+    the rest when a position is opened.
+    """
+    slim = {key: value for key, value in position.items() if key != 'candidates'}
+    slim['activeSubmitDates'] = [
+        c['submitDate'] for c in position['candidates'] if not c['isDeclined'] and c['submitDate']
+    ]
+    return slim
+
+
+def _encode_variant(positions, name):
+    if name == 'slim':
+        return json.dumps([_slim(p) for p in positions], default=str)
+
+    # Columnar: key names once per column, repeated strings dictionary encoded
+    if name == 'slim_columnar':
+        return json.dumps({
+            'format': 'columnar',
+            'positions': columnar.encode_table([_slim(p) for p in positions]),
+        }, default=str, separators=(',', ':'))
+
+    position_table, candidate_table = columnar.encode_nested(positions, 'candidates')
+    return json.dumps({
+        'format': 'columnar',
+        'positions': position_table,
+        'candidates': candidate_table,
+    }, default=str, separators=(',', ':'))
 
+
+def _variant(payload, name):
+    """(body, etag) of another encoding of the snapshot, built on first use."""
+    with payload['lock']:
+        if name not in payload['variants']:
+            with timing.phase(f"serialize {name}") as phase:
+                body = _encode_variant(payload['positions'], name)
+                phase.rows = len(payload['positions'])
+                phase.bytes = len(body)
+            payload['variants'][name] = (body, responses.etag_for(body))
+        return payload['variants'][name]
+
+
+def _index(payload):
+    with payload['lock']:
+        if 'index' not in payload:
+            with timing.phase('index build') as phase:
+                payload['index'] = position_index.PositionIndex(payload['positions'])
+                phase.rows = len(payload['positions'])
+        return payload['index']
+
+
+def _query_body(payload, params, slim):
+    """
+    One page of the positions matching the filter parameters, with facet
+    counts for the dropdowns. Raises ValueError on a bad parameter.
+    """
+    selections = position_index.parse_selections(params)
+    sort = params.get('sort') or None
+    if sort and sort.lstrip('-') not in position_index.SORT_KEYS:
+        raise ValueError(f"Cannot sort by {sort}")
+    page = max(int(params.get('page') or 1), 1)
+    page_size = min(max(int(params.get('pageSize') or QUERY_PAGE_SIZE), 1), QUERY_MAX_PAGE_SIZE)
+
+    with timing.phase('query'):
+        total, members, facets = _index(payload).query(selections, params.get('q'), sort, page, page_size)
+    if slim:
+        encoded = [json.dumps(_slim(payload['positions'][i]), default=str) for i in members]
+    else:
+        encoded = [payload['entries'][i][1] for i in members]
+
+    return (
+        '{"total": ' + str(total) +
+        ', "page": ' + str(page) +
+        ', "pageSize": ' + str(page_size) +
+        ', "positions": [' + ', '.join(encoded) + ']' +
+        ', "facets": ' + json.dumps(facets) + '}'
+    )
+
+
+def _delta_body(payload, since, slim=False):
+    """
+    Positions added or changed since the snapshot named by ``since``, plus
+    tombstones for positions that closed. Unknown cursors (expired, or issued
+    by another worker) get every position back with ``full: true``. With
+    ``slim`` the upserts leave out candidate lists, as ?candidates=none does.
+    """
+    with _cursor_history_lock:
+        previous = _cursor_history.get(since)
+    encoded = _slim_entries(payload) if slim else [encoded for _, encoded, _ in payload['entries']]
+    if previous is None:
+        upserts = encoded
+        removed = []
+    else:
+        upserts = [
+            encoded[i] for i, (position_id, _, fingerprint) in enumerate(payload['entries'])
+            if previous.get(position_id) != fingerprint
+        ]
+        current = {position_id for position_id, _, _ in payload['entries']}
+        removed = [position_id for position_id in previous if position_id not in current]
+
+    return (
+        '{"cursor": ' + json.dumps(payload['cursor']) +
+        ', "full": ' + json.dumps(previous is None) +
+        ', "upserts": [' + ', '.join(upserts) + ']' +
+        ', "removed": ' + json.dumps(removed, default=str) + '}'
+    )
+
+
+@timing.timed
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    GET: full positions list. The response's X-Positions-Cursor header names
+    this snapshot; pass it back as ?since=<cursor> to get only the changes.
+
+    ?format=columnar returns the same snapshot as column arrays (see
+    shared_code/columnar.py); positions and candidates are separate tables.
+
+    ?candidates=none leaves out each position's candidate list (counts stay);
+    fetch them per position from GetCandidates. Combines with format=columnar
+    and ?since=.
+
+    Filtering, sorting and paging (any of these switches to one page of
+    results, {"total", "page", "pageSize", "positions", "facets"}):
+    - ?systems= ?facilities= ?categories= ?specialties= ?sources=: one value
+      or a JSON array; positions must match one value of every facet given
+    - ?q=: part of the position ID
+    - ?sort=<field> or -<field> (see position_index.SORT_KEYS)
+    - ?page= (from 1) and ?pageSize= (default 50, at most 500)
+    "facets" counts each dropdown's values under every other filter, so
+    unavailable options can be hidden. Combines with ?candidates=none.
+
+    ?format=ndjson skips the cache and returns one position per line, read
+    from the database in STREAM_BATCH_SIZE batches. Lines are ordered by
+    position ID rather than date added.
+
+    ?timing=1 adds a Server-Timing header (see shared_code/timing.py).
+    """
     try:
-        # Connect to positions database
-        conn = pyodbc.connect(
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={os.environ['DB_HOST']};"
-            f"DATABASE={os.environ['POSITIONS_DB']};"
-            f"UID={os.environ['DB_USER']};"
-            f"PWD={os.environ['DB_PASSWORD']};"
-            f"TrustServerCertificate=yes"
-        )
-        
-        cursor = conn.cursor()
-        positions = []
-        b4_position_ids = []
-        vndly_position_ids = []
-        
-        # ============================================================
-        # PART 1: Get B4Health Open Positions
-        # ============================================================
-        cursor.execute('''
-            SELECT 
-                'B4' AS source_system,
-                RTRIM(LTRIM(o.[Position ID])) AS position_id,
-                o.[Program] AS program,
-                o.[Facility Name] AS facility,
-                o.[Specialty Name] AS specialty,
-                o.[Date Added] AS date_added,
-                o.[Unit Name] AS unit,
-                o.[Cost Center] AS cost_center,
-                o.[Bill Rate] AS bill_rate,
-                o.[Shift Hours] AS shift_hours,
-                o.[Shift Time] AS shift_time,
-                o.[Hiring Manager] AS hiring_manager,
-                o.[# of Submissions] AS num_submissions,
-                o.[Number of Positions] AS num_positions,
-                o.[Requisition_Reason] AS requisition_reason,
-                o.[Shift Diff] AS shift_diff,
-                o.[Min Hours] AS min_hours,
-                o.[Start Date] AS open_start_date,
-                COALESCE(b.Time_Type, CAST(o.[Shift Hours] AS NVARCHAR(50))) AS time_type,
-                b.Start_Time AS start_time,
-                b.End_Time AS end_time,
-                b.Contract_Status AS status,
-                b.Health_System AS health_system
-            FROM dhc.B4HEALTHOPENORDER o
-            LEFT JOIN dhc.B4HealthOrder b 
-                ON RTRIM(LTRIM(o.[Position ID])) = RTRIM(LTRIM(b.Contract_ID))
-            ORDER BY o.[Date Added] DESC
-        ''')
-        
-        columns = [column[0] for column in cursor.description]
-        
-        for row in cursor.fetchall():
-            row_dict = dict(zip(columns, row))
-            
-            # Convert dates to ISO format
-            if row_dict.get('date_added'):
-                row_dict['date_added'] = row_dict['date_added'].isoformat() if hasattr(row_dict['date_added'], 'isoformat') else str(row_dict['date_added'])
-            
-            # Convert time fields to strings
-            if row_dict.get('start_time'):
-                row_dict['start_time'] = str(row_dict['start_time'])
-            if row_dict.get('end_time'):
-                row_dict['end_time'] = str(row_dict['end_time'])
-            
-            # Initialize submission counts
-            row_dict['ghrSubs'] = 0
-            row_dict['avSubs'] = 0
-            row_dict['ghrDeclines'] = 0
-            row_dict['avDeclines'] = 0
-            row_dict['candidates'] = []
-            
-            positions.append(row_dict)
-            if row_dict.get('position_id'):
-                b4_position_ids.append(row_dict['position_id'])
-        
-        # ============================================================
-        # PART 2: Get VNDLY Open Positions
-        # ============================================================
-        cursor.execute('''
-            SELECT 
-                'VNDLY' AS source_system,
-                RTRIM(LTRIM([Job Id])) AS position_id,
-                [Job Category] AS program,
-                COALESCE([Facility], [Health System]) AS facility,
-                [Job Title] AS specialty,
-                [Job Approval Date] AS date_added,
-                [Organization Unit (Job)] AS unit,
-                [Charge Code - Cost Center] AS cost_center,
-                COALESCE([Bill Rate], [Suggested Bill Rate], [Max Bill Rate]) AS bill_rate,
-                CASE 
-                    WHEN [Bill Rate] IS NOT NULL THEN 0
-                    ELSE 1
-                END AS bill_rate_estimated,
-                [Standard Hours Per Week] AS shift_hours,
-                [Shift Time Type] AS shift_time,
-                [Resource Manager (Job)] AS hiring_manager,
-                [Interviews Performed (for this job)] AS num_submissions,
-                [Open Positions] AS num_positions,
-                [Reason For Hire] AS requisition_reason,
-                NULL AS shift_diff,
-                NULL AS min_hours,
-                [Start Date] AS open_start_date,
-                [Job Type] AS time_type,
-                NULL AS start_time,
-                NULL AS end_time,
-                [Job Status] AS status,
-                [Health System] AS health_system
-            FROM dbo.STAGING_VNDLY_JOBS
-            WHERE [Job Status] = 'Active'
-            ORDER BY [Job Approval Date] DESC
-        ''')
-        
-        columns = [column[0] for column in cursor.description]
-        
-        for row in cursor.fetchall():
-            row_dict = dict(zip(columns, row))
-            
-            # Convert dates to ISO format
-            if row_dict.get('date_added'):
-                row_dict['date_added'] = row_dict['date_added'].isoformat() if hasattr(row_dict['date_added'], 'isoformat') else str(row_dict['date_added'])
-            
-            # Initialize submission counts
-            row_dict['ghrSubs'] = 0
-            row_dict['avSubs'] = 0
-            row_dict['ghrDeclines'] = 0
-            row_dict['avDeclines'] = 0
-            row_dict['candidates'] = []
-            
-            positions.append(row_dict)
-            if row_dict.get('position_id'):
-                vndly_position_ids.append(row_dict['position_id'])
-        
-        # Create lookup dict for positions
-        pos_lookup = {p['position_id']: p for p in positions}
-        
-        # ============================================================
-        # PART 3: Get B4Health Submissions
-        # ============================================================
-        if b4_position_ids:
-            placeholders = ','.join(['?' for _ in b4_position_ids])
-            cursor.execute(f'''
-                SELECT 
-                    RTRIM(LTRIM(Contract_Assignment_ID)) AS Contract_Assignment_ID,
-                    Agency_Name,
-                    Professional,
-                    Submission_Date,
-                    Agency_Retracted_Date,
-                    Hospital_Decline_Date,
-                    Hospital_Decline_Reason,
-                    Offer_Date,
-                    Agency_Decline_Date,
-                    Offer_Decline_Reason,
-                    Date_Awarded,
-                    RTO,
-                    IsActive
-                FROM dhc.B4Health_Contract_Submissions
-                WHERE RTRIM(LTRIM(Contract_Assignment_ID)) IN ({placeholders})
-            ''', b4_position_ids)
-            
-            sub_columns = [column[0] for column in cursor.description]
-            
-            for row in cursor.fetchall():
-                sub = dict(zip(sub_columns, row))
-                pos_id = sub.get('Contract_Assignment_ID')
-                
-                if pos_id and pos_id in pos_lookup:
-                    position = pos_lookup[pos_id]
-                    
-                    # Determine if declined
-                    is_declined = bool(
-                        sub.get('Hospital_Decline_Date') or 
-                        sub.get('Agency_Decline_Date') or 
-                        sub.get('Agency_Retracted_Date')
-                    )
-                    
-                    # Determine decline reason
-                    decline_reason = None
-                    if sub.get('Hospital_Decline_Date'):
-                        decline_reason = sub.get('Hospital_Decline_Reason') or 'Hospital Declined'
-                    elif sub.get('Agency_Decline_Date'):
-                        decline_reason = sub.get('Offer_Decline_Reason') or 'Agency Declined'
-                    elif sub.get('Agency_Retracted_Date'):
-                        decline_reason = 'Agency Retracted'
-                    
-                    # Determine if GHR (GHR or Planet Healthcare, not The Planet Group)
-                    agency = str(sub.get('Agency_Name') or '').lower()
-                    is_ghr = 'ghr' in agency or 'planet healthcare' in agency
-                    
-                    # Build candidate object
-                    candidate = {
-                        'name': sub.get('Professional') or 'Unknown',
-                        'agency': sub.get('Agency_Name') or 'Unknown',
-                        'submitDate': sub.get('Submission_Date').isoformat() if sub.get('Submission_Date') and hasattr(sub.get('Submission_Date'), 'isoformat') else None,
-                        'offerDate': sub.get('Offer_Date').isoformat() if sub.get('Offer_Date') and hasattr(sub.get('Offer_Date'), 'isoformat') else None,
-                        'awardedDate': sub.get('Date_Awarded').isoformat() if sub.get('Date_Awarded') and hasattr(sub.get('Date_Awarded'), 'isoformat') else None,
-                        'rto': sub.get('RTO'),
-                        'isDeclined': is_declined,
-                        'declineReason': decline_reason,
-                        'hospDeclineDate': sub.get('Hospital_Decline_Date').isoformat() if sub.get('Hospital_Decline_Date') and hasattr(sub.get('Hospital_Decline_Date'), 'isoformat') else None,
-                        'agencyDeclineDate': sub.get('Agency_Decline_Date').isoformat() if sub.get('Agency_Decline_Date') and hasattr(sub.get('Agency_Decline_Date'), 'isoformat') else None,
-                        'agencyRetractedDate': sub.get('Agency_Retracted_Date').isoformat() if sub.get('Agency_Retracted_Date') and hasattr(sub.get('Agency_Retracted_Date'), 'isoformat') else None,
-                        'isGHR': is_ghr,
-                        'isActive': sub.get('IsActive') or False
-                    }
-                    
-                    position['candidates'].append(candidate)
-                    
-                    # Update counts
-                    if is_declined:
-                        if is_ghr:
-                            position['ghrDeclines'] += 1
-                        else:
-                            position['avDeclines'] += 1
-                    else:
-                        if is_ghr:
-                            position['ghrSubs'] += 1
-                        else:
-                            position['avSubs'] += 1
-        
-        # ============================================================
-        # PART 4: Get VNDLY Submissions
-        # ============================================================
-        if vndly_position_ids:
-            placeholders = ','.join(['?' for _ in vndly_position_ids])
-            cursor.execute(f'''
-                SELECT 
-                    RTRIM(LTRIM([Job Id])) AS job_id,
-                    [Full Name] AS candidate_name,
-                    [Vendor Company Name] AS agency,
-                    [Application Date] AS submission_date,
-                    [Status] AS status,
-                    [Client Interview Date] AS interview_date,
-                    [Client Rejected Date] AS client_rejected_date,
-                    [Rejected Reason - Choice] AS reject_reason_choice,
-                    [Rejected Reason - Text] AS reject_reason_text,
-                    [Vendor Offer Declined Date] AS vendor_declined_date,
-                    [Vendor Withdrawn Date] AS vendor_withdrawn_date,
-                    [Withdrawal Reason - Choice] AS withdrawal_reason_choice,
-                    [Withdrawal Reason - Text] AS withdrawal_reason_text,
-                    [Offer Release Date] AS offer_date,
-                    [Offer Accepted Date] AS offer_accepted_date,
-                    [Onboarded Date] AS onboarded_date,
-                    [Ready To Onboard Date] AS rto_date,
-                    [Candidate ID] AS candidate_id
-                FROM dbo.STAGING_VNDLY_SUBMISSIONS
-                WHERE RTRIM(LTRIM([Job Id])) IN ({placeholders})
-            ''', vndly_position_ids)
-            
-            sub_columns = [column[0] for column in cursor.description]
-            
-            for row in cursor.fetchall():
-                sub = dict(zip(sub_columns, row))
-                pos_id = sub.get('job_id')
-                
-                if pos_id and pos_id in pos_lookup:
-                    position = pos_lookup[pos_id]
-                    
-                    status = str(sub.get('status') or '').lower()
-                    
-                    # Determine if declined/withdrawn based on dates OR status
-                    is_declined = bool(
-                        sub.get('client_rejected_date') or 
-                        sub.get('vendor_declined_date') or 
-                        sub.get('vendor_withdrawn_date') or
-                        status in ('rejected', 'offer declined', 'job closed')
-                    )
-                    
-                    # Determine decline reason
-                    decline_reason = None
-                    if sub.get('client_rejected_date') or status == 'rejected':
-                        decline_reason = sub.get('reject_reason_choice') or sub.get('reject_reason_text') or 'Client Rejected'
-                    elif sub.get('vendor_declined_date') or status == 'offer declined':
-                        decline_reason = 'Vendor Declined Offer'
-                    elif sub.get('vendor_withdrawn_date'):
-                        decline_reason = sub.get('withdrawal_reason_choice') or sub.get('withdrawal_reason_text') or 'Vendor Withdrawn'
-                    elif status == 'job closed':
-                        decline_reason = 'Job Closed'
-                    
-                    # Determine if GHR (GHR or Planet Healthcare, not The Planet Group)
-                    agency = str(sub.get('agency') or '').lower()
-                    is_ghr = 'ghr' in agency or 'planet healthcare' in agency
-                    
-                    # Build candidate object
-                    candidate = {
-                        'name': sub.get('candidate_name') or 'Unknown',
-                        'agency': sub.get('agency') or 'Unknown',
-                        'submitDate': sub.get('submission_date').isoformat() if sub.get('submission_date') and hasattr(sub.get('submission_date'), 'isoformat') else None,
-                        'offerDate': sub.get('offer_date').isoformat() if sub.get('offer_date') and hasattr(sub.get('offer_date'), 'isoformat') else None,
-                        'awardedDate': sub.get('offer_accepted_date').isoformat() if sub.get('offer_accepted_date') and hasattr(sub.get('offer_accepted_date'), 'isoformat') else None,
-                        'rto': sub.get('rto_date').isoformat() if sub.get('rto_date') and hasattr(sub.get('rto_date'), 'isoformat') else None,
-                        'isDeclined': is_declined,
-                        'declineReason': decline_reason,
-                        'hospDeclineDate': sub.get('client_rejected_date').isoformat() if sub.get('client_rejected_date') and hasattr(sub.get('client_rejected_date'), 'isoformat') else None,
-                        'agencyDeclineDate': sub.get('vendor_declined_date').isoformat() if sub.get('vendor_declined_date') and hasattr(sub.get('vendor_declined_date'), 'isoformat') else None,
-                        'agencyRetractedDate': sub.get('vendor_withdrawn_date').isoformat() if sub.get('vendor_withdrawn_date') and hasattr(sub.get('vendor_withdrawn_date'), 'isoformat') else None,
-                        'interviewDate': sub.get('interview_date').isoformat() if sub.get('interview_date') and hasattr(sub.get('interview_date'), 'isoformat') else None,
-                        'isGHR': is_ghr,
-                        'isActive': sub.get('status') == 'Active' if sub.get('status') else False,
-                        'status': sub.get('status')
-                    }
-                    
-                    position['candidates'].append(candidate)
-                    
-                    # Update counts
-                    if is_declined:
-                        if is_ghr:
-                            position['ghrDeclines'] += 1
-                        else:
-                            position['avDeclines'] += 1
-                    else:
-                        if is_ghr:
-                            position['ghrSubs'] += 1
-                        else:
-                            position['avSubs'] += 1
-        
-        conn.close()
-        
-        b4_count = len([p for p in positions if p.get('source_system') == 'B4'])
-        vndly_count = len([p for p in positions if p.get('source_system') == 'VNDLY'])
-        print(f"Returning {len(positions)} positions (B4: {b4_count}, VNDLY: {vndly_count})")
-        
-        return func.HttpResponse(
-            json.dumps(positions, default=str),
-            mimetype="application/json",
-            status_code=200
-        )
+        if req.params.get('format') == 'ndjson':
+            return func.HttpResponse(
+                _stream_ndjson(),
+                mimetype="application/x-ndjson",
+                status_code=200
+            )
+
+        payload = positions_cache.get('all', _data_version, _build_payload)
+        headers = {CURSOR_HEADER: payload['cursor']}
+
+        slim = req.params.get('candidates') == 'none'
+        since = req.params.get('since')
+        if since:
+            return responses.json_response(req, _delta_body(payload, since, slim), headers=headers)
+
+        if any(req.params.get(name) for name in QUERY_PARAMS):
+            try:
+                body = _query_body(payload, req.params, slim)
+            except ValueError as e:
+                return func.HttpResponse(
+                    json.dumps({'error': str(e)}),
+                    mimetype="application/json",
+                    status_code=400
+                )
+            return responses.json_response(req, body, headers=headers)
+
+        if req.params.get('format') == 'columnar':
+            body, etag = _variant(payload, 'slim_columnar' if slim else 'columnar')
+        elif slim:
+            body, etag = _variant(payload, 'slim')
+        else:
+            body, etag = payload['body'], payload['etag']
+
+        return responses.json_response(req, body, etag, headers=headers)
     except Exception as e:
         print(f"Error: {e}")
         import traceback
@@ -339,4 +281,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({'error': str(e)}),
             mimetype="application/json",
             status_code=500
-        )
\ No newline at end of file
+        )
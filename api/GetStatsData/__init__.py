@@ -1,182 +1,254 @@
 import azure.functions as func
-import pyodbc
-import os
 import json
+import os
 from datetime import datetime, timedelta
 
+from ..shared_code import assignment_stats, cache, db, health_systems, open_positions, position_index, responses, row_encoders, timing
+
+# The queries compare against GETDATE(), so entries also expire on a short TTL
+stats_cache = cache.get_cache(
+    'stats',
+    ttl_seconds=int(os.environ.get('STATS_CACHE_TTL', '300')),
+    check_seconds=int(os.environ.get('STATS_CACHE_CHECK_SECONDS', '30'))
+)
+
+# ============================================================
+# B4Health - Active Assignments
+# ============================================================
+B4_ACTIVE_SQL = '''
+    SELECT
+        'B4' AS source_system,
+        Contract_ID AS position_id,
+        CONCAT(First_Name, ' ', Last_Name) AS candidate_name,
+        Agency AS agency,
+        Facility AS facility,
+        Health_System AS system,
+        Care_Type AS specialty,
+        Start_Date AS startDate,
+        End_Date AS endDate,
+        Contract_Status AS status
+    FROM dhc.B4HealthOrder
+    WHERE Contract_Status = 'Closed And Awarded'
+        AND Start_Date IS NOT NULL
+        AND Start_Date <= GETDATE()
+        AND (End_Date IS NULL OR End_Date >= GETDATE())
+'''
+
+# ============================================================
+# B4Health - Upcoming Starts
+# ============================================================
+B4_UPCOMING_SQL = '''
+    SELECT
+        'B4' AS source_system,
+        Contract_ID AS position_id,
+        CONCAT(First_Name, ' ', Last_Name) AS candidate_name,
+        Agency AS agency,
+        Facility AS facility,
+        Health_System AS system,
+        Care_Type AS specialty,
+        Start_Date AS startDate,
+        End_Date AS endDate,
+        Contract_Status AS status
+    FROM dhc.B4HealthOrder
+    WHERE Contract_Status = 'Closed And Awarded'
+        AND Start_Date IS NOT NULL
+        AND Start_Date > GETDATE()
+        AND Start_Date <= DATEADD(day, 30, GETDATE())
+'''
+
+# ============================================================
+# VNDLY - Active Assignments (from Work Orders in STAGING_VNDLY_JOBS)
+# ============================================================
+VNDLY_ACTIVE_SQL = '''
+    SELECT 
+        'VNDLY' AS source_system,
+        [Job Id] AS position_id,
+        [Contractor Name] AS candidate_name,
+        [Vendor Company Name] AS agency,
+        [Facility] AS facility,
+        [Health System] AS system,
+        [Job Title] AS specialty,
+        [Work Order Start Date] AS startDate,
+        [Work Order End Date] AS endDate,
+        [Work Order Current Status] AS status
+    FROM dbo.STAGING_VNDLY_JOBS
+    WHERE [Work Order Current Status] = 'Active'
+        AND [Work Order Start Date] IS NOT NULL
+        AND [Work Order Start Date] <= GETDATE()
+        AND ([Work Order End Date] IS NULL OR [Work Order End Date] >= GETDATE())
+'''
+
+# ============================================================
+# VNDLY - Upcoming Starts (Verification In Progress = confirmed but not yet started)
+# ============================================================
+VNDLY_UPCOMING_SQL = '''
+    SELECT 
+        'VNDLY' AS source_system,
+        [Job Id] AS position_id,
+        [Contractor Name] AS candidate_name,
+        [Vendor Company Name] AS agency,
+        [Facility] AS facility,
+        [Health System] AS system,
+        [Job Title] AS specialty,
+        [Work Order Start Date] AS startDate,
+        [Work Order End Date] AS endDate,
+        [Work Order Current Status] AS status
+    FROM dbo.STAGING_VNDLY_JOBS
+    WHERE [Work Order Current Status] IN ('Verification In Progress', 'Applied')
+        AND [Work Order Start Date] IS NOT NULL
+        AND [Work Order Start Date] > GETDATE()
+        AND [Work Order Start Date] <= DATEADD(day, 30, GETDATE())
+'''
+
+# (label used in error logs, query, 'onAssignment' or 'upcoming')
+SOURCES = (
+    ('B4 active assignments', B4_ACTIVE_SQL, 'onAssignment'),
+    ('B4 upcoming', B4_UPCOMING_SQL, 'upcoming'),
+    ('VNDLY active assignments', VNDLY_ACTIVE_SQL, 'onAssignment'),
+    ('VNDLY upcoming', VNDLY_UPCOMING_SQL, 'upcoming'),
+)
+
+
+# Every column as is, with the dates converted to ISO format
+DATE_COLUMNS = (
+    ('startDate', row_encoders.iso_or_str('startDate')),
+    ('endDate', row_encoders.iso_or_str('endDate')),
+)
+
+
+def _fetch_assignments(cursor, label, sql):
+    with timing.phase(f"{label} execute"):
+        cursor.execute(sql)
+
+    encode = row_encoders.compile_encoder(cursor.description, row_encoders.columns(cursor.description, DATE_COLUMNS))
+    with timing.phase(f"{label} fetch") as phase:
+        fetched = cursor.fetchall()
+        phase.rows = len(fetched)
+
+    with timing.phase(f"{label} transform"):
+        return [encode(row) for row in fetched]
+
+
+def _load_rows(failed=None):
+    """
+    (on assignment, upcoming) rows from every source, with health systems
+    resolved. Labels of sources that failed are added to ``failed``.
+    """
+    futures = db.run_parallel('POSITIONS_DB', {
+        label: (lambda cursor, label=label, sql=sql: _fetch_assignments(cursor, label, sql))
+        for label, sql, _ in SOURCES
+    })
+
+    results = {'onAssignment': [], 'upcoming': []}
+    for label, _, bucket in SOURCES:
+        try:
+            results[bucket].extend(futures[label].result())
+        except Exception as e:
+            print(f"Error loading {label}: {e}")
+            if failed is not None:
+                failed.append(label)
+
+    with timing.phase('health systems') as phase:
+        on_assignment = health_systems.annotate(results['onAssignment'], 'facility', 'system')
+        upcoming = health_systems.annotate(results['upcoming'], 'facility', 'system')
+        phase.rows = len(on_assignment) + len(upcoming)
+    b4_active = len([r for r in on_assignment if r.get('source_system') == 'B4'])
+    vndly_active = len([r for r in on_assignment if r.get('source_system') == 'VNDLY'])
+    print(f"Loaded {len(on_assignment)} active (B4: {b4_active}, VNDLY: {vndly_active}), {len(upcoming)} upcoming")
+    return on_assignment, upcoming
+
+
+def _data_version():
+    return (open_positions.data_version(), health_systems.version())
+
+
+class _IncompleteStore(Exception):
+    """A store built while some sources failed; served, but never cached."""
+
+    def __init__(self, store, failed):
+        super().__init__(f"Incomplete stats store (failed: {', '.join(failed)})")
+        self.store = store
+
+
+def _build_store():
+    failed = []
+    store = assignment_stats.AssignmentStore(*_load_rows(failed))
+    if failed:
+        raise _IncompleteStore(store, failed)
+    return store
+
+
+def _load_store():
+    """
+    The cached AssignmentStore. When a source fails the partial store is
+    used for this response only, so the next request tries the source
+    again instead of under-reporting until the TTL runs out.
+    """
+    try:
+        return stats_cache.get('store', _data_version, _build_store)
+    except _IncompleteStore as e:
+        print(f"{e}; not cached")
+        return e.store
+
+
+def _parse_aggregate_params(params):
+    """(facet selections, viewer's now). Raises ValueError on a bad filter or tz parameter."""
+    return position_index.parse_selections(params), assignment_stats.local_now(int(params.get('tz') or 0))
+
+
+def _aggregates_body(selections, now):
+    store = _load_store()
+    with timing.phase('aggregate') as phase:
+        aggregates = store.aggregate(selections, now)
+        aggregates['options'] = store.options()
+        phase.rows = store.size
+    return json.dumps(aggregates)
+
+
+@timing.timed
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
     Returns stats data for:
     - onAssignment: Currently active work orders/assignments
     - upcoming: New starts in the near future
     
-    Combines data from both B4Health and VNDLY systems.
+    Combines data from both B4Health and VNDLY systems. The four source
+    queries are independent, so they run at the same time on separate
+    pooled connections; a source that fails is logged and left out (and
+    the aggregates built without it aren't cached).
+    Each row carries health_system_normalized (see health_systems.py).
+
+    ?view=aggregates returns only the KPI and Stats-tab numbers (see
+    shared_code/assignment_stats.py) instead of the rows, computed from a
+    cached columnar copy. It takes the GetPositions facet filters
+    (?systems= ?facilities= ?categories= ?specialties=) and ?tz=, the
+    viewer's getTimezoneOffset(), which sets where the weeks start.
+
+    ?timing=1 adds a Server-Timing header (see shared_code/timing.py).
     """
     try:
-        conn = pyodbc.connect(
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={os.environ['DB_HOST']};"
-            f"DATABASE={os.environ['POSITIONS_DB']};"
-            f"UID={os.environ['DB_USER']};"
-            f"PWD={os.environ['DB_PASSWORD']};"
-            f"TrustServerCertificate=yes"
-        )
-        
-        cursor = conn.cursor()
-        on_assignment = []
-        upcoming = []
-        
-        # ============================================================
-        # B4Health - Active Assignments
-        # ============================================================
-        try:
-            cursor.execute('''
-                SELECT
-                    'B4' AS source_system,
-                    Contract_ID AS position_id,
-                    CONCAT(First_Name, ' ', Last_Name) AS candidate_name,
-                    Agency AS agency,
-                    Facility AS facility,
-                    Health_System AS system,
-                    Care_Type AS specialty,
-                    Start_Date AS startDate,
-                    End_Date AS endDate,
-                    Contract_Status AS status
-                FROM dhc.B4HealthOrder
-                WHERE Contract_Status = 'Closed And Awarded'
-                    AND Start_Date IS NOT NULL
-                    AND Start_Date <= GETDATE()
-                    AND (End_Date IS NULL OR End_Date >= GETDATE())
-            ''')
-            
-            columns = [column[0] for column in cursor.description]
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                # Convert dates to ISO format
-                if row_dict.get('startDate'):
-                    row_dict['startDate'] = row_dict['startDate'].isoformat() if hasattr(row_dict['startDate'], 'isoformat') else str(row_dict['startDate'])
-                if row_dict.get('endDate'):
-                    row_dict['endDate'] = row_dict['endDate'].isoformat() if hasattr(row_dict['endDate'], 'isoformat') else str(row_dict['endDate'])
-                on_assignment.append(row_dict)
-        except Exception as e:
-            print(f"Error loading B4 active assignments: {e}")
-        
-        # ============================================================
-        # B4Health - Upcoming Starts
-        # ============================================================
-        try:
-            cursor.execute('''
-                SELECT
-                    'B4' AS source_system,
-                    Contract_ID AS position_id,
-                    CONCAT(First_Name, ' ', Last_Name) AS candidate_name,
-                    Agency AS agency,
-                    Facility AS facility,
-                    Health_System AS system,
-                    Care_Type AS specialty,
-                    Start_Date AS startDate,
-                    End_Date AS endDate,
-                    Contract_Status AS status
-                FROM dhc.B4HealthOrder
-                WHERE Contract_Status = 'Closed And Awarded'
-                    AND Start_Date IS NOT NULL
-                    AND Start_Date > GETDATE()
-                    AND Start_Date <= DATEADD(day, 30, GETDATE())
-            ''')
-            
-            columns = [column[0] for column in cursor.description]
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                if row_dict.get('startDate'):
-                    row_dict['startDate'] = row_dict['startDate'].isoformat() if hasattr(row_dict['startDate'], 'isoformat') else str(row_dict['startDate'])
-                if row_dict.get('endDate'):
-                    row_dict['endDate'] = row_dict['endDate'].isoformat() if hasattr(row_dict['endDate'], 'isoformat') else str(row_dict['endDate'])
-                upcoming.append(row_dict)
-        except Exception as e:
-            print(f"Error loading B4 upcoming: {e}")
-        
-        # ============================================================
-        # VNDLY - Active Assignments (from Work Orders in STAGING_VNDLY_JOBS)
-        # ============================================================
-        try:
-            cursor.execute('''
-                SELECT 
-                    'VNDLY' AS source_system,
-                    [Job Id] AS position_id,
-                    [Contractor Name] AS candidate_name,
-                    [Vendor Company Name] AS agency,
-                    [Facility] AS facility,
-                    [Health System] AS system,
-                    [Job Title] AS specialty,
-                    [Work Order Start Date] AS startDate,
-                    [Work Order End Date] AS endDate,
-                    [Work Order Current Status] AS status
-                FROM dbo.STAGING_VNDLY_JOBS
-                WHERE [Work Order Current Status] = 'Active'
-                    AND [Work Order Start Date] IS NOT NULL
-                    AND [Work Order Start Date] <= GETDATE()
-                    AND ([Work Order End Date] IS NULL OR [Work Order End Date] >= GETDATE())
-            ''')
-            
-            columns = [column[0] for column in cursor.description]
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                if row_dict.get('startDate'):
-                    row_dict['startDate'] = row_dict['startDate'].isoformat() if hasattr(row_dict['startDate'], 'isoformat') else str(row_dict['startDate'])
-                if row_dict.get('endDate'):
-                    row_dict['endDate'] = row_dict['endDate'].isoformat() if hasattr(row_dict['endDate'], 'isoformat') else str(row_dict['endDate'])
-                on_assignment.append(row_dict)
-        except Exception as e:
-            print(f"Error loading VNDLY active assignments: {e}")
-        
-        # ============================================================
-        # VNDLY - Upcoming Starts (Verification In Progress = confirmed but not yet started)
-        # ============================================================
-        try:
-            cursor.execute('''
-                SELECT 
-                    'VNDLY' AS source_system,
-                    [Job Id] AS position_id,
-                    [Contractor Name] AS candidate_name,
-                    [Vendor Company Name] AS agency,
-                    [Facility] AS facility,
-                    [Health System] AS system,
-                    [Job Title] AS specialty,
-                    [Work Order Start Date] AS startDate,
-                    [Work Order End Date] AS endDate,
-                    [Work Order Current Status] AS status
-                FROM dbo.STAGING_VNDLY_JOBS
-                WHERE [Work Order Current Status] IN ('Verification In Progress', 'Applied')
-                    AND [Work Order Start Date] IS NOT NULL
-                    AND [Work Order Start Date] > GETDATE()
-                    AND [Work Order Start Date] <= DATEADD(day, 30, GETDATE())
-            ''')
-            
-            columns = [column[0] for column in cursor.description]
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                if row_dict.get('startDate'):
-                    row_dict['startDate'] = row_dict['startDate'].isoformat() if hasattr(row_dict['startDate'], 'isoformat') else str(row_dict['startDate'])
-                if row_dict.get('endDate'):
-                    row_dict['endDate'] = row_dict['endDate'].isoformat() if hasattr(row_dict['endDate'], 'isoformat') else str(row_dict['endDate'])
-                upcoming.append(row_dict)
-        except Exception as e:
-            print(f"Error loading VNDLY upcoming: {e}")
-        
-        conn.close()
-        
-        b4_active = len([r for r in on_assignment if r.get('source_system') == 'B4'])
-        vndly_active = len([r for r in on_assignment if r.get('source_system') == 'VNDLY'])
-        print(f"Returning {len(on_assignment)} active (B4: {b4_active}, VNDLY: {vndly_active}), {len(upcoming)} upcoming")
-        
-        return func.HttpResponse(
-            json.dumps({
+        if req.params.get('view') == 'aggregates':
+            try:
+                selections, now = _parse_aggregate_params(req.params)
+            except (ValueError, OverflowError) as e:
+                return func.HttpResponse(
+                    json.dumps({'error': str(e)}),
+                    mimetype="application/json",
+                    status_code=400
+                )
+            return responses.json_response(req, _aggregates_body(selections, now))
+
+        on_assignment, upcoming = _load_rows()
+    
+        with timing.phase('serialize') as phase:
+            body = json.dumps({
                 'onAssignment': on_assignment,
                 'upcoming': upcoming
-            }, default=str),
-            mimetype="application/json",
-            status_code=200
-        )
+            }, default=str)
+            phase.rows = len(on_assignment) + len(upcoming)
+            phase.bytes = len(body)
+
+        return responses.json_response(req, body)
         
     except Exception as e:
         print(f"Error: {e}")
@@ -186,4 +258,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({'error': str(e), 'onAssignment': [], 'upcoming': []}),
             mimetype="application/json",
             status_code=500
-        )
\ No newline at end of file
+        )
@@ -1,96 +1,79 @@
 import azure.functions as func
-import pyodbc
-import os
 import json
 
+from ..shared_code import db, health_systems, responses
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """
-    GET: Retrieve all system mappings
-    POST: Save/update system mappings (replaces all)
+    GET: Retrieve all system mappings and their version
+    POST: Save/update system mappings (replaces all). Send back the version
+    from GET; if someone saved in between, responds 409 with the current
+    version and changes nothing.
     """
     try:
         # Use CHANGES_DB (ghr_impact_mgr) for this table
-        conn = pyodbc.connect(
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={os.environ['DB_HOST']};"
-            f"DATABASE={os.environ['CHANGES_DB']};"
-            f"UID={os.environ['DB_USER']};"
-            f"PWD={os.environ['DB_PASSWORD']};"
-            f"TrustServerCertificate=yes"
-        )
-        
-        cursor = conn.cursor()
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
         
-        if req.method == 'GET':
-            # Get all mappings
-            cursor.execute('''
-                SELECT id, keywords, system_name, sort_order
-                FROM dbo.system_mappings
-                ORDER BY sort_order, id
-            ''')
-            
-            columns = [column[0] for column in cursor.description]
-            mappings = []
-            for row in cursor.fetchall():
-                row_dict = dict(zip(columns, row))
-                # Parse keywords from comma-separated string to array
-                row_dict['keywords'] = [k.strip() for k in row_dict['keywords'].split(',') if k.strip()]
-                mappings.append(row_dict)
+            if req.method == 'GET':
+                # Get all mappings
+                cursor.execute('''
+                    SELECT id, keywords, system_name, sort_order
+                    FROM dbo.system_mappings
+                    ORDER BY sort_order, id
+                ''')
             
-            conn.close()
+                columns = [column[0] for column in cursor.description]
+                mappings = []
+                for row in cursor.fetchall():
+                    row_dict = dict(zip(columns, row))
+                    # Parse keywords from comma-separated string to array
+                    row_dict['keywords'] = health_systems.parse_keywords(row_dict['keywords'])
+                    mappings.append(row_dict)
             
-            return func.HttpResponse(
-                json.dumps({'mappings': mappings}),
-                mimetype="application/json",
-                status_code=200
-            )
+                version = health_systems.read_version(cursor)
+                return responses.json_response(req, json.dumps({'mappings': mappings, 'version': version}))
         
-        elif req.method == 'POST':
-            # Save mappings - replace all existing
-            try:
-                body = req.get_json()
-                mappings = body.get('mappings', [])
-            except:
+            elif req.method == 'POST':
+                # Save mappings - replace all existing
+                try:
+                    body = req.get_json()
+                    mappings = body.get('mappings', [])
+                except:
+                    return func.HttpResponse(
+                        json.dumps({'error': 'Invalid JSON body'}),
+                        mimetype="application/json",
+                        status_code=400
+                    )
+            
+                # Only the rows that differ are written, in one transaction
+                try:
+                    result = health_systems.save_mappings(cursor, mappings, body.get('version'))
+                except health_systems.VersionConflict as e:
+                    conn.rollback()
+                    return func.HttpResponse(
+                        json.dumps({'error': str(e), 'version': e.current}),
+                        mimetype="application/json",
+                        status_code=409
+                    )
+                conn.commit()
+
+                if result['changed']:
+                    # Positions and stats resolve health systems with the new mappings
+                    health_systems.invalidate()
+            
                 return func.HttpResponse(
-                    json.dumps({'error': 'Invalid JSON body'}),
+                    json.dumps({'success': True, 'count': len(mappings), **result}),
                     mimetype="application/json",
-                    status_code=400
+                    status_code=200
                 )
-            
-            # Delete existing mappings
-            cursor.execute('DELETE FROM dbo.system_mappings')
-            
-            # Insert new mappings
-            for idx, mapping in enumerate(mappings):
-                keywords = mapping.get('keywords', [])
-                system_name = mapping.get('system_name') or mapping.get('system', '')
-                
-                # Convert keywords array to comma-separated string
-                if isinstance(keywords, list):
-                    keywords_str = ', '.join(keywords)
-                else:
-                    keywords_str = str(keywords)
-                
-                cursor.execute('''
-                    INSERT INTO dbo.system_mappings (keywords, system_name, sort_order)
-                    VALUES (?, ?, ?)
-                ''', keywords_str, system_name, idx)
-            
-            conn.commit()
-            conn.close()
-            
-            return func.HttpResponse(
-                json.dumps({'success': True, 'count': len(mappings)}),
-                mimetype="application/json",
-                status_code=200
-            )
         
-        else:
-            return func.HttpResponse(
-                json.dumps({'error': 'Method not allowed'}),
-                mimetype="application/json",
-                status_code=405
-            )
+            else:
+                return func.HttpResponse(
+                    json.dumps({'error': 'Method not allowed'}),
+                    mimetype="application/json",
+                    status_code=405
+                )
             
     except Exception as e:
         print(f"Error: {e}")
@@ -100,4 +83,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({'error': str(e)}),
             mimetype="application/json",
             status_code=500
-        )
\ No newline at end of file
+        )
@@ -0,0 +1,31 @@
+import azure.functions as func
+import json
+
+from ..shared_code import cache
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Drops cached responses so the next request rebuilds them from the database.
+    Optional JSON body: {"cache": "positions"} to clear a single cache,
+    otherwise every cache in this worker is cleared.
+    """
+    try:
+        try:
+            body = req.get_json()
+        except ValueError:
+            body = {}
+
+        invalidated = cache.invalidate(body.get('cache'))
+        print(f"Invalidated caches: {invalidated}")
+
+        return func.HttpResponse(
+            json.dumps({'success': True, 'invalidated': invalidated}),
+            mimetype="application/json",
+            status_code=200
+        )
+    except Exception as e:
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
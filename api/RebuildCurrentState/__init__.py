@@ -0,0 +1,29 @@
+import azure.functions as func
+import json
+
+from ..shared_code import current_state, db
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Regenerates dbo.position_current_state from the full change log, in one
+    transaction. Use it to repair the table; SaveChange keeps it current.
+    """
+    try:
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
+            jobs = current_state.rebuild(cursor)
+            conn.commit()
+        
+        print(f"Rebuilt position current state for {jobs} jobs")
+        return func.HttpResponse(
+            json.dumps({'success': True, 'jobs': jobs}),
+            mimetype="application/json",
+            status_code=200
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
@@ -0,0 +1,38 @@
+import azure.functions as func
+import json
+
+from ..shared_code import cache, db
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Rebuilds the precomputed submission counts and candidate rows that
+    GetPositions reads (dbo.ghr_refresh_submission_summary). Call this after
+    each ETL load, or from a scheduler, then drops the cached positions.
+    """
+    try:
+        with db.connect('POSITIONS_DB') as conn:
+            cursor = conn.cursor()
+            cursor.execute('EXEC dbo.ghr_refresh_submission_summary')
+            refreshed_at, candidate_count, position_count = cursor.fetchone()
+            conn.commit()
+
+        cache.invalidate('positions')
+        print(f"Refreshed submission summary: {candidate_count} candidates across {position_count} positions")
+
+        return func.HttpResponse(
+            json.dumps({
+                'success': True,
+                'refreshedAt': refreshed_at.isoformat() if hasattr(refreshed_at, 'isoformat') else str(refreshed_at),
+                'candidates': candidate_count,
+                'positions': position_count
+            }),
+            mimetype="application/json",
+            status_code=200
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
@@ -0,0 +1,47 @@
+import azure.functions as func
+import json
+
+from ..shared_code import current_state, db, history
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    POST {"id": <snapshot id>}: replaces the saved changes with those of a
+    history snapshot, in one transaction, and records the restored state as
+    a new checkpoint. Rebuilds position_current_state to match. Returns the
+    restored changes.
+    """
+    try:
+        snapshot_id = req.get_json().get('id')
+        if snapshot_id is None:
+            return func.HttpResponse(
+                json.dumps({'error': 'Snapshot id is required'}),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
+            try:
+                changes = history.restore(cursor, int(snapshot_id))
+            except KeyError as e:
+                return func.HttpResponse(
+                    json.dumps({'error': str(e.args[0])}),
+                    mimetype="application/json",
+                    status_code=404
+                )
+            current_state.rebuild(cursor)
+            conn.commit()
+        
+        print(f"Restored history snapshot {snapshot_id} ({len(changes)} changes)")
+        return func.HttpResponse(
+            json.dumps({'success': True, 'changes': changes}),
+            mimetype="application/json",
+            status_code=200
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
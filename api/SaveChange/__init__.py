@@ -1,39 +1,27 @@
 import azure.functions as func
-import pyodbc
-import os
 import json
 
+from ..shared_code import changes, db
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
         change = req.get_json()
         
-        conn = pyodbc.connect(
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={os.environ['DB_HOST']};"
-            f"DATABASE={os.environ['CHANGES_DB']};"
-            f"UID={os.environ['DB_USER']};"
-            f"PWD={os.environ['DB_PASSWORD']};"
-            f"TrustServerCertificate=yes"
-        )
-        
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO dbo.ghr_changes (id, timestamp, jobid, change_type, change_data, user_name)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            change['id'],
-            change['timestamp'],
-            change['jobId'],
-            change['type'],
-            json.dumps(change['data']),
-            change.get('user', 'Unknown')
-        ))
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
+            # Idempotent on change id; also updates position_current_state
+            result = changes.save_changes(cursor, [change])[0]
+            if result['status'] == 'invalid':
+                return func.HttpResponse(
+                    json.dumps({'error': result['error']}),
+                    mimetype="application/json",
+                    status_code=400
+                )
         
-        conn.commit()
-        conn.close()
+            conn.commit()
         
         return func.HttpResponse(
-            json.dumps({'success': True}),
+            json.dumps({'success': True, 'duplicate': result['status'] == 'duplicate'}),
             mimetype="application/json",
             status_code=200
         )
@@ -42,4 +30,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({'error': str(e)}),
             mimetype="application/json",
             status_code=500
-        )
\ No newline at end of file
+        )
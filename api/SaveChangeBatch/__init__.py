@@ -0,0 +1,56 @@
+import azure.functions as func
+import json
+
+from ..shared_code import changes, db
+
+# Keeps one request's transaction (and its locks) short
+MAX_BATCH = 1000
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    POST {"changes": [...]} (or a bare array): saves every change in one
+    transaction with a single bulk insert. Changes already saved, matched
+    on id, are skipped, so a retried batch is safe to resend.
+
+    Returns {"success": true, "results": [{"id", "status"}, ...]}, one per
+    item in request order, with status "inserted", "duplicate" or
+    "invalid" (plus "error"). Invalid items don't stop the others.
+    """
+    try:
+        try:
+            body = req.get_json()
+        except ValueError:
+            body = None
+        items = body.get('changes') if isinstance(body, dict) else body
+        if not isinstance(items, list) or not items:
+            return func.HttpResponse(
+                json.dumps({'error': 'Expected a non-empty array of changes'}),
+                mimetype="application/json",
+                status_code=400
+            )
+        if len(items) > MAX_BATCH:
+            return func.HttpResponse(
+                json.dumps({'error': f'At most {MAX_BATCH} changes per batch'}),
+                mimetype="application/json",
+                status_code=400
+            )
+        
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
+            results = changes.save_changes(cursor, items)
+            conn.commit()
+        
+        inserted = sum(1 for r in results if r['status'] == 'inserted')
+        print(f"Saved change batch: {inserted} inserted of {len(results)}")
+        return func.HttpResponse(
+            json.dumps({'success': True, 'results': results}),
+            mimetype="application/json",
+            status_code=200
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return func.HttpResponse(
+            json.dumps({'error': str(e)}),
+            mimetype="application/json",
+            status_code=500
+        )
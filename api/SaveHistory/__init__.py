@@ -1,48 +1,30 @@
 import azure.functions as func
-import pyodbc
-import os
 import json
 
+from ..shared_code import db, history
+
 def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Records a history snapshot. Only the timestamp is sent: the snapshot
+    stores how far into dbo.ghr_changes it reaches, and every
+    HISTORY_CHECKPOINT_EVERY-th one stores the full change list (see
+    shared_code/history.py).
+    """
     try:
         snapshot = req.get_json()
         
-        conn = pyodbc.connect(
-            f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={os.environ['DB_HOST']};"
-            f"DATABASE={os.environ['CHANGES_DB']};"
-            f"UID={os.environ['DB_USER']};"
-            f"PWD={os.environ['DB_PASSWORD']};"
-            f"TrustServerCertificate=yes"
-        )
-        
-        cursor = conn.cursor()
+        with db.connect('CHANGES_DB') as conn:
+            cursor = conn.cursor()
         
-        # Insert new snapshot
-        cursor.execute('''
-            INSERT INTO dbo.ghr_history_snapshots (snapshot_timestamp, change_count, snapshot_data)
-            VALUES (?, ?, ?)
-        ''', (
-            snapshot['timestamp'],
-            snapshot['changeCount'],
-            json.dumps(snapshot['data'])
-        ))
+            checkpoint = history.save_snapshot(cursor, snapshot['timestamp'])
         
-        # Keep only last 100 snapshots
-        cursor.execute('''
-            DELETE FROM dbo.ghr_history_snapshots
-            WHERE id NOT IN (
-                SELECT TOP 100 id
-                FROM dbo.ghr_history_snapshots
-                ORDER BY snapshot_timestamp DESC
-            )
-        ''')
+            # Keep only last 100 snapshots, plus the checkpoint they are rebuilt from
+            history.prune(cursor)
         
-        conn.commit()
-        conn.close()
+            conn.commit()
         
         return func.HttpResponse(
-            json.dumps({'success': True}),
+            json.dumps({'success': True, 'checkpoint': checkpoint}),
             mimetype="application/json",
             status_code=200
         )
@@ -51,4 +33,4 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             json.dumps({'error': str(e)}),
             mimetype="application/json",
             status_code=500
-        )
\ No newline at end of file
+        )
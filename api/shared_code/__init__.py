@@ -0,0 +1,6 @@
+"""
+Helpers shared by the HTTP functions in this app.
+
+Function folders import from here with a relative import, e.g.
+``from ..shared_code import db``.
+"""
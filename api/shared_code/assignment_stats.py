@@ -0,0 +1,219 @@
+"""
+Stats-tab and KPI aggregates over active assignments and upcoming starts.
+
+GetStatsData used to send every assignment row and let the page count
+them. AssignmentStore holds the rows as NumPy columns instead:
+dictionary-encoded codes for facility, specialty and health system, a GHR
+flag, and start / end dates. ``aggregate`` applies the page's filters as
+boolean masks and returns only the numbers:
+
+- kpis: assignments active now and how many are GHR (GHR fill rate)
+- weeks: the Stats tab's last four weeks (on assignment, GHR, agency,
+  new starts)
+- breakdowns: active assignments, GHR vs other agencies, per health
+  system, specialty and category
+
+Filters follow the page (Utils.matchesSelectedSystems and
+matchesStatsCategoryFilter), so the numbers match what it computed from
+the raw rows.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .position_index import clean_filter_text
+
+NURSING_KEYWORDS = ('nursing', 'rn', 'nurse', 'lpn', 'cna', 'practitioner', 'midwife', 'crna')
+ALLIED_KEYWORDS = ('allied', 'tech', 'therapist', 'therapy', 'rad', 'sonographer', 'phlebotomy', 'assistant', 'technologist')
+
+WEEKS = 4
+
+
+def is_ghr_agency(agency):
+    agency = str(agency or '').lower()
+    return 'ghr' in agency or 'planet healthcare' in agency
+
+
+def specialty_category(specialty):
+    """Nursing / Allied / Other, the groups behind the page's category filter."""
+    specialty = str(specialty or '').lower()
+    if any(k in specialty for k in NURSING_KEYWORDS):
+        return 'Nursing'
+    if any(k in specialty for k in ALLIED_KEYWORDS):
+        return 'Allied'
+    return 'Other'
+
+
+def _category_matches(specialty, categories):
+    """Utils.matchesStatsCategoryFilter for one specialty."""
+    if not specialty:
+        return False
+    specialty = specialty.lower()
+    for category in categories:
+        category = str(category).lower()
+        if any(k in category for k in NURSING_KEYWORDS) and any(k in specialty for k in NURSING_KEYWORDS):
+            return True
+        if any(k in category for k in ALLIED_KEYWORDS) and any(k in specialty for k in ALLIED_KEYWORDS):
+            return True
+        if category in specialty or specialty in category:
+            return True
+    return False
+
+
+def _encode(values):
+    """(codes array, distinct values) with '' for missing values."""
+    dictionary = {}
+    codes = np.fromiter(
+        (dictionary.setdefault(v or '', len(dictionary)) for v in values),
+        dtype=np.int32, count=len(values)
+    )
+    return codes, list(dictionary)
+
+
+def _dates(values):
+    return np.array([v or None for v in values], dtype='datetime64[ms]')
+
+
+class AssignmentStore:
+
+    def __init__(self, on_assignment, upcoming):
+        rows = on_assignment + upcoming
+        self.size = len(rows)
+        self.upcoming = np.zeros(self.size, dtype=bool)
+        self.upcoming[len(on_assignment):] = True
+
+        self.start = _dates([r.get('startDate') for r in rows])
+        self.end = _dates([r.get('endDate') for r in rows])
+        self.ghr = np.fromiter((is_ghr_agency(r.get('agency')) for r in rows), dtype=bool, count=self.size)
+
+        self.facility, self.facilities = _encode([r.get('facility') for r in rows])
+        self.specialty, self.specialties = _encode([r.get('specialty') for r in rows])
+        self.clean_specialty, self.clean_specialties = _encode([clean_filter_text(r.get('specialty')) for r in rows])
+        self.system, self.systems = _encode([r.get('health_system_normalized') for r in rows])
+        self.raw_system, self.raw_systems = _encode([r.get('system') for r in rows])
+
+        categories = [specialty_category(s) for s in self.specialties]
+        self.category_names = sorted(set(categories))
+        self.category = np.array([self.category_names.index(c) for c in categories], dtype=np.int32)[self.specialty]
+
+        # Mapped systems with a keyword in the facility name, one column per system
+        self.facility_system_names = sorted({name for r in rows for name in (r.get('facility_health_systems') or [])})
+        columns = {name: i for i, name in enumerate(self.facility_system_names)}
+        self.facility_systems = np.zeros((self.size, len(columns)), dtype=bool)
+        for i, r in enumerate(rows):
+            for name in r.get('facility_health_systems') or []:
+                self.facility_systems[i, columns[name]] = True
+
+    def _isin(self, codes, dictionary, values):
+        wanted = [i for i, value in enumerate(dictionary) if value and value in values]
+        return np.isin(codes, wanted)
+
+    def filter_mask(self, selections):
+        mask = np.ones(self.size, dtype=bool)
+        systems = set(selections.get('systems') or ())
+        if systems:
+            columns = [i for i, name in enumerate(self.facility_system_names) if name in systems]
+            mask &= (
+                self._isin(self.system, self.systems, systems)
+                | self._isin(self.raw_system, self.raw_systems, systems)
+                | self.facility_systems[:, columns].any(axis=1)
+            )
+        facilities = set(selections.get('facilities') or ())
+        if facilities:
+            mask &= self._isin(self.facility, self.facilities, facilities)
+        specialties = set(selections.get('specialties') or ())
+        if specialties:
+            mask &= self._isin(self.clean_specialty, self.clean_specialties, specialties)
+        categories = selections.get('categories') or ()
+        if categories:
+            # Decided once per distinct specialty, then looked up per row
+            lookup = np.array([_category_matches(s, categories) for s in self.specialties], dtype=bool)
+            mask &= lookup[self.specialty]
+        return mask
+
+    def _active_between(self, start, end):
+        """On-assignment rows started by ``end`` and not ended before ``start``."""
+        return ~self.upcoming & (self.start <= end) & (np.isnat(self.end) | (self.end >= start))
+
+    def _breakdown(self, codes, names, rows):
+        active = np.bincount(codes[rows], minlength=len(names))
+        ghr = np.bincount(codes[rows], weights=self.ghr[rows], minlength=len(names)).astype(int)
+        result = [
+            {
+                'name': name,
+                'active': int(active[i]),
+                'ghr': int(ghr[i]),
+                'other': int(active[i] - ghr[i]),
+                'ghrShare': round(100.0 * int(ghr[i]) / int(active[i]), 1),
+            }
+            for i, name in enumerate(names) if name and active[i]
+        ]
+        return sorted(result, key=lambda r: (-r['active'], r['name']))
+
+    def aggregate(self, selections, now=None):
+        """
+        Aggregates for the rows matching ``selections`` (facet name ->
+        values, as position_index.parse_selections returns), with weeks
+        counted back from ``now`` (the viewer's local time).
+        """
+        now = np.datetime64(now or datetime.now(), 'ms')
+        mask = self.filter_mask(selections)
+
+        active = mask & self._active_between(now, now)
+        active_count = int(active.sum())
+        ghr_active = int((active & self.ghr).sum())
+
+        weeks = []
+        today_end = now.astype('datetime64[D]') + np.timedelta64(1, 'D') - np.timedelta64(1, 'ms')
+        for i in range(WEEKS):
+            end = today_end - np.timedelta64(7 * i, 'D')
+            start = (end - np.timedelta64(6, 'D')).astype('datetime64[D]').astype('datetime64[ms]')
+            on_assignment = mask & self._active_between(start, end)
+            total = int(on_assignment.sum())
+            ghr = int((on_assignment & self.ghr).sum())
+            starts = (on_assignment | (mask & self.upcoming)) & (self.start >= start) & (self.start <= end)
+            weeks.append({
+                'start': str(start.astype('datetime64[s]')),
+                'total': total,
+                'ghr': ghr,
+                'agency': total - ghr,
+                'newStarts': int(starts.sum()),
+            })
+
+        return {
+            'kpis': {
+                'active': active_count,
+                'ghrActive': ghr_active,
+                # Math.round, as the page rounds it
+                'ghrFillRate': int(100 * ghr_active / active_count + 0.5) if active_count else 0,
+                'upcoming': int((mask & self.upcoming).sum()),
+            },
+            'weeks': weeks,
+            'breakdowns': {
+                'systems': self._breakdown(self.system, self.systems, active),
+                'specialties': self._breakdown(self.clean_specialty, self.clean_specialties, active),
+                'categories': self._breakdown(self.category, self.category_names, active),
+            },
+        }
+
+    def options(self):
+        """Filter values the assignments add to the page's dropdowns."""
+        return {
+            'systems': sorted(v for v in self.systems if v),
+            'facilities': sorted(v for v in self.facilities if v),
+            'specialties': sorted(v for v in self.clean_specialties if v),
+        }
+
+
+# UTC-12:00 to UTC+14:00, the widest offsets in use
+MAX_TZ_OFFSET_MINUTES = 14 * 60
+
+
+def local_now(offset_minutes):
+    """
+    The viewer's wall-clock time from a JS getTimezoneOffset() value.
+    Raises ValueError for offsets no time zone has.
+    """
+    if abs(offset_minutes) > MAX_TZ_OFFSET_MINUTES:
+        raise ValueError(f"tz must be between -{MAX_TZ_OFFSET_MINUTES} and {MAX_TZ_OFFSET_MINUTES} minutes")
+    return datetime.utcnow() - timedelta(minutes=offset_minutes)
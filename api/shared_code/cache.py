@@ -0,0 +1,134 @@
+"""
+In-process caches for responses that are expensive to build but only change
+when the underlying data does (e.g. after an ETL load).
+
+Each entry remembers the data version it was built from. Callers supply a
+cheap ``load_version`` function and an expensive ``build`` function:
+
+    payload = positions_cache.get('all', load_version, build)
+
+The version is re-checked at most every ``check_seconds``; the entry is
+rebuilt when the version changes or after ``ttl_seconds`` regardless.
+Concurrent callers for the same key wait for a single rebuild instead of
+each rebuilding the payload themselves.
+
+``max_entries`` bounds caches with many small keys; the oldest-built
+entries are dropped first.
+
+Caches live per worker process. ``invalidate`` only clears the worker it
+runs in; other workers pick up new data through the version check.
+"""
+import threading
+import time
+
+from . import timing
+
+
+class _Entry:
+    __slots__ = ('value', 'version', 'built_at', 'checked_at')
+
+    def __init__(self, value, version, now):
+        self.value = value
+        self.version = version
+        self.built_at = now
+        self.checked_at = now
+
+
+class VersionedCache:
+
+    def __init__(self, name, ttl_seconds, check_seconds, max_entries=None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.check_seconds = check_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.builds = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, load_version, build):
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and now - entry.built_at < self.ttl_seconds and now - entry.checked_at < self.check_seconds:
+            self.hits += 1
+            return entry.value
+
+        with self._key_lock(key):
+            # Another caller may have refreshed the entry while we waited
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry and now - entry.built_at < self.ttl_seconds:
+                if now - entry.checked_at < self.check_seconds:
+                    self.hits += 1
+                    return entry.value
+                version = self._load_version(load_version)
+                if version == entry.version:
+                    entry.checked_at = now
+                    self.hits += 1
+                    return entry.value
+            else:
+                version = self._load_version(load_version)
+
+            with timing.phase(f"{self.name} cache build"):
+                value = build()
+            with self._lock:
+                self._entries.pop(key, None)
+                self._entries[key] = _Entry(value, version, time.monotonic())
+                if self.max_entries:
+                    while len(self._entries) > self.max_entries:
+                        oldest = next(iter(self._entries))
+                        del self._entries[oldest]
+                        self._key_locks.pop(oldest, None)
+            self.builds += 1
+            print(f"Rebuilt {self.name} cache entry '{key}' (version: {version}, builds: {self.builds}, hits: {self.hits})")
+            return value
+
+    def peek(self, key):
+        """Return the cached value for ``key`` without checking freshness."""
+        entry = self._entries.get(key)
+        return entry.value if entry else None
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _key_lock(self, key):
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def _load_version(self, load_version):
+        # Without a version the entry is only bounded by its TTL
+        try:
+            with timing.phase(f"{self.name} cache version"):
+                return load_version()
+        except Exception as e:
+            print(f"Could not read {self.name} data version: {e}")
+            return None
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name, ttl_seconds=900, check_seconds=30, max_entries=None):
+    with _caches_lock:
+        cache = _caches.get(name)
+        if cache is None:
+            cache = _caches[name] = VersionedCache(name, ttl_seconds, check_seconds, max_entries)
+        return cache
+
+
+def invalidate(name=None):
+    """Clear one named cache, or every cache when ``name`` is None."""
+    with _caches_lock:
+        caches = [_caches[name]] if name in _caches else ([] if name else list(_caches.values()))
+    for cache in caches:
+        cache.invalidate()
+    return [cache.name for cache in caches]
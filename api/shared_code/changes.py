@@ -0,0 +1,102 @@
+"""
+Writes to dbo.ghr_changes, shared by SaveChange and SaveChangeBatch.
+
+Inserts are idempotent on the change ``id``: a change that is already
+saved (a client retry after a dropped response, or the same change twice
+in one batch) is reported as a duplicate instead of inserted again. Every
+new change is folded into position_current_state in the same
+transaction.
+"""
+import json
+
+from . import current_state, payloads
+
+REQUIRED_FIELDS = ('id', 'timestamp', 'jobId', 'type')
+KEY_FIELDS = ('id', 'jobId', 'type')
+
+INSERT_SQL = '''
+    INSERT INTO dbo.ghr_changes (id, timestamp, jobid, change_type, change_data, user_name, change_blob)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def insert_params(change):
+    """
+    INSERT_SQL parameters; large payloads without a state key go to
+    change_blob compressed.
+    """
+    blob, text = payloads.split_change(
+        json.dumps(change.get('data') or {}), keyed=bool(current_state.state_key(change))
+    )
+    return (
+        change['id'],
+        change['timestamp'],
+        change['jobId'],
+        change['type'],
+        text,
+        change.get('user', 'Unknown'),
+        blob
+    )
+
+
+def _invalid(change):
+    if not isinstance(change, dict):
+        return 'Change must be an object'
+    missing = [field for field in REQUIRED_FIELDS if not change.get(field)]
+    if missing:
+        return f"Missing {', '.join(missing)}"
+    # Used as keys below and in current_state, so a list or object would
+    # fail the whole batch rather than this item
+    wrong = [field for field in KEY_FIELDS
+             if isinstance(change[field], bool) or not isinstance(change[field], (str, int))]
+    if wrong:
+        return f"{', '.join(wrong)} must be a string or number"
+    return None
+
+
+def save_changes(cursor, changes):
+    """
+    Insert ``changes`` (dicts in the front end's change format) that are not
+    saved yet, with one round trip for the lookup and one for the insert.
+    The caller commits. Returns one result per input item, in order:
+    {"id", "status": "inserted" | "duplicate" | "invalid", "error"?}.
+    """
+    results = []
+    new = {}
+    for change in changes:
+        error = _invalid(change)
+        if error:
+            results.append({'id': change.get('id') if isinstance(change, dict) else None,
+                            'status': 'invalid', 'error': error})
+            continue
+        # The lookups below get strings back from SQL Server, so an int id
+        # or jobId is compared (and stored) as one
+        change = {**change, **{field: str(change[field]) for field in KEY_FIELDS}}
+        if change['id'] in new:
+            results.append({'id': change['id'], 'status': 'duplicate'})
+        else:
+            new[change['id']] = change
+            results.append({'id': change['id'], 'status': 'inserted'})
+
+    if new:
+        # Range-locked until commit, so a concurrent retry of the same change waits here
+        cursor.execute('''
+            SELECT c.id
+            FROM dbo.ghr_changes c WITH (UPDLOCK, HOLDLOCK)
+            JOIN OPENJSON(?) j ON c.id = j.value
+        ''', json.dumps(list(new)))
+        saved = {row[0] for row in cursor.fetchall()}
+        for result in results:
+            if result['status'] == 'inserted' and result['id'] in saved:
+                result['status'] = 'duplicate'
+        for change_id in saved:
+            new.pop(change_id, None)
+
+    if new:
+        cursor.fast_executemany = True
+        cursor.executemany(INSERT_SQL, [insert_params(change) for change in new.values()])
+        cursor.fast_executemany = False
+
+        current_state.apply_many(cursor, list(new.values()))
+
+    return results
@@ -0,0 +1,58 @@
+"""
+Columnar encoding for large lists of JSON objects.
+
+Instead of repeating every key on every row, a table is sent as one array
+per column:
+
+    {"length": 3, "columns": {
+        "position_id": ["B1", "B2", "V7"],
+        "facility": {"dict": ["Cooper Hospital", "Virtua"], "codes": [0, 0, 1]}
+    }}
+
+String columns with few distinct values are dictionary encoded: the
+distinct values are listed once and each row stores an index into them
+(null stays null). Rows missing a key decode with that key set to null.
+"""
+
+
+def _encode_column(values):
+    present = [v for v in values if v is not None]
+    if present and all(isinstance(v, str) for v in present):
+        dictionary = {}
+        codes = [None if v is None else dictionary.setdefault(v, len(dictionary)) for v in values]
+        # Only worth it when values repeat, e.g. agency, facility or status
+        if len(dictionary) * 2 <= len(present):
+            return {'dict': list(dictionary), 'codes': codes}
+    return values
+
+
+def encode_table(rows, exclude=()):
+    """Encode a list of dicts as a columnar table, leaving out ``exclude`` keys."""
+    keys = {}
+    for row in rows:
+        for key in row:
+            if key not in exclude:
+                keys.setdefault(key, None)
+
+    return {
+        'length': len(rows),
+        'columns': {key: _encode_column([row.get(key) for row in rows]) for key in keys},
+    }
+
+
+def encode_nested(rows, child_key):
+    """
+    Encode ``rows`` and their ``child_key`` lists as two tables. The child
+    table carries ``counts``: how many of its rows belong to each parent row,
+    in parent order.
+    """
+    children = []
+    counts = []
+    for row in rows:
+        row_children = row.get(child_key) or []
+        children.extend(row_children)
+        counts.append(len(row_children))
+
+    child_table = encode_table(children)
+    child_table['counts'] = counts
+    return encode_table(rows, exclude=(child_key,)), child_table
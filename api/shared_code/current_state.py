@@ -0,0 +1,175 @@
+"""
+Current state of each position, kept alongside the change log.
+
+dbo.position_current_state holds one row per job: the newest saved change
+for each thing a change can set on it (each lever, the margin, the next
+step, the AV open date, each candidate). Replaying a row's changes gives
+the same position as replaying the job's full history, so the front end
+loads one row per job instead of every change ever saved.
+
+SaveChange folds each change into its job's row in the same transaction
+as the insert (``apply_many``). ``rebuild`` regenerates the whole table from
+dbo.ghr_changes, e.g. after a restore or if the table was never seeded.
+
+Requires sql/migrations/005_position_current_state.sql.
+"""
+import json
+from datetime import datetime, timezone
+from itertools import groupby
+
+from . import payloads
+
+# What a change overwrites within its job and type: the lever for
+# lever_update, the candidate for interview_scheduled / candidate_removed.
+# 004_changes_keyset.sql persists and indexes this exact expression.
+STATE_KEY_SQL = """CAST(COALESCE(
+    JSON_VALUE(change_data, '$.leverKey'),
+    JSON_VALUE(change_data, '$.candidateName') + N'|' + JSON_VALUE(change_data, '$.candidateAgency'),
+    N''
+) AS NVARCHAR(450))"""
+
+LATEST_CHANGES_SQL = f'''
+    WITH ranked AS (
+        SELECT id, timestamp, jobid, change_type, change_data, user_name, change_blob,
+               ROW_NUMBER() OVER (
+                   PARTITION BY jobid, change_type, {STATE_KEY_SQL}
+                   ORDER BY timestamp DESC, id DESC
+               ) AS rn
+        FROM dbo.ghr_changes
+    )
+    SELECT id, timestamp, jobid, change_type, change_data, user_name, change_blob
+    FROM ranked
+    WHERE rn = 1
+    ORDER BY jobid, timestamp, id
+'''
+
+
+def state_key(change):
+    """The Python side of STATE_KEY_SQL."""
+    data = change.get('data') or {}
+    if data.get('leverKey') is not None:
+        return str(data['leverKey'])
+    if data.get('candidateName') is not None and data.get('candidateAgency') is not None:
+        return f"{data['candidateName']}|{data['candidateAgency']}"
+    return ''
+
+
+def _timestamp(value):
+    """
+    A saved change's timestamp as ``rebuild`` writes it: isoformat() of
+    the naive UTC datetime SQL Server returns, whatever ISO form (e.g. a
+    JS toISOString() with its 'Z') the client sent. Anything that doesn't
+    parse is kept as sent.
+    """
+    if not isinstance(value, str):
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+    text = value.strip()
+    if text.endswith(('Z', 'z')):
+        text = text[:-1] + '+00:00'
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return value
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def _order_key(change):
+    """(timestamp, id): LATEST_CHANGES_SQL's order, newest last."""
+    return (_timestamp(change['timestamp']) or '', str(change['id']))
+
+
+def _stored(change):
+    return {
+        'id': change['id'],
+        'timestamp': _timestamp(change['timestamp']),
+        'jobId': change['jobId'],
+        'type': change['type'],
+        'data': change.get('data') or {},
+        'user': change.get('user', 'Unknown')
+    }
+
+
+def apply_many(cursor, changes):
+    """
+    Fold just-inserted changes, in order, into their jobs' rows: one read
+    and at most two writes however many jobs they touch. The rows are
+    locked until the caller commits, so concurrent saves to one job queue
+    up rather than overwrite each other.
+    """
+    job_ids = list(dict.fromkeys(change['jobId'] for change in changes))
+    cursor.execute('''
+        SELECT s.jobid, s.state_json
+        FROM dbo.position_current_state s WITH (UPDLOCK, HOLDLOCK)
+        JOIN OPENJSON(?) j ON s.jobid = j.value
+    ''', json.dumps(job_ids))
+    states = {job_id: json.loads(state_json) for job_id, state_json in cursor.fetchall()}
+    existing = set(states)
+
+    for change in changes:
+        key = (change['type'], state_key(change))
+        job_changes = states.get(change['jobId'], [])
+        current = [c for c in job_changes if (c['type'], state_key(c)) == key]
+        # A retry or a skewed clock can deliver an older change late; the
+        # newest by (timestamp, id) wins, as in LATEST_CHANGES_SQL
+        if current and _order_key(current[-1]) > _order_key(change):
+            continue
+        job_changes = [c for c in job_changes if (c['type'], state_key(c)) != key]
+        job_changes.append(_stored(change))
+        # Stored in replay order, as rebuild writes them
+        job_changes.sort(key=_order_key)
+        states[change['jobId']] = job_changes
+
+    updates = [(json.dumps(states[j]), len(states[j]), j) for j in job_ids if j in existing]
+    inserts = [(j, json.dumps(states[j]), len(states[j])) for j in job_ids if j not in existing]
+    cursor.fast_executemany = True
+    if updates:
+        cursor.executemany('''
+            UPDATE dbo.position_current_state
+            SET state_json = ?, change_count = ?, updated_at = SYSUTCDATETIME()
+            WHERE jobid = ?
+        ''', updates)
+    if inserts:
+        cursor.executemany('''
+            INSERT INTO dbo.position_current_state (jobid, state_json, change_count, updated_at)
+            VALUES (?, ?, ?, SYSUTCDATETIME())
+        ''', inserts)
+    cursor.fast_executemany = False
+
+
+def rebuild(cursor):
+    """Regenerate every row from dbo.ghr_changes. Returns the number of jobs."""
+    cursor.execute(LATEST_CHANGES_SQL)
+    rows = []
+    for job_id, group in groupby(cursor.fetchall(), key=lambda r: r[2]):
+        changes = [{
+            'id': r[0],
+            'timestamp': r[1].isoformat() if r[1] else None,
+            'jobId': r[2],
+            'type': r[3],
+            'data': json.loads(payloads.decode(r[6], r[4]) or '{}'),
+            'user': r[5]
+        } for r in group]
+        rows.append((job_id, json.dumps(changes), len(changes)))
+
+    cursor.execute('DELETE FROM dbo.position_current_state')
+    if rows:
+        cursor.fast_executemany = True
+        cursor.executemany('''
+            INSERT INTO dbo.position_current_state (jobid, state_json, change_count, updated_at)
+            VALUES (?, ?, ?, SYSUTCDATETIME())
+        ''', rows)
+        cursor.fast_executemany = False
+    return len(rows)
+
+
+def load_body(cursor):
+    """
+    {"jobs": {"<job id>": [changes...], ...}} as JSON text. The stored
+    state_json is spliced in as-is rather than parsed and re-encoded.
+    """
+    cursor.execute('SELECT jobid, state_json FROM dbo.position_current_state ORDER BY jobid')
+    return '{"jobs": {' + ', '.join(
+        json.dumps(job_id) + ': ' + (state_json or '[]') for job_id, state_json in cursor.fetchall()
+    ) + '}}'
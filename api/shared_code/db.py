@@ -0,0 +1,310 @@
+"""
+Pooled SQL Server connections shared by every function in the worker.
+
+Opening a connection costs a full TLS + login handshake, so instead of calling
+``pyodbc.connect`` per request the functions borrow a warm connection from a
+per-database pool that lives for as long as the worker process:
+
+    with db.connect('CHANGES_DB') as conn:
+        cursor = conn.cursor()
+        ...
+        conn.commit()
+
+Pools are keyed by the environment variable that names the database
+(``POSITIONS_DB`` or ``CHANGES_DB``). Pool behaviour is tuned with:
+- DB_POOL_SIZE: max open connections per database (default 8)
+- DB_POOL_TIMEOUT: seconds to wait for a free connection (default 15)
+- DB_POOL_HEALTH_CHECK_SECONDS: idle time after which a connection is
+  pinged before reuse (default 30)
+- DB_POOL_LOG_SECONDS: how often a returned connection logs every pool's
+  hit/miss counters as a JSON line (default 300, 0 turns it off); timed
+  requests also carry them in their timing log line
+- DB_PARALLEL_WORKERS: threads shared by ``run_parallel`` (default 8)
+
+A caller that needs two connections at once (two result sets read side by
+side) takes them in one step, so it never holds one while waiting for the
+other:
+
+    with db.connect_many('POSITIONS_DB', 2) as (first, second):
+        ...
+
+Independent queries can run side by side, each on its own pooled connection:
+
+    futures = db.run_parallel('POSITIONS_DB', {'b4': load_b4, 'vndly': load_vndly})
+    b4 = futures['b4'].result()
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pyodbc
+
+from . import timing
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '15'))
+HEALTH_CHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTH_CHECK_SECONDS', '30'))
+LOG_SECONDS = float(os.environ.get('DB_POOL_LOG_SECONDS', '300'))
+PARALLEL_WORKERS = int(os.environ.get('DB_PARALLEL_WORKERS', '8'))
+
+# Errors that mean the connection itself is broken rather than the statement
+BROKEN_CONNECTION_ERRORS = (pyodbc.OperationalError, pyodbc.InterfaceError)
+
+
+def connection_string(database_env):
+    return (
+        f"DRIVER={{ODBC Driver 17 for SQL Server}};"
+        f"SERVER={os.environ['DB_HOST']};"
+        f"DATABASE={os.environ[database_env]};"
+        f"UID={os.environ['DB_USER']};"
+        f"PWD={os.environ['DB_PASSWORD']};"
+        f"TrustServerCertificate=yes"
+    )
+
+
+class ConnectionPool:
+    """
+    Up to ``max_size`` open connections to one database.
+
+    Reusing an idle connection counts as a hit, opening a new one as a miss.
+    Connections idle for longer than HEALTH_CHECK_SECONDS are pinged before
+    being handed out, and connections that fail the ping or raise a
+    connection-level error are closed so the next caller reconnects.
+    """
+
+    def __init__(self, database_env, max_size=POOL_SIZE):
+        self.database_env = database_env
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self._idle = []  # (connection, last released at), most recent last
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        # Held while taking several slots, so two callers never each hold
+        # part of what they need and wait on each other
+        self._many_lock = threading.Lock()
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=POOL_TIMEOUT):
+            raise RuntimeError(
+                f"Timed out waiting for a {self.database_env} connection "
+                f"(pool size {self.max_size})"
+            )
+        try:
+            while True:
+                with self._lock:
+                    if not self._idle:
+                        break
+                    conn, released_at = self._idle.pop()
+
+                if time.monotonic() - released_at < HEALTH_CHECK_SECONDS or self._is_healthy(conn):
+                    with self._lock:
+                        self.hits += 1
+                    return conn
+                self._discard(conn)
+
+            conn = pyodbc.connect(connection_string(self.database_env))
+            with self._lock:
+                self.misses += 1
+            print(f"Opened new {self.database_env} connection ({self.describe()})")
+            return conn
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def acquire_many(self, count):
+        """
+        ``count`` connections, taken together. Only one caller at a time
+        gathers several, and single acquire() callers never wait while
+        holding a slot, so whatever it waits for is released eventually.
+        """
+        if count > self.max_size:
+            raise ValueError(f"Cannot hold {count} {self.database_env} connections (pool size {self.max_size})")
+        if not self._many_lock.acquire(timeout=POOL_TIMEOUT):
+            raise RuntimeError(
+                f"Timed out waiting for {count} {self.database_env} connections "
+                f"(pool size {self.max_size})"
+            )
+        conns = []
+        try:
+            for _ in range(count):
+                conns.append(self.acquire())
+        except BaseException:
+            for conn in conns:
+                self.release(conn)
+            raise
+        finally:
+            self._many_lock.release()
+        return conns
+
+    def release(self, conn, broken=False):
+        try:
+            if not broken:
+                try:
+                    # Never hand an open transaction to the next caller
+                    conn.rollback()
+                except pyodbc.Error:
+                    broken = True
+
+            if broken:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+        _maybe_log_pools()
+
+    def stats(self):
+        with self._lock:
+            idle = len(self._idle)
+            return {
+                'database': self.database_env,
+                'maxSize': self.max_size,
+                'idle': idle,
+                'hits': self.hits,
+                'misses': self.misses,
+                'discarded': self.discarded,
+            }
+
+    def describe(self):
+        s = self.stats()
+        return f"hits: {s['hits']}, misses: {s['misses']}, discarded: {s['discarded']}, idle: {s['idle']}"
+
+    def _is_healthy(self, conn):
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except pyodbc.Error:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database_env):
+    with _pools_lock:
+        pool = _pools.get(database_env)
+        if pool is None:
+            pool = _pools[database_env] = ConnectionPool(database_env)
+        return pool
+
+
+@contextmanager
+def connect(database_env):
+    """
+    Borrow a pooled connection to the database named by ``database_env``.
+    Uncommitted work is rolled back when the connection is returned.
+    """
+    pool = get_pool(database_env)
+    with timing.phase(f"{database_env} connect"):
+        conn = pool.acquire()
+    try:
+        yield conn
+    except BROKEN_CONNECTION_ERRORS:
+        pool.release(conn, broken=True)
+        raise
+    except BaseException:
+        pool.release(conn)
+        raise
+    else:
+        pool.release(conn)
+
+
+@contextmanager
+def connect_many(database_env, count):
+    """
+    Borrow ``count`` pooled connections at once (see
+    ConnectionPool.acquire_many). Holding them through separate connect()
+    calls can deadlock when as many callers as pool slots each hold one.
+    """
+    pool = get_pool(database_env)
+    with timing.phase(f"{database_env} connect"):
+        conns = pool.acquire_many(count)
+    broken = False
+    try:
+        yield conns
+    except BROKEN_CONNECTION_ERRORS:
+        # Can't tell which one broke
+        broken = True
+        raise
+    finally:
+        for conn in conns:
+            pool.release(conn, broken=broken)
+
+
+def pool_stats():
+    """Hit/miss counters for every pool opened by this worker."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.database_env: pool.stats() for pool in pools}
+
+
+_last_logged = time.monotonic()
+_log_lock = threading.Lock()
+
+
+def _maybe_log_pools():
+    """Print pool_stats() as one JSON line at most every LOG_SECONDS."""
+    global _last_logged
+    if LOG_SECONDS <= 0:
+        return
+    with _log_lock:
+        now = time.monotonic()
+        if now - _last_logged < LOG_SECONDS:
+            return
+        _last_logged = now
+    print(json.dumps({'event': 'pools', 'pools': pool_stats()}))
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PARALLEL_WORKERS, thread_name_prefix='db-query')
+        return _executor
+
+
+def _run_on_connection(database_env, query):
+    with connect(database_env) as conn:
+        return query(conn.cursor())
+
+
+def run_parallel(database_env, queries):
+    """
+    Start each ``queries`` value (a function taking a cursor) on its own
+    pooled connection and return their futures under the same keys.
+
+    Callers decide how to handle failures: ``future.result()`` re-raises the
+    query's exception. Don't call this while holding a connection from the
+    same pool, or the queries may wait on the connection you hold.
+
+    Each query runs in a copy of the caller's context, so it records its
+    phases on the caller's request timings.
+    """
+    executor = _get_executor()
+    return {
+        name: executor.submit(contextvars.copy_context().run, _run_on_connection, database_env, query)
+        for name, query in queries.items()
+    }
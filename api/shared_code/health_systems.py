@@ -0,0 +1,307 @@
+"""
+Health system names resolved on the server from dbo.system_mappings.
+
+A mapping is a list of keywords and the system name they stand for. A
+facility belongs to the first mapping, in sort_order, with a keyword in
+its facility name or in the health system value from the source table;
+facilities with no match keep the source value. This is the rule the
+front end's Utils.getHealthSystem applies.
+
+All keywords are compiled into one Aho-Corasick automaton, so a name is
+scanned once however many mappings there are, and each result is
+memoized per (facility, source value) on the matcher. Saving mappings
+drops the matcher, and the memo with it (``invalidate``); other workers
+notice the new mappings through ``version``.
+
+Until mappings are saved to the table, DEFAULT_MAPPINGS applies, the same
+list the front end ships with.
+
+``save_mappings`` writes a new list as a diff against the stored rows,
+guarded by the version number in dbo.system_mappings_state
+(sql/migrations/008_system_mappings_version.sql).
+"""
+from collections import deque
+
+import pyodbc
+
+from . import cache, db
+
+DEFAULT_MAPPINGS = (
+    (('capital', 'hopewell', 'deborah'), 'Capital Health'),
+    (('cooper', 'cape'), 'Cooper'),
+    (('redeemer',), 'Holy Redeemer'),
+    (('hunterdon',), 'Hunterdon'),
+    (('inspira',), 'Inspira'),
+    (('richmond', 'rumc'), 'RUMC'),
+    (('st. luke', 'sellersville', 'miners', 'carbon', 'lehigh'), 'St Lukes'),
+    (('penn', 'lancaster', 'chester', 'hup', 'presbyterian'), 'UPHS'),
+    (('virtua',), 'Virtua'),
+    (('jefferson', 'einstein', 'magee'), 'Jefferson'),
+    (('main line', 'mlh', 'lankenau', 'paoli'), 'Main Line Health'),
+    (('tower',), 'Tower Health'),
+    (('temple', 'jeanes'), 'Temple Health'),
+    (('trinity', 'mercy', 'st. mary', 'nazareth', 'st. francis'), 'Trinity Health'),
+)
+
+MAPPINGS_SQL = '''
+    SELECT keywords, system_name
+    FROM dbo.system_mappings
+    ORDER BY sort_order, id
+'''
+
+matcher_cache = cache.get_cache('health_systems', ttl_seconds=900, check_seconds=30)
+
+
+def parse_keywords(keywords):
+    """Keywords stored as one comma-separated string, as a list."""
+    return [k.strip() for k in (keywords or '').split(',') if k.strip()]
+
+
+class Matcher:
+    """
+    Aho-Corasick automaton over every mapping's keywords. Each state's
+    output is the set of mapping indexes whose keywords end there, merged
+    along failure links, so one pass over a name finds every mapping that
+    matches it.
+    """
+
+    def __init__(self, mappings):
+        self.systems = [system for _, system in mappings]
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+        outputs = [set()]
+
+        for index, (keywords, _) in enumerate(mappings):
+            for keyword in keywords:
+                state = 0
+                for char in keyword.lower():
+                    next_state = self._goto[state].get(char)
+                    if next_state is None:
+                        next_state = self._goto[state][char] = len(self._goto)
+                        self._goto.append({})
+                        self._fail.append(0)
+                        outputs.append(set())
+                    state = next_state
+                outputs[state].add(index)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                outputs[next_state] |= outputs[self._fail[next_state]]
+                queue.append(next_state)
+        self._out = [frozenset(output) for output in outputs]
+
+        self._memo = {}
+        self._facility_memo = {}
+
+    def matches(self, text):
+        """Indexes of the mappings with a keyword in ``text``."""
+        found = set()
+        state = 0
+        for char in (text or '').lower():
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            if self._out[state]:
+                found |= self._out[state]
+        return found
+
+    def resolve(self, facility, health_system):
+        """The normalized health system of a facility."""
+        key = (facility, health_system)
+        result = self._memo.get(key)
+        if result is None:
+            found = self.matches(facility) | self.matches(health_system)
+            result = self._memo[key] = self.systems[min(found)] if found else (health_system or '')
+        return result
+
+    def facility_systems(self, facility):
+        """Every mapped system with a keyword in the facility name, in sort_order."""
+        result = self._facility_memo.get(facility)
+        if result is None:
+            result = self._facility_memo[facility] = list(dict.fromkeys(
+                self.systems[index] for index in sorted(self.matches(facility))
+            ))
+        return result
+
+
+class VersionConflict(Exception):
+    """The mappings were saved by someone else since ``expected`` was read."""
+
+    def __init__(self, expected, current):
+        super().__init__(f"Mappings are at version {current}, not {expected}")
+        self.current = current
+
+
+def stored_keywords(keywords):
+    """The comma-separated keywords column for a mapping from the front end."""
+    if isinstance(keywords, list):
+        return ', '.join(keywords)
+    return str(keywords)
+
+
+def load_version(cursor):
+    cursor.execute('SELECT version FROM dbo.system_mappings_state WHERE id = 1')
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def read_version(cursor):
+    """
+    load_version() for reads, or None before 008_system_mappings_version.sql
+    has created the table, so the mappings still load. Saving needs it.
+    """
+    try:
+        return load_version(cursor)
+    except pyodbc.ProgrammingError as e:
+        # 42S02: invalid object name
+        if e.args and e.args[0] == '42S02':
+            return None
+        raise
+
+
+def _match_rows(existing, desired, ids):
+    """
+    The existing row id each desired row becomes, or None for a new row:
+    the id the front end sent if it is still stored, else an unclaimed row
+    with the same keywords and system name.
+    """
+    matched = [None] * len(desired)
+    unclaimed = set(existing)
+    for idx, row_id in enumerate(ids):
+        if row_id in unclaimed:
+            matched[idx] = row_id
+            unclaimed.discard(row_id)
+
+    by_content = {}
+    for row_id in sorted(unclaimed):
+        by_content.setdefault(existing[row_id][:2], []).append(row_id)
+    for idx, values in enumerate(desired):
+        same = by_content.get(values[:2])
+        if matched[idx] is None and same:
+            matched[idx] = same.pop(0)
+            unclaimed.discard(matched[idx])
+    return matched, unclaimed
+
+
+def save_mappings(cursor, mappings, expected_version=None):
+    """
+    Make dbo.system_mappings hold ``mappings`` (front end format, in order)
+    by inserting, updating and deleting only the rows that differ. The
+    caller commits; until then the version row and the table stay locked,
+    and readers see the old mappings rather than a half-written list.
+
+    Raises VersionConflict when ``expected_version`` is given and is not
+    the stored version. Returns {"version", "changed", "inserted",
+    "updated", "deleted"}.
+    """
+    cursor.execute('SELECT version FROM dbo.system_mappings_state WITH (UPDLOCK, HOLDLOCK) WHERE id = 1')
+    row = cursor.fetchone()
+    current = row[0] if row else 0
+    if expected_version is not None and expected_version != current:
+        raise VersionConflict(expected_version, current)
+
+    cursor.execute('''
+        SELECT id, keywords, system_name, sort_order
+        FROM dbo.system_mappings WITH (UPDLOCK, HOLDLOCK)
+    ''')
+    existing = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    desired = [
+        (stored_keywords(mapping.get('keywords', [])), mapping.get('system_name') or mapping.get('system', ''), idx)
+        for idx, mapping in enumerate(mappings)
+    ]
+    matched, unclaimed = _match_rows(existing, desired, [mapping.get('id') for mapping in mappings])
+
+    inserts = [values for values, row_id in zip(desired, matched) if row_id is None]
+    updates = [
+        values + (row_id,) for values, row_id in zip(desired, matched)
+        if row_id is not None and existing[row_id] != values
+    ]
+    deletes = [(row_id,) for row_id in sorted(unclaimed)]
+
+    cursor.fast_executemany = True
+    if deletes:
+        cursor.executemany('DELETE FROM dbo.system_mappings WHERE id = ?', deletes)
+    if updates:
+        cursor.executemany('''
+            UPDATE dbo.system_mappings
+            SET keywords = ?, system_name = ?, sort_order = ?
+            WHERE id = ?
+        ''', updates)
+    if inserts:
+        cursor.executemany('''
+            INSERT INTO dbo.system_mappings (keywords, system_name, sort_order)
+            VALUES (?, ?, ?)
+        ''', inserts)
+    cursor.fast_executemany = False
+
+    changed = bool(inserts or updates or deletes)
+    version = current + 1 if changed else current
+    if changed:
+        cursor.execute('''
+            MERGE dbo.system_mappings_state AS t
+            USING (SELECT 1 AS id, ? AS version) AS s
+            ON t.id = s.id
+            WHEN MATCHED THEN
+                UPDATE SET version = s.version, updated_at = SYSUTCDATETIME()
+            WHEN NOT MATCHED THEN
+                INSERT (id, version, updated_at) VALUES (s.id, s.version, SYSUTCDATETIME());
+        ''', version)
+
+    return {
+        'version': version,
+        'changed': changed,
+        'inserted': len(inserts),
+        'updated': len(updates),
+        'deleted': len(deletes),
+    }
+
+
+def _load_mappings():
+    with db.connect('CHANGES_DB') as conn:
+        cursor = conn.cursor()
+        cursor.execute(MAPPINGS_SQL)
+        mappings = [(parse_keywords(keywords), system_name) for keywords, system_name in cursor.fetchall()]
+    return mappings or list(DEFAULT_MAPPINGS)
+
+
+def version():
+    """Checksum of dbo.system_mappings; changes whenever the mappings are saved."""
+    with db.connect('CHANGES_DB') as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT COUNT(*), CHECKSUM_AGG(CHECKSUM(keywords, system_name, sort_order))
+            FROM dbo.system_mappings
+        ''')
+        row = cursor.fetchone()
+    return (row[0], row[1])
+
+
+def get_matcher():
+    return matcher_cache.get('matcher', version, lambda: Matcher(_load_mappings()))
+
+
+def annotate(records, facility_key, health_system_key):
+    """
+    Set ``health_system_normalized`` and ``facility_health_systems`` on each
+    record from its facility name and source health system.
+    """
+    matcher = get_matcher()
+    for record in records:
+        facility = record.get(facility_key)
+        record['health_system_normalized'] = matcher.resolve(facility, record.get(health_system_key))
+        record['facility_health_systems'] = matcher.facility_systems(facility)
+    return records
+
+
+def invalidate():
+    """Drop this worker's matcher and every response built with it."""
+    matcher_cache.invalidate()
+    cache.invalidate('positions')
@@ -0,0 +1,258 @@
+"""
+History snapshots stored as checkpoints plus change-log offsets.
+
+A snapshot row records ``high_water_seq``, the last dbo.ghr_changes.seq
+it includes. Every CHECKPOINT_EVERY snapshots, and whenever a version is
+restored, the row is a checkpoint instead: it holds the full change list
+as JSON, as every snapshot used to (compressed in ``snapshot_blob``, or
+as text in ``snapshot_data``; see payloads.py).
+
+A snapshot's change list is rebuilt from its nearest earlier checkpoint
+plus the ghr_changes rows after that checkpoint's high_water_seq, up to
+its own. Restoring is the only thing that deletes from ghr_changes, so
+it first turns every snapshot that would replay a deleted row into a
+checkpoint.
+
+Requires sql/migrations/003_history_checkpoints.sql.
+"""
+import json
+import os
+from bisect import bisect_right
+from datetime import datetime
+
+from . import changes as change_store, payloads
+
+CHECKPOINT_EVERY = int(os.environ.get('HISTORY_CHECKPOINT_EVERY', '25'))
+KEEP_SNAPSHOTS = 100
+
+SNAPSHOT_COLUMNS = 'id, snapshot_timestamp, change_count, snapshot_data, high_water_seq, is_checkpoint, snapshot_blob'
+METADATA_COLUMNS = 'id, snapshot_timestamp, change_count, NULL, high_water_seq, is_checkpoint, NULL'
+
+INSERT_SNAPSHOT_SQL = '''
+    INSERT INTO dbo.ghr_history_snapshots
+        (snapshot_timestamp, change_count, snapshot_data, snapshot_blob, high_water_seq, is_checkpoint)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+CHANGES_SQL = '''
+    SELECT seq, id, timestamp, jobid, change_type, change_data, user_name, change_blob
+    FROM dbo.ghr_changes
+    WHERE seq > ? AND seq <= ?
+    ORDER BY {order_by}
+'''
+
+
+def _change(row):
+    return {
+        'id': row[1],
+        'timestamp': row[2].isoformat() if row[2] else None,
+        'jobId': row[3],
+        'type': row[4],
+        'data': json.loads(payloads.decode(row[7], row[5]) or '{}'),
+        'user': row[6]
+    }
+
+
+def _snapshot(row):
+    return {
+        'id': row[0],
+        'timestamp': row[1].isoformat() if hasattr(row[1], 'isoformat') else row[1],
+        'changeCount': row[2],
+        'data': _load_data(row[6], row[3]),
+        'highWater': row[4],
+        'checkpoint': bool(row[5]),
+    }
+
+
+def _load_data(blob, text):
+    data = payloads.decode(blob, text)
+    return json.loads(data) if data else None
+
+
+def _document(timestamp, changes):
+    """snapshot_data in the shape the front end has always stored."""
+    return {
+        'metadata': {
+            'version': '1.0',
+            'lastUpdated': timestamp,
+            'totalChanges': len(changes)
+        },
+        'changes': changes
+    }
+
+
+def high_water(cursor):
+    cursor.execute('SELECT MAX(seq) FROM dbo.ghr_changes')
+    return cursor.fetchone()[0] or 0
+
+
+def load_snapshots(cursor, limit=KEEP_SNAPSHOTS):
+    """The newest ``limit`` snapshots, oldest first, without change lists."""
+    cursor.execute(f'''
+        SELECT TOP (?) {METADATA_COLUMNS}
+        FROM dbo.ghr_history_snapshots
+        ORDER BY id DESC
+    ''', limit)
+    return [_snapshot(row) for row in reversed(cursor.fetchall())]
+
+
+def load_snapshot(cursor, snapshot_id):
+    """One snapshot with its change list rebuilt, or None."""
+    cursor.execute(f'''
+        SELECT {SNAPSHOT_COLUMNS}
+        FROM dbo.ghr_history_snapshots
+        WHERE id = ?
+    ''', snapshot_id)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return materialize(cursor, [_snapshot(row)])[0]
+
+
+def _anchor(cursor, snapshot_id):
+    cursor.execute(f'''
+        SELECT TOP 1 {SNAPSHOT_COLUMNS}
+        FROM dbo.ghr_history_snapshots
+        WHERE is_checkpoint = 1 AND id < ?
+        ORDER BY id DESC
+    ''', snapshot_id)
+    row = cursor.fetchone()
+    return _snapshot(row) if row else None
+
+
+def materialize(cursor, snapshots):
+    """
+    Set ``data`` on every snapshot in ``snapshots`` (oldest first). The
+    change rows for all of them are read in one range query and sliced by
+    seq while walking forward from checkpoint to checkpoint.
+    """
+    replayed = [s for s in snapshots if not s['checkpoint']]
+    if not replayed:
+        return snapshots
+
+    base = None
+    for snapshot in snapshots:
+        if snapshot is replayed[0]:
+            break
+        if snapshot['checkpoint']:
+            base = snapshot
+    if base is None:
+        base = _anchor(cursor, replayed[0]['id'])
+    if base is None or base['highWater'] is None:
+        raise ValueError(f"No checkpoint to rebuild history snapshot {replayed[0]['id']} from")
+
+    cursor.execute(CHANGES_SQL.format(order_by='seq'), (base['highWater'], max(s['highWater'] for s in replayed)))
+    rows = cursor.fetchall()
+    seqs = [row[0] for row in rows]
+    changes = [_change(row) for row in rows]
+
+    base_changes = base['data']['changes']
+    base_position = bisect_right(seqs, base['highWater'])
+    for snapshot in snapshots:
+        if snapshot['id'] < base['id']:
+            continue
+        if snapshot['checkpoint']:
+            if snapshot['id'] > base['id']:
+                base_changes = snapshot['data']['changes']
+                base_position = bisect_right(seqs, snapshot['highWater'] or 0)
+            continue
+        end = bisect_right(seqs, snapshot['highWater'])
+        snapshot['data'] = _document(snapshot['timestamp'], base_changes + changes[base_position:end])
+    return snapshots
+
+
+def save_snapshot(cursor, timestamp):
+    """
+    Record a snapshot of the change log as it stands now. Returns True when
+    the snapshot was written as a checkpoint.
+    """
+    cursor.execute('SELECT MAX(seq), COUNT(*) FROM dbo.ghr_changes')
+    seq, change_count = cursor.fetchone()
+    seq = seq or 0
+    cursor.execute('''
+        SELECT c.id, (SELECT COUNT(*) FROM dbo.ghr_history_snapshots s WHERE s.id > c.id)
+        FROM (
+            SELECT MAX(id) AS id
+            FROM dbo.ghr_history_snapshots
+            WHERE is_checkpoint = 1 AND high_water_seq IS NOT NULL
+        ) c
+    ''')
+    checkpoint_id, since_checkpoint = cursor.fetchone()
+
+    checkpoint = checkpoint_id is None or since_checkpoint + 1 >= CHECKPOINT_EVERY
+    blob, data = None, None
+    if checkpoint:
+        cursor.execute(CHANGES_SQL.format(order_by='timestamp, seq'), (0, seq))
+        changes = [_change(row) for row in cursor.fetchall()]
+        blob, data = payloads.split(json.dumps(_document(timestamp, changes)))
+        change_count = len(changes)
+
+    cursor.execute(INSERT_SNAPSHOT_SQL, (timestamp, change_count, data, blob, seq, 1 if checkpoint else 0))
+    return checkpoint
+
+
+def prune(cursor, keep=KEEP_SNAPSHOTS):
+    """
+    Drop snapshots older than the newest ``keep``, except the checkpoint
+    the oldest kept snapshot is rebuilt from.
+    """
+    cursor.execute('''
+        DELETE FROM dbo.ghr_history_snapshots
+        WHERE id < (
+            SELECT MAX(c.id)
+            FROM dbo.ghr_history_snapshots c
+            WHERE c.is_checkpoint = 1
+              AND c.id <= (
+                  SELECT MIN(k.id)
+                  FROM (SELECT TOP (?) id FROM dbo.ghr_history_snapshots ORDER BY id DESC) k
+              )
+        )
+    ''', keep)
+
+
+def restore(cursor, snapshot_id):
+    """
+    Replace dbo.ghr_changes with the change list of ``snapshot_id`` and
+    record the result as a new checkpoint. Returns the restored changes.
+    """
+    cursor.execute(f'''
+        SELECT {SNAPSHOT_COLUMNS}
+        FROM dbo.ghr_history_snapshots
+        ORDER BY id
+    ''')
+    snapshots = [_snapshot(row) for row in cursor.fetchall()]
+    target = next((s for s in snapshots if s['id'] == snapshot_id), None)
+    if target is None:
+        raise KeyError(f"History snapshot {snapshot_id} not found")
+    materialize(cursor, snapshots)
+    changes = target['data']['changes']
+
+    cursor.execute('SELECT seq, id FROM dbo.ghr_changes')
+    current = {change_id: seq for seq, change_id in cursor.fetchall()}
+    keep_ids = {change['id'] for change in changes}
+    deleted = sorted(seq for change_id, seq in current.items() if change_id not in keep_ids)
+
+    if deleted:
+        # Later snapshots that replay a row about to go keep their full list
+        for snapshot in snapshots:
+            if not snapshot['checkpoint'] and snapshot['highWater'] >= deleted[0]:
+                blob, data = payloads.split(json.dumps(snapshot['data']))
+                cursor.execute('''
+                    UPDATE dbo.ghr_history_snapshots
+                    SET snapshot_data = ?, snapshot_blob = ?, is_checkpoint = 1
+                    WHERE id = ?
+                ''', (data, blob, snapshot['id']))
+
+        cursor.fast_executemany = True
+        cursor.executemany('DELETE FROM dbo.ghr_changes WHERE seq = ?', [(seq,) for seq in deleted])
+
+    missing = [change for change in changes if change['id'] not in current]
+    if missing:
+        cursor.fast_executemany = True
+        cursor.executemany(change_store.INSERT_SQL, [change_store.insert_params(change) for change in missing])
+    cursor.fast_executemany = False
+
+    timestamp = datetime.utcnow().isoformat()
+    blob, data = payloads.split(json.dumps(_document(timestamp, changes)))
+    cursor.execute(INSERT_SNAPSHOT_SQL, (timestamp, len(changes), data, blob, high_water(cursor), 1))
+    return changes
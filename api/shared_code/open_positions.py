@@ -0,0 +1,670 @@
+"""
+Open positions from the B4Health and VNDLY source tables, with their
+submissions attached as candidates.
+
+Used by GetPositions for the full list and by GetCandidates for the
+candidates of a few positions at a time. Submissions come from the
+precomputed summary tables when they are current, otherwise they are read
+and classified here (see SOURCES).
+"""
+import json
+import os
+from itertools import groupby
+
+import pyodbc
+
+from . import db, health_systems, row_encoders, timing
+
+# Positions only change when the ETL reloads these tables
+SOURCE_TABLES = (
+    'dhc.B4HEALTHOPENORDER',
+    'dhc.B4HealthOrder',
+    'dhc.B4Health_Contract_Submissions',
+    'dbo.STAGING_VNDLY_JOBS',
+    'dbo.STAGING_VNDLY_SUBMISSIONS',
+    'dbo.ghr_submission_summary_state',
+)
+
+# iter_positions reads rows in batches of this size instead of fetchall
+STREAM_BATCH_SIZE = int(os.environ.get('POSITIONS_STREAM_BATCH_SIZE', '500'))
+
+# Persisted trimmed-ID columns added by sql/migrations/001_trimmed_id_keys.sql,
+# as (table, alias used in the queries, raw ID column, key column). Tables
+# without the key column (migration not run yet, or recreated by an ETL load)
+# fall back to trimming the raw column, which cannot use an index.
+TRIMMED_KEYS = {
+    'open_order': ('dhc.B4HEALTHOPENORDER', 'o', '[Position ID]', 'position_id_key'),
+    'order': ('dhc.B4HealthOrder', 'b', 'Contract_ID', 'contract_id_key'),
+    'b4_submission': ('dhc.B4Health_Contract_Submissions', 's', 'Contract_Assignment_ID', 'contract_assignment_id_key'),
+    'vndly_job': ('dbo.STAGING_VNDLY_JOBS', 'j', '[Job Id]', 'job_id_key'),
+    'vndly_submission': ('dbo.STAGING_VNDLY_SUBMISSIONS', 's', '[Job Id]', 'job_id_key'),
+}
+
+
+def _trimmed_keys(cursor, names):
+    """
+    Join key expression for each named TRIMMED_KEYS entry: the indexed key
+    column where it exists, otherwise RTRIM(LTRIM(raw column)).
+    """
+    entries = [(name, TRIMMED_KEYS[name]) for name in names]
+    cursor.execute('SELECT ' + ', '.join(
+        f"COL_LENGTH('{table}', '{key}')" for _, (table, _, _, key) in entries
+    ))
+    row = cursor.fetchone()
+
+    keys = {}
+    missing = []
+    for (name, (table, alias, column, key)), length in zip(entries, row):
+        if length is None:
+            keys[name] = f'RTRIM(LTRIM({alias}.{column}))'
+            missing.append(f'{table}.{key}')
+        else:
+            keys[name] = f'{alias}.{key}'
+    if missing:
+        print(f"Trimmed key columns missing, joins will scan: {', '.join(missing)}")
+    return keys
+
+
+# ============================================================
+# PART 1: B4Health Open Positions
+# ============================================================
+B4_POSITIONS_SQL = '''
+    SELECT 
+        'B4' AS source_system,
+        RTRIM(LTRIM(o.[Position ID])) AS position_id,
+        o.[Program] AS program,
+        o.[Facility Name] AS facility,
+        o.[Specialty Name] AS specialty,
+        o.[Date Added] AS date_added,
+        o.[Unit Name] AS unit,
+        o.[Cost Center] AS cost_center,
+        o.[Bill Rate] AS bill_rate,
+        o.[Shift Hours] AS shift_hours,
+        o.[Shift Time] AS shift_time,
+        o.[Hiring Manager] AS hiring_manager,
+        o.[# of Submissions] AS num_submissions,
+        o.[Number of Positions] AS num_positions,
+        o.[Requisition_Reason] AS requisition_reason,
+        o.[Shift Diff] AS shift_diff,
+        o.[Min Hours] AS min_hours,
+        o.[Start Date] AS open_start_date,
+        COALESCE(b.Time_Type, CAST(o.[Shift Hours] AS NVARCHAR(50))) AS time_type,
+        b.Start_Time AS start_time,
+        b.End_Time AS end_time,
+        b.Contract_Status AS status,
+        b.Health_System AS health_system
+    FROM dhc.B4HEALTHOPENORDER o
+    LEFT JOIN dhc.B4HealthOrder b 
+        ON {open_order} = {order}
+    ORDER BY {order_by}
+'''
+
+# ============================================================
+# PART 2: VNDLY Open Positions
+# ============================================================
+VNDLY_POSITIONS_SQL = '''
+    SELECT 
+        'VNDLY' AS source_system,
+        RTRIM(LTRIM([Job Id])) AS position_id,
+        [Job Category] AS program,
+        COALESCE([Facility], [Health System]) AS facility,
+        [Job Title] AS specialty,
+        [Job Approval Date] AS date_added,
+        [Organization Unit (Job)] AS unit,
+        [Charge Code - Cost Center] AS cost_center,
+        COALESCE([Bill Rate], [Suggested Bill Rate], [Max Bill Rate]) AS bill_rate,
+        CASE 
+            WHEN [Bill Rate] IS NOT NULL THEN 0
+            ELSE 1
+        END AS bill_rate_estimated,
+        [Standard Hours Per Week] AS shift_hours,
+        [Shift Time Type] AS shift_time,
+        [Resource Manager (Job)] AS hiring_manager,
+        [Interviews Performed (for this job)] AS num_submissions,
+        [Open Positions] AS num_positions,
+        [Reason For Hire] AS requisition_reason,
+        NULL AS shift_diff,
+        NULL AS min_hours,
+        [Start Date] AS open_start_date,
+        [Job Type] AS time_type,
+        NULL AS start_time,
+        NULL AS end_time,
+        [Job Status] AS status,
+        [Health System] AS health_system
+    FROM dbo.STAGING_VNDLY_JOBS
+    WHERE [Job Status] = 'Active'
+    ORDER BY {order_by}
+'''
+
+# ============================================================
+# PART 3: B4Health Submissions
+# ============================================================
+# Joined against the open-order table instead of an IN (?, ?, ...) list so
+# the statement text never changes (one cached plan) and there is no
+# 2,100 parameter limit on the number of open positions.
+B4_SUBMISSIONS_SQL = '''
+    SELECT 
+        RTRIM(LTRIM(s.Contract_Assignment_ID)) AS Contract_Assignment_ID,
+        Agency_Name,
+        Professional,
+        Submission_Date,
+        Agency_Retracted_Date,
+        Hospital_Decline_Date,
+        Hospital_Decline_Reason,
+        Offer_Date,
+        Agency_Decline_Date,
+        Offer_Decline_Reason,
+        Date_Awarded,
+        RTO,
+        IsActive
+    FROM dhc.B4Health_Contract_Submissions s
+    WHERE EXISTS (
+        SELECT 1
+        FROM dhc.B4HEALTHOPENORDER o
+        WHERE {open_order} = {b4_submission}
+    )
+    {id_filter}
+    ORDER BY {order_by}
+'''
+
+# ============================================================
+# PART 4: VNDLY Submissions
+# ============================================================
+VNDLY_SUBMISSIONS_SQL = '''
+    SELECT 
+        RTRIM(LTRIM(s.[Job Id])) AS job_id,
+        [Full Name] AS candidate_name,
+        [Vendor Company Name] AS agency,
+        [Application Date] AS submission_date,
+        [Status] AS status,
+        [Client Interview Date] AS interview_date,
+        [Client Rejected Date] AS client_rejected_date,
+        [Rejected Reason - Choice] AS reject_reason_choice,
+        [Rejected Reason - Text] AS reject_reason_text,
+        [Vendor Offer Declined Date] AS vendor_declined_date,
+        [Vendor Withdrawn Date] AS vendor_withdrawn_date,
+        [Withdrawal Reason - Choice] AS withdrawal_reason_choice,
+        [Withdrawal Reason - Text] AS withdrawal_reason_text,
+        [Offer Release Date] AS offer_date,
+        [Offer Accepted Date] AS offer_accepted_date,
+        [Onboarded Date] AS onboarded_date,
+        [Ready To Onboard Date] AS rto_date,
+        [Candidate ID] AS candidate_id
+    FROM dbo.STAGING_VNDLY_SUBMISSIONS s
+    WHERE EXISTS (
+        SELECT 1
+        FROM dbo.STAGING_VNDLY_JOBS j
+        WHERE j.[Job Status] = 'Active'
+            AND {vndly_job} = {vndly_submission}
+    )
+    {id_filter}
+    ORDER BY {order_by}
+'''
+
+# load_candidates narrows the submission queries to a comma-separated list
+# of position IDs sent as a single parameter, so the plan is shared by every
+# batch size
+ID_FILTER = "AND {key} IN (SELECT value FROM STRING_SPLIT(?, ','))"
+
+# Streaming merges positions and submissions on the trimmed ID, so both sides
+# are sorted in binary order, which is the order Python compares strings in.
+B4_ID_ORDER = 'RTRIM(LTRIM(o.[Position ID])) COLLATE Latin1_General_BIN2'
+B4_SUBMISSION_ID_ORDER = 'RTRIM(LTRIM(s.Contract_Assignment_ID)) COLLATE Latin1_General_BIN2'
+VNDLY_ID_ORDER = 'RTRIM(LTRIM([Job Id])) COLLATE Latin1_General_BIN2'
+VNDLY_SUBMISSION_ID_ORDER = 'RTRIM(LTRIM(s.[Job Id])) COLLATE Latin1_General_BIN2'
+
+
+# Positions keep every column; the date and times are sent as text
+POSITION_OVERRIDES = (
+    ('date_added', row_encoders.iso_or_str('date_added')),
+    ('start_time', row_encoders.text('start_time')),
+    ('end_time', row_encoders.text('end_time')),
+)
+# Submission counts and candidates, filled in by _add_candidate
+POSITION_EXTRA = (
+    ('ghrSubs', '0'), ('avSubs', '0'), ('ghrDeclines', '0'), ('avDeclines', '0'), ('candidates', '[]'),
+)
+
+
+def _position_encoder(description):
+    return row_encoders.compile_encoder(
+        description, row_encoders.columns(description, POSITION_OVERRIDES, POSITION_EXTRA)
+    )
+
+
+def _add_candidate(position, candidate):
+    position['candidates'].append(candidate)
+    
+    # Update counts
+    if candidate['isDeclined']:
+        if candidate['isGHR']:
+            position['ghrDeclines'] += 1
+        else:
+            position['avDeclines'] += 1
+    else:
+        if candidate['isGHR']:
+            position['ghrSubs'] += 1
+        else:
+            position['avSubs'] += 1
+
+
+# GHR or Planet Healthcare, not The Planet Group
+IS_GHR = "'ghr' in agency or 'planet healthcare' in agency"
+
+B4_CANDIDATE_SETUP = (
+    ('agency', "str({Agency_Name} or '').lower()"),
+)
+B4_CANDIDATE = (
+    ('name', "{Professional} or 'Unknown'"),
+    ('agency', "{Agency_Name} or 'Unknown'"),
+    ('submitDate', row_encoders.iso('Submission_Date')),
+    ('offerDate', row_encoders.iso('Offer_Date')),
+    ('awardedDate', row_encoders.iso('Date_Awarded')),
+    ('rto', '{RTO}'),
+    ('isDeclined', 'bool({Hospital_Decline_Date} or {Agency_Decline_Date} or {Agency_Retracted_Date})'),
+    ('declineReason', (
+        "({Hospital_Decline_Reason} or 'Hospital Declined') if {Hospital_Decline_Date}"
+        " else ({Offer_Decline_Reason} or 'Agency Declined') if {Agency_Decline_Date}"
+        " else 'Agency Retracted' if {Agency_Retracted_Date}"
+        " else None"
+    )),
+    ('hospDeclineDate', row_encoders.iso('Hospital_Decline_Date')),
+    ('agencyDeclineDate', row_encoders.iso('Agency_Decline_Date')),
+    ('agencyRetractedDate', row_encoders.iso('Agency_Retracted_Date')),
+    ('isGHR', IS_GHR),
+    ('isActive', '{IsActive} or False'),
+)
+
+VNDLY_CANDIDATE_SETUP = (
+    ('status', "str({status} or '').lower()"),
+    ('agency', "str({agency} or '').lower()"),
+)
+VNDLY_CANDIDATE = (
+    ('name', "{candidate_name} or 'Unknown'"),
+    ('agency', "{agency} or 'Unknown'"),
+    ('submitDate', row_encoders.iso('submission_date')),
+    ('offerDate', row_encoders.iso('offer_date')),
+    ('awardedDate', row_encoders.iso('offer_accepted_date')),
+    ('rto', row_encoders.iso('rto_date')),
+    # Declined or withdrawn by date or by status
+    ('isDeclined', (
+        "bool({client_rejected_date} or {vendor_declined_date} or {vendor_withdrawn_date}"
+        " or status in ('rejected', 'offer declined', 'job closed'))"
+    )),
+    ('declineReason', (
+        "({reject_reason_choice} or {reject_reason_text} or 'Client Rejected')"
+        " if {client_rejected_date} or status == 'rejected'"
+        " else 'Vendor Declined Offer' if {vendor_declined_date} or status == 'offer declined'"
+        " else ({withdrawal_reason_choice} or {withdrawal_reason_text} or 'Vendor Withdrawn')"
+        " if {vendor_withdrawn_date}"
+        " else 'Job Closed' if status == 'job closed'"
+        " else None"
+    )),
+    ('hospDeclineDate', row_encoders.iso('client_rejected_date')),
+    ('agencyDeclineDate', row_encoders.iso('vendor_declined_date')),
+    ('agencyRetractedDate', row_encoders.iso('vendor_withdrawn_date')),
+    ('interviewDate', row_encoders.iso('interview_date')),
+    ('isGHR', IS_GHR),
+    ('isActive', "{status} == 'Active' if {status} else False"),
+    ('status', '{status}'),
+)
+
+
+def _candidate_encoder(description, source, output='dict'):
+    return row_encoders.compile_encoder(
+        description, source['candidate_fields'], source['candidate_setup'], output
+    )
+
+
+# ============================================================
+# Precomputed submissions (sql/migrations/002_submission_summary.sql)
+# ============================================================
+SUMMARY_COUNTS_SQL = '''
+    SELECT position_id, ghr_subs, av_subs, ghr_declines, av_declines
+    FROM dbo.ghr_position_submission_summary
+    WHERE source_system = ?
+'''
+
+SUMMARY_CANDIDATES_SQL = '''
+    SELECT position_id, name, agency, submit_date, offer_date, awarded_date, rto, rto_date,
+        is_declined, decline_reason, hosp_decline_date, agency_decline_date,
+        agency_retracted_date, interview_date, is_ghr, is_active, status
+    FROM dbo.ghr_position_candidates
+    WHERE source_system = ?
+    {id_filter}
+    ORDER BY position_id, candidate_seq
+'''
+
+# Candidate keys in the order B4_CANDIDATE / VNDLY_CANDIDATE build them,
+# with the summary column each one is read from
+B4_SUMMARY_FIELDS = (
+    ('name', 'name'), ('agency', 'agency'), ('submitDate', 'submit_date'),
+    ('offerDate', 'offer_date'), ('awardedDate', 'awarded_date'), ('rto', 'rto'),
+    ('isDeclined', 'is_declined'), ('declineReason', 'decline_reason'),
+    ('hospDeclineDate', 'hosp_decline_date'), ('agencyDeclineDate', 'agency_decline_date'),
+    ('agencyRetractedDate', 'agency_retracted_date'), ('isGHR', 'is_ghr'), ('isActive', 'is_active'),
+)
+VNDLY_SUMMARY_FIELDS = (
+    ('name', 'name'), ('agency', 'agency'), ('submitDate', 'submit_date'),
+    ('offerDate', 'offer_date'), ('awardedDate', 'awarded_date'), ('rto', 'rto_date'),
+    ('isDeclined', 'is_declined'), ('declineReason', 'decline_reason'),
+    ('hospDeclineDate', 'hosp_decline_date'), ('agencyDeclineDate', 'agency_decline_date'),
+    ('agencyRetractedDate', 'agency_retracted_date'), ('interviewDate', 'interview_date'),
+    ('isGHR', 'is_ghr'), ('isActive', 'is_active'), ('status', 'status'),
+)
+
+
+def _summary_encoder(description, source, output='dict'):
+    return row_encoders.compile_encoder(description, tuple(
+        (key, row_encoders.iso_or_value(column)) for key, column in source['summary_fields']
+    ), output=output)
+
+# How each source's positions and submissions are loaded and combined
+SOURCES = {
+    'b4': {
+        'keys': ('open_order', 'order', 'b4_submission'),
+        'positions_sql': B4_POSITIONS_SQL,
+        'submissions_sql': B4_SUBMISSIONS_SQL,
+        'order_by': 'o.[Date Added] DESC',
+        'id_order': B4_ID_ORDER,
+        'submission_id_order': B4_SUBMISSION_ID_ORDER,
+        'submission_id': 'Contract_Assignment_ID',
+        'submission_key': 'b4_submission',
+        'candidate_fields': B4_CANDIDATE,
+        'candidate_setup': B4_CANDIDATE_SETUP,
+        'summary_source': 'B4',
+        'summary_fields': B4_SUMMARY_FIELDS,
+        'tables': ('dhc.B4HEALTHOPENORDER', 'dhc.B4Health_Contract_Submissions'),
+    },
+    'vndly': {
+        'keys': ('vndly_job', 'vndly_submission'),
+        'positions_sql': VNDLY_POSITIONS_SQL,
+        'submissions_sql': VNDLY_SUBMISSIONS_SQL,
+        'order_by': '[Job Approval Date] DESC',
+        'id_order': VNDLY_ID_ORDER,
+        'submission_id_order': VNDLY_SUBMISSION_ID_ORDER,
+        'submission_id': 'job_id',
+        'submission_key': 'vndly_submission',
+        'candidate_fields': VNDLY_CANDIDATE,
+        'candidate_setup': VNDLY_CANDIDATE_SETUP,
+        'summary_source': 'VNDLY',
+        'summary_fields': VNDLY_SUMMARY_FIELDS,
+        'tables': ('dbo.STAGING_VNDLY_JOBS', 'dbo.STAGING_VNDLY_SUBMISSIONS'),
+    },
+}
+
+
+def _summary_is_current(cursor, source):
+    """
+    True when the precomputed summaries exist and were refreshed after the
+    last write to this source's tables. Without VIEW DATABASE STATE the last
+    write is unknown and the summaries are trusted.
+    """
+    cursor.execute("SELECT OBJECT_ID('dbo.ghr_submission_summary_state')")
+    if cursor.fetchone()[0] is None:
+        return False
+    cursor.execute('SELECT refreshed_at FROM dbo.ghr_submission_summary_state WHERE id = 1')
+    row = cursor.fetchone()
+    if row is None:
+        return False
+
+    object_ids = ', '.join(f"OBJECT_ID('{table}')" for table in source['tables'])
+    try:
+        cursor.execute(f'''
+            SELECT MAX(us.last_user_update)
+            FROM sys.dm_db_index_usage_stats us
+            WHERE us.database_id = DB_ID() AND us.object_id IN ({object_ids})
+        ''')
+        last_update = cursor.fetchone()[0]
+    except pyodbc.Error:
+        return True
+
+    if last_update is not None and last_update > row[0]:
+        print(f"{source['summary_source']} submission summary is older than the last load, computing counts live")
+        return False
+    return True
+
+
+def _attach_summaries(cursor, source, pos_lookup):
+    """Counts and candidates from the precomputed summary tables."""
+    label = f"{source['summary_source']} summary"
+    with timing.phase(f"{label} execute"):
+        cursor.execute(SUMMARY_COUNTS_SQL, source['summary_source'])
+    with timing.phase(f"{label} fetch") as phase:
+        counts = cursor.fetchall()
+        phase.rows = len(counts)
+    for pos_id, ghr_subs, av_subs, ghr_declines, av_declines in counts:
+        position = pos_lookup.get(pos_id)
+        if position:
+            position['ghrSubs'] = ghr_subs
+            position['avSubs'] = av_subs
+            position['ghrDeclines'] = ghr_declines
+            position['avDeclines'] = av_declines
+
+    with timing.phase(f"{label} candidates execute"):
+        cursor.execute(SUMMARY_CANDIDATES_SQL.format(id_filter=''), source['summary_source'])
+    encode = _summary_encoder(cursor.description, source)
+    with timing.phase(f"{label} candidates fetch") as phase:
+        rows = cursor.fetchall()
+        phase.rows = len(rows)
+    id_index = row_encoders.index(cursor.description, 'position_id')
+    with timing.phase(f"{label} candidates transform"):
+        for row in rows:
+            position = pos_lookup.get(row[id_index])
+            if position:
+                position['candidates'].append(encode(row))
+
+
+def _load_source(cursor, source):
+    """One source's open positions with their submissions attached."""
+    name = source['summary_source']
+    keys = _trimmed_keys(cursor, source['keys'])
+
+    with timing.phase(f"{name} positions execute"):
+        cursor.execute(source['positions_sql'].format(order_by=source['order_by'], **keys))
+    encode = _position_encoder(cursor.description)
+    with timing.phase(f"{name} positions fetch") as phase:
+        rows = cursor.fetchall()
+        phase.rows = len(rows)
+    with timing.phase(f"{name} positions transform"):
+        positions = [encode(row) for row in rows]
+    
+    # Create lookup dict for positions
+    pos_lookup = {p['position_id']: p for p in positions}
+    
+    if not any(p.get('position_id') for p in positions):
+        return positions
+
+    if _summary_is_current(cursor, source):
+        _attach_summaries(cursor, source, pos_lookup)
+    else:
+        with timing.phase(f"{name} submissions execute"):
+            cursor.execute(source['submissions_sql'].format(order_by='(SELECT NULL)', id_filter='', **keys))
+        encode = _candidate_encoder(cursor.description, source)
+        id_index = row_encoders.index(cursor.description, source['submission_id'])
+        with timing.phase(f"{name} submissions fetch") as phase:
+            rows = cursor.fetchall()
+            phase.rows = len(rows)
+
+        with timing.phase(f"{name} submissions transform"):
+            for row in rows:
+                pos_id = row[id_index]
+
+                if pos_id and pos_id in pos_lookup:
+                    _add_candidate(pos_lookup[pos_id], encode(row))
+
+    return positions
+
+
+def load_positions():
+    """
+    Builds the merged B4 + VNDLY open positions list with submission
+    counts, candidate details and the normalized health system attached
+    to each position. The two sources share nothing, so each loads on its
+    own pooled connection at the same time and the rebuild takes as long
+    as the slower one.
+    """
+    futures = db.run_parallel('POSITIONS_DB', {
+        name: (lambda cursor, source=source: _load_source(cursor, source))
+        for name, source in SOURCES.items()
+    })
+    positions = futures['b4'].result() + futures['vndly'].result()
+    with timing.phase('health systems') as phase:
+        phase.rows = len(positions)
+        return health_systems.annotate(positions, 'facility', 'health_system')
+
+
+def _fetch_batches(cursor, label, encode):
+    while True:
+        with timing.phase(f"{label} fetch") as phase:
+            rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+            phase.rows = len(rows)
+        if not rows:
+            break
+        for row in rows:
+            yield encode(row)
+
+
+def _iter_source(source):
+    """
+    Yields one source's positions, each as soon as its submissions are
+    attached. Positions and submissions come back sorted by ID on two
+    connections (taken from the pool together) and are merged, so only one
+    batch of each is held at a time.
+    """
+    with db.connect_many('POSITIONS_DB', 2) as (positions_conn, submissions_conn):
+        positions_cursor = positions_conn.cursor()
+        submissions_cursor = submissions_conn.cursor()
+        keys = _trimmed_keys(positions_cursor, source['keys'])
+        name = source['summary_source']
+
+        with timing.phase(f"{name} positions execute"):
+            positions_cursor.execute(source['positions_sql'].format(order_by=source['id_order'], **keys))
+        with timing.phase(f"{name} submissions execute"):
+            submissions_cursor.execute(source['submissions_sql'].format(
+                order_by=source['submission_id_order'], id_filter='', **keys
+            ))
+
+        # Each submission as (position ID, candidate)
+        encode_candidate = _candidate_encoder(submissions_cursor.description, source)
+        id_index = row_encoders.index(submissions_cursor.description, source['submission_id'])
+        submissions = _fetch_batches(
+            submissions_cursor, f"{name} submissions",
+            lambda row: (row[id_index] if id_index is not None else None, encode_candidate(row))
+        )
+        sub = next(submissions, None)
+        positions = _fetch_batches(positions_cursor, f"{name} positions", _position_encoder(positions_cursor.description))
+        for pos_id, group in groupby(positions, key=lambda p: p.get('position_id')):
+            group = list(group)
+            if pos_id:
+                # Submissions for IDs without an open position are skipped
+                while sub is not None and (sub[0] or '') < pos_id:
+                    sub = next(submissions, None)
+                while sub is not None and sub[0] == pos_id:
+                    # Duplicate IDs: the last row wins, as with the lookup dict
+                    _add_candidate(group[-1], sub[1])
+                    sub = next(submissions, None)
+            yield from health_systems.annotate(group, 'facility', 'health_system')
+
+
+def iter_positions():
+    """
+    Every open position with its candidates, B4 then VNDLY, ordered by ID
+    within each source. Rows are read STREAM_BATCH_SIZE at a time.
+    """
+    for source in SOURCES.values():
+        yield from _iter_source(source)
+
+
+def _load_source_candidates(cursor, source, ids, output):
+    """Candidates of the open positions in ``ids`` from one source, by position ID."""
+    keys = _trimmed_keys(cursor, source['keys'])
+    candidates = {}
+
+    if _summary_is_current(cursor, source):
+        sql = SUMMARY_CANDIDATES_SQL.format(id_filter=ID_FILTER.format(key='position_id'))
+        with timing.phase(f"{source['summary_source']} summary candidates execute"):
+            cursor.execute(sql, source['summary_source'], ','.join(ids))
+        encode = _summary_encoder(cursor.description, source, output)
+        id_index = row_encoders.index(cursor.description, 'position_id')
+        with timing.phase(f"{source['summary_source']} summary candidates fetch") as phase:
+            rows = cursor.fetchall()
+            phase.rows = len(rows)
+        for row in rows:
+            candidates.setdefault(row[id_index], []).append(encode(row))
+        return candidates
+
+    sql = source['submissions_sql'].format(
+        order_by='(SELECT NULL)',
+        id_filter=ID_FILTER.format(key=keys[source['submission_key']]),
+        **keys
+    )
+    with timing.phase(f"{source['summary_source']} submissions execute"):
+        cursor.execute(sql, ','.join(ids))
+    encode = _candidate_encoder(cursor.description, source, output)
+    id_index = row_encoders.index(cursor.description, source['submission_id'])
+    with timing.phase(f"{source['summary_source']} submissions fetch") as phase:
+        rows = cursor.fetchall()
+        phase.rows = len(rows)
+    for row in rows:
+        pos_id = row[id_index]
+        if pos_id:
+            candidates.setdefault(pos_id, []).append(encode(row))
+    return candidates
+
+
+def load_candidates(position_ids, output='dict'):
+    """
+    Candidates for just the given positions, as {position ID: [candidate]},
+    built exactly as load_positions builds them. Both sources are queried in
+    parallel; IDs with no submissions (or no open position) map to [].
+    With ``output='json'`` each candidate is its JSON text instead.
+    """
+    ids = sorted({str(i).strip() for i in position_ids if i and ',' not in str(i)})
+    if not ids:
+        return {}
+
+    futures = db.run_parallel('POSITIONS_DB', {
+        name: (lambda cursor, source=source: _load_source_candidates(cursor, source, ids, output))
+        for name, source in SOURCES.items()
+    })
+    candidates = {position_id: [] for position_id in ids}
+    for name in SOURCES:
+        for position_id, source_candidates in futures[name].result().items():
+            if position_id in candidates:
+                candidates[position_id].extend(source_candidates)
+    return candidates
+
+
+def candidates_body(position_ids):
+    """
+    {"candidates": {"<position id>": [...]}} as JSON text, spliced from
+    candidates encoded straight from their rows rather than built as dicts
+    and serialized again.
+    """
+    candidates = load_candidates(position_ids, output='json')
+    return '{"candidates": {' + ', '.join(
+        json.dumps(position_id) + ': [' + ', '.join(items) + ']' for position_id, items in candidates.items()
+    ) + '}}'
+
+
+def data_version():
+    """
+    Cheap fingerprint of the source tables: last write time and row counts.
+    Reading index usage stats needs VIEW DATABASE STATE; without it the
+    cached payload is only refreshed by TTL or explicit invalidation.
+    """
+    object_ids = ', '.join(f"OBJECT_ID('{table}')" for table in SOURCE_TABLES)
+    with db.connect('POSITIONS_DB') as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT
+                (SELECT MAX(us.last_user_update)
+                 FROM sys.dm_db_index_usage_stats us
+                 WHERE us.database_id = DB_ID() AND us.object_id IN ({object_ids})) AS last_update,
+                (SELECT SUM(p.rows)
+                 FROM sys.partitions p
+                 WHERE p.index_id IN (0, 1) AND p.object_id IN ({object_ids})) AS row_count
+        ''')
+        row = cursor.fetchone()
+    return (row[0].isoformat() if row[0] else None, row[1])
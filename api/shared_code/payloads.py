@@ -0,0 +1,80 @@
+"""
+Compressed JSON payloads for VARBINARY(MAX) columns.
+
+History snapshots and large change payloads are stored as a format
+version byte followed by the compressed UTF-8 JSON:
+
+- 0x01: zlib
+- 0x02: zstd (needs the optional ``zstandard`` package)
+
+PAYLOAD_COMPRESSION picks what new writes use: ``zlib`` (default),
+``zstd``, or ``none`` to keep writing plain text to the old NVARCHAR
+columns. ``decode`` reads every format, including the plain text rows
+written before this existed, so old and new rows can sit side by side.
+"""
+import os
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZLIB = 1
+ZSTD = 2
+
+COMPRESSION = os.environ.get('PAYLOAD_COMPRESSION', 'zlib').lower()
+if COMPRESSION == 'zstd' and zstandard is None:
+    print("PAYLOAD_COMPRESSION=zstd but zstandard is not installed; using zlib")
+    COMPRESSION = 'zlib'
+
+# Change payloads below this stay plain text: compression saves nothing on them
+CHANGE_COMPRESS_MIN_BYTES = int(os.environ.get('CHANGE_COMPRESS_MIN_BYTES', '1024'))
+
+
+def enabled():
+    return COMPRESSION != 'none'
+
+
+def encode(text):
+    """Version byte + compressed ``text`` (a JSON string)."""
+    data = text.encode('utf-8')
+    if COMPRESSION == 'zstd':
+        return bytes([ZSTD]) + zstandard.ZstdCompressor(level=6).compress(data)
+    return bytes([ZLIB]) + zlib.compress(data, 6)
+
+
+def decode(blob, text=None):
+    """
+    The JSON text of a payload stored either as ``blob`` (VARBINARY, any
+    version) or, for rows written without compression, as ``text``.
+    """
+    if blob is None:
+        return text
+    blob = bytes(blob)
+    version, body = blob[0], blob[1:]
+    if version == ZLIB:
+        return zlib.decompress(body).decode('utf-8')
+    if version == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Payload is zstd compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(body).decode('utf-8')
+    raise ValueError(f"Unknown payload format version {version}")
+
+
+def split(text):
+    """(blob, text) to write for a snapshot payload, one of them None."""
+    if enabled():
+        return encode(text), None
+    return None, text
+
+
+def split_change(text, keyed=False):
+    """
+    (blob, text) to write for a change payload; small ones stay text. So do
+    ``keyed`` ones (a lever or candidate change) of any size: the state_key
+    column reads their key from change_data with JSON_VALUE.
+    """
+    if enabled() and not keyed and len(text) >= CHANGE_COMPRESS_MIN_BYTES:
+        return encode(text), None
+    return None, text
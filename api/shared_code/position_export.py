@@ -0,0 +1,273 @@
+"""
+Open positions with their saved state, as export rows.
+
+Builds the same columns the page's Export buttons did from its loaded
+jobs: the position fields, then margin, next step, AV open date, shift
+length, bill rate, one column per lever, scheduled interviews and the
+session updates log. The state comes from dbo.position_current_state
+(the newest change of each kind per job), read for one batch of positions
+at a time.
+
+Rows are produced one position at a time from open_positions.iter_positions
+and written as CSV or, with the optional ``openpyxl`` package, as XLSX in
+write-only mode (rows go to a temporary file, not a worksheet in memory).
+"""
+import csv
+import io
+import json
+import math
+import os
+import re
+import tempfile
+from datetime import datetime
+from itertools import islice
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+from . import db, open_positions, position_index
+
+DEFAULT_MARGIN = os.environ.get('DEFAULT_MARGIN', '25')
+
+# Position fields, in export order
+POSITION_COLUMNS = (
+    'source_system', 'position_id', 'program', 'facility', 'health_system', 'health_system_normalized',
+    'specialty', 'date_added', 'unit', 'cost_center', 'bill_rate', 'bill_rate_estimated',
+    'shift_hours', 'shift_time', 'time_type', 'start_time', 'end_time', 'hiring_manager',
+    'num_submissions', 'num_positions', 'requisition_reason', 'shift_diff', 'min_hours',
+    'open_start_date', 'status', 'ghrSubs', 'avSubs', 'ghrDeclines', 'avDeclines',
+)
+
+# The page's job.levers keys, in its order, and CONSTANTS.LEVER_LABELS
+LEVER_KEYS = (
+    'socialMedia', 'agencyOutreach', 'bonus', 'rateIncrease', 'openToAVs', 'hotSheet', 'hotJob',
+    'adjStartPeriod', 'flex48', 'autoOffer', 'relaxRequirements', 'additionalRecruiter',
+    'recruiterIncentive', 'payAdj',
+)
+LEVER_LABELS = {
+    'relaxRequirements': 'Relax Requirements',
+    'adjStartPeriod': 'Adjusted Start Period',
+    'autoOffer': 'Auto Offer',
+    'flex48': 'Flex 48hr Schedule',
+    'hotJob': 'Hot Job Promotion',
+    'additionalRecruiter': 'Additional Recruiter Support',
+    'recruiterIncentive': 'Recruiter Incentive',
+    'payAdj': 'Pay/Margin Adjustment',
+    'openToAVs': 'Open to AVs',
+}
+
+TRAVEL_AGING_MIN_DAYS = 16
+NURSING_KEYWORDS = ('nursing', 'rn', 'nurse', 'lpn', 'cna', 'practitioner', 'midwife', 'crna')
+
+# report -> sheet name; the travel aging report adds Days Past and Levers
+# Pulled Count and, like the page's, leaves out the session updates log
+REPORTS = {
+    'positions': 'Updated_Positions',
+    'travel_aging': 'Travel_Aging_Report',
+}
+
+
+def header(report):
+    columns = list(POSITION_COLUMNS)
+    if report == 'travel_aging':
+        columns += ['Days Past', 'Levers Pulled Count']
+    columns += ['Current Margin', 'Next Steps', 'AV Open Date', 'Shift Time', 'Bill Rate']
+    columns += [f"Lever: {LEVER_LABELS.get(key, key)}" for key in LEVER_KEYS]
+    columns.append('Scheduled Interviews')
+    if report != 'travel_aging':
+        columns.append('Session Updates Log')
+    return columns
+
+
+def clean_bill_rate(bill_rate):
+    """The page's cleanBillRate: '$52.5' -> '$52.50/hr'."""
+    if not bill_rate:
+        return ''
+    cleaned = re.sub(r'/hr|/hour|per hour', '', str(bill_rate).strip().replace('$', ''), flags=re.I).strip()
+    match = re.match(r'\s*[-+]?(\d+\.?\d*|\.\d+)', cleaned)
+    if match and float(match.group(0)) >= 0:
+        num = float(match.group(0))
+        if num <= 0.01:
+            return f"${num:.2f}"
+        if num >= 1000:
+            return f"${num:,.0f}"
+        if num % 1 == 0:
+            return f"${num:,.0f}/hr"
+        return f"${num:,.2f}/hr"
+    return cleaned if cleaned.startswith('$') else '$' + cleaned
+
+
+def shift_length(start_time, end_time):
+    """The page's calculateShiftLength: hours between two clock times."""
+    if not start_time or not end_time:
+        return ''
+
+    def minutes(value):
+        match = re.search(r'(\d{1,2}):?(\d{2})?\s*(AM|PM)?', str(value).strip().upper())
+        if not match:
+            return 0
+        hours, mins = int(match.group(1)), int(match.group(2) or 0)
+        if match.group(3) == 'PM' and hours != 12:
+            hours += 12
+        if match.group(3) == 'AM' and hours == 12:
+            hours = 0
+        return hours * 60 + mins
+
+    diff = minutes(end_time) - minutes(start_time)
+    if diff <= 0:
+        diff += 24 * 60
+    hours = diff / 60
+    return str(int(hours)) if hours % 1 == 0 else f"{hours:.1f}"
+
+
+def days_past(date_added, now):
+    """Utils.calcDays: whole days since the position was added, rounded up."""
+    if not date_added:
+        return 0
+    try:
+        added = datetime.fromisoformat(str(date_added))
+    except ValueError:
+        return 0
+    return math.ceil((now - added).total_seconds() / 86400)
+
+
+def _state(changes):
+    """What replaying ``changes`` onto a freshly loaded job gives the page."""
+    state = {
+        'margin': DEFAULT_MARGIN,
+        'nextStep': None,
+        'avOpenDate': None,
+        'levers': {},
+        'history': [],
+        'interviews': {},
+    }
+    for change in changes:
+        data = change.get('data') or {}
+        kind = change.get('type')
+        if kind == 'lever_update' and data.get('leverKey') in LEVER_KEYS:
+            state['levers'][data['leverKey']] = data if data.get('done') is True else None
+        elif kind == 'margin_update':
+            try:
+                margin = float(data.get('margin'))
+                state['margin'] = str(int(margin)) if margin % 1 == 0 else data.get('margin')
+            except (TypeError, ValueError):
+                state['margin'] = data.get('margin')
+        elif kind == 'next_step_update':
+            state['nextStep'] = data.get('nextStep')
+        elif kind == 'av_open_date_update':
+            state['avOpenDate'] = data.get('avOpenDate')
+        elif kind == 'history_update' and isinstance(data.get('history'), list):
+            state['history'] = data['history']
+        elif kind == 'interview_scheduled':
+            state['interviews'][(data.get('candidateName'), data.get('candidateAgency'))] = data.get('interviewDate')
+    return state
+
+
+def _row(position, state, report, now):
+    row = [position.get(column) for column in POSITION_COLUMNS]
+
+    levers_done = [key for key in LEVER_KEYS if state['levers'].get(key)]
+    if report == 'travel_aging':
+        row += [days_past(position.get('date_added'), now), len(levers_done)]
+
+    next_step = state['nextStep']
+    row += [
+        f"{state['margin']}%" if state['margin'] else '',
+        f"[{next_step.get('date') or ''}] {next_step.get('text') or ''}" if isinstance(next_step, dict) else '',
+        state['avOpenDate'] or '',
+        shift_length(position.get('start_time'), position.get('end_time')) or str(position.get('shift_time') or ''),
+        clean_bill_rate(position.get('bill_rate')),
+    ]
+    for key in LEVER_KEYS:
+        lever = state['levers'].get(key)
+        row.append(f"{lever.get('user') or ''} ({lever.get('time') or ''})" if lever else '')
+
+    interviews = []
+    for candidate in position.get('candidates') or []:
+        date = state['interviews'].get((candidate.get('name'), candidate.get('agency')), candidate.get('interviewDate'))
+        if date:
+            interviews.append(f"{candidate.get('name')} ({date})")
+    row.append('; '.join(interviews))
+    if report != 'travel_aging':
+        row.append(json.dumps(state['history']) if state['history'] else '')
+    return row
+
+
+def _travel_aging(position, state, now):
+    """exportTravelAgingReport's criteria."""
+    program = str(position.get('program') or '').lower()
+    if days_past(position.get('date_added'), now) < TRAVEL_AGING_MIN_DAYS:
+        return False
+    if 'travel' not in program or not any(k in program for k in NURSING_KEYWORDS):
+        return False
+    return sum(1 for key in LEVER_KEYS if state['levers'].get(key)) <= 1
+
+
+def _load_states(cursor, job_ids):
+    cursor.execute('''
+        SELECT s.jobid, s.state_json
+        FROM dbo.position_current_state s
+        JOIN OPENJSON(?) j ON s.jobid = j.value
+    ''', json.dumps(job_ids))
+    return {job_id: json.loads(state_json or '[]') for job_id, state_json in cursor.fetchall()}
+
+
+def iter_rows(selections, search=None, report='positions', now=None):
+    """
+    Export rows for the open positions matching ``selections`` / ``search``
+    (as in position_index), one position at a time. Saved state is read
+    for STREAM_BATCH_SIZE positions per query.
+    """
+    now = now or datetime.now()
+    positions = (p for p in open_positions.iter_positions() if position_index.matches(p, selections, search))
+    with db.connect('CHANGES_DB') as conn:
+        cursor = conn.cursor()
+        while True:
+            batch = list(islice(positions, open_positions.STREAM_BATCH_SIZE))
+            if not batch:
+                break
+            states = _load_states(cursor, [str(p.get('position_id')) for p in batch])
+            for position in batch:
+                state = _state(states.get(str(position.get('position_id')), []))
+                if report == 'travel_aging' and not _travel_aging(position, state, now):
+                    continue
+                yield _row(position, state, report, now)
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def write_csv(rows, report):
+    """CSV bytes (UTF-8 with BOM, so Excel reads it as UTF-8); returns (bytes, row count)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header(report))
+    count = 0
+    for row in rows:
+        writer.writerow([_cell(value) for value in row])
+        count += 1
+    return ('﻿' + buffer.getvalue()).encode('utf-8'), count
+
+
+def write_xlsx(rows, report):
+    """XLSX bytes written by a write-only workbook; returns (bytes, row count)."""
+    if openpyxl is None:
+        raise RuntimeError("XLSX export needs the openpyxl package")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(REPORTS[report])
+    sheet.append(header(report))
+    count = 0
+    for row in rows:
+        sheet.append([_cell(value) for value in row])
+        count += 1
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        return file.read(), count
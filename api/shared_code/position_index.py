@@ -0,0 +1,224 @@
+"""
+Filtering, sorting, paging and facet counts over the cached positions.
+
+GetPositions builds a PositionIndex once per positions snapshot. Each
+filter dropdown the page shows is a facet, and every distinct value of a
+facet gets a bitset of the positions that have it (a Python int, bit i
+for position i). A query is a few big-int ANDs and ORs, so it costs the
+same however the filters are combined:
+
+- positions match when, for every facet with a selection, they have one
+  of the selected values
+- a facet's counts use every selection except its own, so the dropdowns
+  cascade the way updateAllFilterOptions does on the page
+
+Sort orders are built the first time each sort key is asked for. The
+B4 and VNDLY sources don't agree on column types (a bill rate is a number
+in one and "$85.00" text in the other), so values are normalized first:
+numbers and numeric text sort together by value, ahead of dates, ahead of
+any other text.
+"""
+import datetime
+import decimal
+import json
+import re
+import threading
+
+# facet name (as in the page's filterSelection) -> position field
+FACETS = {
+    'systems': 'health_system_normalized',
+    'facilities': 'facility',
+    'categories': 'program',
+    'specialties': 'specialty',
+    'sources': 'source_system',
+}
+
+SORT_KEYS = (
+    'position_id', 'date_added', 'facility', 'specialty', 'program', 'unit',
+    'health_system_normalized', 'bill_rate', 'num_positions', 'ghrSubs', 'avSubs',
+)
+
+
+def clean_filter_text(text):
+    """Utils.cleanFilterText: 'ICU - ICU' -> 'ICU'."""
+    if not text:
+        return ''
+    text = str(text)
+    parts = [part.strip() for part in text.split('-')]
+    if len(parts) == 2 and parts[0].lower() == parts[1].lower():
+        return parts[0]
+    return text
+
+
+def parse_selections(params):
+    """
+    {facet: [values]} from request parameters named after FACETS, each one
+    value or a JSON array of values. Raises ValueError on bad JSON.
+    """
+    selections = {}
+    for facet in FACETS:
+        value = params.get(facet)
+        if value:
+            selections[facet] = [str(v) for v in json.loads(value)] if value.startswith('[') else [value]
+    return selections
+
+
+def _facet_value(facet, position):
+    value = position.get(FACETS[facet])
+    if facet == 'specialties':
+        return clean_filter_text(value)
+    return str(value) if value else ''
+
+
+def matches(position, selections, search=None):
+    """
+    Whether one position passes ``selections`` and ``search``, for callers
+    that stream positions instead of querying an index.
+    """
+    for facet, values in selections.items():
+        if facet not in FACETS or not values:
+            continue
+        value = _facet_value(facet, position)
+        if facet == 'categories':
+            if value.lower() not in {str(v).lower() for v in values}:
+                return False
+        elif value not in values:
+            return False
+    if search and search.strip():
+        return search.strip().lower() in str(position.get('position_id') or '').lower()
+    return True
+
+
+# "$1,085.50", "85", "-12.5"
+_NUMBER = re.compile(r'^\s*(-?)\s*\$?\s*(-?\d[\d,]*\.?\d*|-?\.\d+)\s*$')
+
+
+def sort_value(value):
+    """
+    (type rank, value) for ``value`` that compares with any other
+    position's. Raises ValueError for values that have no order.
+    """
+    if isinstance(value, bool):
+        return (0, float(value))
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return (0, float(value))
+    if isinstance(value, (datetime.date, datetime.time)):
+        return (1, value.isoformat())
+    if isinstance(value, str):
+        match = _NUMBER.match(value)
+        if match:
+            sign, digits = match.groups()
+            number = float(digits.replace(',', ''))
+            return (0, -number if sign else number)
+        return (2, value)
+    raise ValueError(f"Cannot sort by a {type(value).__name__} value")
+
+
+def _members(mask):
+    """Indexes of the set bits of ``mask``, ascending."""
+    bits = bin(mask)[:1:-1]
+    return [i for i, bit in enumerate(bits) if bit == '1']
+
+
+def _count(mask):
+    return bin(mask).count('1')
+
+
+class PositionIndex:
+
+    def __init__(self, positions):
+        self.positions = positions
+        self._ids = [str(p.get('position_id') or '').lower() for p in positions]
+        self.all = (1 << len(positions)) - 1
+        self.bitsets = {facet: {} for facet in FACETS}
+        # Categories match case-insensitively (Utils.checkCategoryMatch)
+        self._category_keys = {}
+        for i, position in enumerate(positions):
+            bit = 1 << i
+            for facet in FACETS:
+                value = _facet_value(facet, position)
+                if not value:
+                    continue
+                if facet == 'categories':
+                    value = self._category_keys.setdefault(value.lower(), value)
+                bitsets = self.bitsets[facet]
+                bitsets[value] = bitsets.get(value, 0) | bit
+        self._orders = {}
+        self._lock = threading.Lock()
+
+    def _selection_mask(self, facet, values):
+        bitsets = self.bitsets[facet]
+        mask = 0
+        for value in values:
+            if facet == 'categories':
+                value = self._category_keys.get(str(value).lower(), value)
+            mask |= bitsets.get(value, 0)
+        return mask
+
+    def _id_mask(self, search):
+        search = search.strip().lower()
+        mask = 0
+        for i, position_id in enumerate(self._ids):
+            if search in position_id:
+                mask |= 1 << i
+        return mask
+
+    def _order(self, key):
+        """
+        Position indexes sorted ascending by ``key``, then those without one.
+        Raises ValueError when some position's value can't be sorted.
+        """
+        with self._lock:
+            if key not in self._orders:
+                try:
+                    values = [sort_value(p.get(key)) if p.get(key) not in (None, '') else None
+                              for p in self.positions]
+                except ValueError as e:
+                    # Cached too, so a bad column isn't rescanned on every request
+                    self._orders[key] = f"Cannot sort by {key}: {e}"
+                else:
+                    present = [i for i, value in enumerate(values) if value is not None]
+                    present.sort(key=values.__getitem__)
+                    missing = [i for i, value in enumerate(values) if value is None]
+                    self._orders[key] = (present, missing)
+            order = self._orders[key]
+        if isinstance(order, str):
+            raise ValueError(order)
+        return order
+
+    def query(self, selections, search=None, sort=None, page=1, page_size=50):
+        """
+        ``selections`` maps facet names to the values selected in each.
+        ``sort`` is a SORT_KEYS name, '-' prefixed for descending; without
+        one, positions keep the order GetPositions lists them in.
+
+        Returns (total, position indexes on the page, facet counts).
+        """
+        masks = {
+            facet: self._selection_mask(facet, values)
+            for facet, values in selections.items() if facet in FACETS and values
+        }
+        base = self._id_mask(search) if search and search.strip() else self.all
+
+        matched = base
+        for mask in masks.values():
+            matched &= mask
+
+        facets = {}
+        for facet, bitsets in self.bitsets.items():
+            scope = base
+            for other, mask in masks.items():
+                if other != facet:
+                    scope &= mask
+            counts = {value: _count(scope & bits) for value, bits in bitsets.items()}
+            facets[facet] = {value: count for value, count in sorted(counts.items()) if count}
+
+        members = _members(matched)
+        if sort:
+            present, missing = self._order(sort.lstrip('-'))
+            order = (present[::-1] if sort.startswith('-') else present) + missing
+            wanted = set(members)
+            members = [i for i in order if i in wanted]
+
+        start = (page - 1) * page_size
+        return len(members), members[start:start + page_size], facets
@@ -0,0 +1,130 @@
+"""
+JSON responses with ETag / If-None-Match revalidation.
+
+Clients that already hold the current version of a payload get an empty
+304 instead of the full body. Responses are marked ``no-cache`` so the
+browser keeps its copy but always revalidates before using it.
+
+Bodies of COMPRESS_MIN_BYTES or more are sent brotli (when the ``brotli``
+package is installed) or gzip compressed if the client accepts it. Each
+encoding gets its own ETag, and compressed bodies are kept per ETag so an
+unchanged payload is only compressed once per worker.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import azure.functions as func
+
+from . import timing
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CACHE_CONTROL = 'private, no-cache'
+COMPRESS_MIN_BYTES = 1024
+COMPRESSED_CACHE_SIZE = 16
+
+_compressed = OrderedDict()  # (etag, encoding) -> compressed body
+_compressed_lock = threading.Lock()
+
+
+def etag_for(body):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _variant(etag, encoding):
+    return etag[:-1] + '-' + encoding + '"' if encoding else etag
+
+
+def _matches(req, etag):
+    header = req.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # The client may hold any encoding of the same body
+    etags = {etag, _variant(etag, 'gzip'), _variant(etag, 'br')}
+    # Proxies that compress the body may weaken the tag to W/"..."
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag in etags:
+            return True
+    return False
+
+
+def _accepted_encoding(req):
+    """'br', 'gzip' or None, from the request's Accept-Encoding header."""
+    accepted = set()
+    for part in (req.headers.get('Accept-Encoding') or '').lower().split(','):
+        coding, _, params = part.partition(';')
+        try:
+            q = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError:
+            q = 1.0
+        if q > 0:
+            accepted.add(coding.strip())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _compress(body, etag, encoding):
+    key = (etag, encoding)
+    with _compressed_lock:
+        if key in _compressed:
+            _compressed.move_to_end(key)
+            return _compressed[key]
+
+    with timing.phase(f"compress {encoding}") as phase:
+        if encoding == 'br':
+            data = brotli.compress(body, quality=5)
+        else:
+            data = gzip.compress(body, compresslevel=6)
+        phase.bytes = len(data)
+
+    with _compressed_lock:
+        _compressed[key] = data
+        while len(_compressed) > COMPRESSED_CACHE_SIZE:
+            _compressed.popitem(last=False)
+    return data
+
+
+def json_response(req, body, etag=None, headers=None):
+    """
+    200 with ``body`` and its ETag, or an empty 304 when the client's
+    If-None-Match already names that ETag. Extra ``headers`` are sent on both.
+    """
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if etag is None:
+        etag = etag_for(body)
+    encoding = _accepted_encoding(req) if len(body) >= COMPRESS_MIN_BYTES else None
+
+    headers = dict(headers or {})
+    headers['ETag'] = _variant(etag, encoding)
+    headers['Cache-Control'] = CACHE_CONTROL
+    headers['Vary'] = 'Accept-Encoding'
+
+    if _matches(req, etag):
+        return func.HttpResponse(status_code=304, headers=headers)
+
+    if encoding:
+        body = _compress(body, etag, encoding)
+        headers['Content-Encoding'] = encoding
+
+    return func.HttpResponse(
+        body,
+        mimetype="application/json",
+        status_code=200,
+        headers=headers
+    )
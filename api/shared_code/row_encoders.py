@@ -0,0 +1,198 @@
+"""
+Row encoders compiled once per query from the cursor's column list.
+
+Building records with ``dict(zip(columns, row))`` and then checking
+``hasattr(value, 'isoformat')`` field by field makes the same decisions
+for every value of every row. ``compile_encoder`` makes them once
+instead: from ``cursor.description`` and an output schema it generates a
+function that reads each column by position, with date formatting and
+null handling chosen from the column's declared type.
+
+A schema is a sequence of (output key, expression). An expression is
+Python source with ``{column}`` standing for that column's value (None
+when the query doesn't return the column), or one of the conversions
+below. ``setup`` names values computed once per row before the record,
+usable by name in the expressions:
+
+    encoder = row_encoders.compile_encoder(cursor.description, (
+        ('name', "{Professional} or 'Unknown'"),
+        ('submitDate', row_encoders.iso('Submission_Date')),
+        ('isGHR', "'ghr' in agency"),
+    ), setup=(('agency', "str({Agency_Name} or '').lower()"),))
+    records = [encoder(row) for row in cursor.fetchall()]
+
+``output='tuple'`` returns the values in schema order and ``output='json'``
+the record as JSON text, exactly what ``json.dumps(record, default=str)``
+writes, ready to be spliced into a response body. Encoders are cached by
+column names, types and schema, so compiling per query costs a dict lookup.
+"""
+import datetime
+import json
+import re
+import threading
+from collections import namedtuple
+
+# Conversions of one column's value, chosen per column type by compile_encoder()
+Conversion = namedtuple('Conversion', ('kind', 'column'))
+
+
+def value(column):
+    """The column's value as it is; for names that aren't identifiers."""
+    return Conversion('value', column)
+
+
+def iso(column):
+    """ISO 8601 text for a date, time or datetime; None for anything else."""
+    return Conversion('iso', column)
+
+
+def iso_or_str(column):
+    """ISO text for a date, str() for any other non-empty value; empty values unchanged."""
+    return Conversion('iso_or_str', column)
+
+
+def iso_or_value(column):
+    """ISO text for a date, any other value unchanged."""
+    return Conversion('iso_or_value', column)
+
+
+def text(column):
+    """str() of a non-empty value; empty values unchanged."""
+    return Conversion('text', column)
+
+
+def columns(description, overrides=(), extra=()):
+    """
+    A schema passing every column through under its own name, in query
+    order, except the (column, expression) ``overrides``, followed by the
+    ``extra`` (key, expression) fields.
+    """
+    overrides = dict(overrides)
+    names = dict.fromkeys(entry[0] for entry in description)
+    return tuple((name, overrides.get(name, value(name))) for name in names) + tuple(extra)
+
+
+# Fallbacks for columns whose type the driver doesn't report
+def _iso(value):
+    return value.isoformat() if value and hasattr(value, 'isoformat') else None
+
+
+def _iso_or_str(value):
+    if not value:
+        return value
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _iso_or_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _text(value):
+    return str(value) if value else value
+
+
+# conversion -> column type -> expression, {v} standing for the value.
+# 'date' covers date, time and datetime; None is an unreported type.
+CONVERSIONS = {
+    'value': {'date': '{v}', 'str': '{v}', 'other': '{v}', None: '{v}'},
+    'iso': {
+        'date': '({v}.isoformat() if {v} else None)', 'str': 'None', 'other': 'None', None: '_iso({v})',
+    },
+    'iso_or_str': {
+        'date': '({v}.isoformat() if {v} else {v})', 'str': '{v}', 'other': '(str({v}) if {v} else {v})',
+        None: '_iso_or_str({v})',
+    },
+    'iso_or_value': {
+        'date': '({v}.isoformat() if {v} is not None else None)', 'str': '{v}', 'other': '{v}',
+        None: '_iso_or_value({v})',
+    },
+    'text': {
+        'date': '(str({v}) if {v} else {v})', 'str': '{v}', 'other': '(str({v}) if {v} else {v})',
+        None: '_text({v})',
+    },
+}
+
+_PLACEHOLDER = re.compile(r'\{(\w+)\}')
+
+_json_encoder = json.JSONEncoder(default=str)
+
+_NAMESPACE = {
+    '_iso': _iso,
+    '_iso_or_str': _iso_or_str,
+    '_iso_or_value': _iso_or_value,
+    '_text': _text,
+    '_dumps': _json_encoder.encode,
+}
+
+
+def _column_type(type_code):
+    if not isinstance(type_code, type):
+        return None
+    if issubclass(type_code, (datetime.date, datetime.time)):
+        return 'date'
+    return 'str' if issubclass(type_code, str) else 'other'
+
+
+def _source(description, schema, setup, output):
+    # As with dict(zip(columns, row)), the last of two same-named columns wins
+    positions = {entry[0]: i for i, entry in enumerate(description)}
+    types = [_column_type(entry[1]) for entry in description]
+    used = set()
+
+    def var(column):
+        if column not in positions:
+            return 'None'
+        used.add(positions[column])
+        return f"c{positions[column]}"
+
+    def expression(spec):
+        if isinstance(spec, Conversion):
+            if spec.column not in positions:
+                return 'None'
+            return CONVERSIONS[spec.kind][types[positions[spec.column]]].format(v=var(spec.column))
+        return '(' + _PLACEHOLDER.sub(lambda m: var(m.group(1)), spec) + ')'
+
+    lines = [f"    {name} = {expression(spec)}" for name, spec in setup]
+    if output in ('dict', 'json'):
+        body = '{' + ', '.join(f"{key!r}: {expression(spec)}" for key, spec in schema) + '}'
+        # One pass of the C encoder over the record beats encoding field by field
+        if output == 'json':
+            body = f"_dumps({body})"
+    elif output == 'tuple':
+        body = '(' + ''.join(f"{expression(spec)}, " for _, spec in schema) + ')'
+    else:
+        raise ValueError(f"Unknown output {output!r}")
+
+    unpack = ', '.join(f"c{i}" if i in used else '_' for i in range(len(description)))
+    head = [f"    {unpack}, = row"] if used else []
+    return '\n'.join(['def encode(row):'] + head + lines + [f"    return {body}"])
+
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def compile_encoder(description, schema, setup=(), output='dict'):
+    """
+    A function turning one row of a query with this ``description`` into
+    a record of ``schema``: a dict, a tuple (``output='tuple'``) or JSON
+    text (``output='json'``).
+    """
+    key = (tuple((entry[0], entry[1]) for entry in description), tuple(schema), tuple(setup), output)
+    with _compiled_lock:
+        encoder = _compiled.get(key)
+    if encoder is None:
+        source = _source(description, schema, setup, output)
+        namespace = dict(_NAMESPACE)
+        exec(compile(source, f"<row encoder {output}>", 'exec'), namespace)
+        encoder = namespace['encode']
+        encoder.source = source
+        with _compiled_lock:
+            _compiled[key] = encoder
+    return encoder
+
+
+def index(description, column):
+    """Position of ``column`` in the row, or None; the last one if repeated."""
+    positions = {entry[0]: i for i, entry in enumerate(description)}
+    return positions.get(column)
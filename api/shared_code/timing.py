@@ -0,0 +1,175 @@
+"""
+Where a request's time goes, phase by phase.
+
+Functions wrapped in ``timed`` record named phases while they run: pool
+connects, each query block's execute / fetch / transform, cache version
+checks and rebuilds, JSON serialization and compression. When the request
+finishes the phases are
+
+- sent back in a ``Server-Timing`` header, which the browser's network
+  panel shows next to the request's own timing, and
+- printed as one JSON log line with durations, counts, row counts and
+  payload bytes, plus the worker's connection pool counters.
+
+Timing is off unless the request asks for it with ?timing=1, or
+REQUEST_TIMING=1 turns it on for every request (?timing=0 then turns it
+off for one). With timing off, ``phase`` does nothing but yield.
+
+Phases are recorded from any thread the request's work runs on:
+db.run_parallel copies the caller's context into its worker threads.
+Phases with the same name are added up; parallel phases overlap, so
+their sum can exceed the request's total.
+
+    with timing.phase('B4 positions fetch') as p:
+        rows = cursor.fetchall()
+        p.rows = len(rows)
+"""
+import contextvars
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_ENABLED = os.environ.get('REQUEST_TIMING', '0') == '1'
+
+_current = contextvars.ContextVar('timing', default=None)
+
+
+class Phase:
+    """Totals for one phase name; ``rows`` and ``bytes`` are set by the caller."""
+    __slots__ = ('name', 'seconds', 'count', 'rows', 'bytes')
+
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.count = 0
+        self.rows = None
+        self.bytes = None
+
+    def as_dict(self):
+        result = {'phase': self.name, 'ms': round(self.seconds * 1000, 1), 'count': self.count}
+        if self.rows is not None:
+            result['rows'] = self.rows
+        if self.bytes is not None:
+            result['bytes'] = self.bytes
+        return result
+
+
+class _Record:
+    """What ``phase`` yields: counts for this one run of the phase."""
+    __slots__ = ('rows', 'bytes')
+
+    def __init__(self):
+        self.rows = None
+        self.bytes = None
+
+
+class Timings:
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.started = time.perf_counter()
+        self.phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, rows=None, bytes=None):
+        with self._lock:
+            phase = self.phases.get(name)
+            if phase is None:
+                phase = self.phases[name] = Phase(name)
+            phase.seconds += seconds
+            phase.count += 1
+            if rows is not None:
+                phase.rows = (phase.rows or 0) + rows
+            if bytes is not None:
+                phase.bytes = (phase.bytes or 0) + bytes
+
+    def total_seconds(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        """The Server-Timing header value: one metric per phase, then the total."""
+        with self._lock:
+            phases = list(self.phases.values())
+        metrics = [
+            f'{_metric_name(p.name)};desc="{p.name}";dur={p.seconds * 1000:.1f}'
+            for p in phases
+        ]
+        metrics.append(f'total;dur={self.total_seconds() * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def log(self, status_code=None, response_bytes=None):
+        # db imports this module
+        from . import db
+
+        with self._lock:
+            phases = [p.as_dict() for p in self.phases.values()]
+        print(json.dumps({
+            'event': 'timing',
+            'function': self.function_name,
+            'status': status_code,
+            'totalMs': round(self.total_seconds() * 1000, 1),
+            'responseBytes': response_bytes,
+            'phases': phases,
+            'pools': db.pool_stats(),
+        }))
+
+
+def _metric_name(name):
+    """Server-Timing metric names are HTTP tokens."""
+    return re.sub(r'[^a-z0-9_-]+', '-', name.lower()).strip('-') or 'phase'
+
+
+def enabled(req):
+    value = req.params.get('timing')
+    if value is None:
+        return DEFAULT_ENABLED
+    return value not in ('0', 'false', 'off', '')
+
+
+def current():
+    """The running request's Timings, or None when timing is off."""
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Time the block as ``name`` on the running request, if it is timed."""
+    record = _Record()
+    timings = _current.get()
+    if timings is None:
+        yield record
+        return
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        timings.add(name, time.perf_counter() - started, record.rows, record.bytes)
+
+
+def timed(main):
+    """
+    Wrap a function's ``main(req)``: time it when the request asks for it
+    and add the Server-Timing header to whatever response it returns.
+    """
+    name = main.__module__.rsplit('.', 1)[-1]
+
+    @functools.wraps(main)
+    def wrapper(req):
+        if not enabled(req):
+            return main(req)
+        timings = Timings(name)
+        token = _current.set(timings)
+        try:
+            response = main(req)
+        finally:
+            _current.reset(token)
+        body = response.get_body()
+        response.headers['Server-Timing'] = timings.header()
+        timings.log(response.status_code, len(body) if body is not None else None)
+        return response
+
+    return wrapper
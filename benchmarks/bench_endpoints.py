@@ -0,0 +1,274 @@
+"""
+Endpoint benchmark against the in-process SQL Server stand-in.
+
+Runs the functions' ``main(req)`` exactly as Azure calls them, with
+``pyodbc`` replaced by benchmarks/standin.py filled with generated B4 and
+VNDLY orders, submissions, assignments, changes and history snapshots.
+No database or network is needed, so the numbers show the Python side of
+each endpoint: row transforms, caching, serialization and compression.
+
+Each case runs in its own process so peak memory is its own. For every
+case and scale the script reports
+
+- cold ms: the first call (empty caches), warm ms: the median of the rest
+- app ms: warm ms minus the time the stand-in spent producing rows
+- bytes: response body size
+- peak RSS and its growth over the generated data, in MB
+
+Positions cases run at each --positions scale, change and history cases
+at each --changes scale:
+
+    python -m benchmarks.bench_endpoints --positions 1000 10000 100000 --changes 10000 1000000
+
+--save writes the results as JSON; --compare reads an earlier file and
+exits with status 1 when a case got slower (app ms), bigger (bytes) or
+hungrier (RSS growth) by more than --tolerance, so two versions can be
+compared by running the script on each.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+# case -> (function, scale it follows, method, query parameters, JSON body)
+CASES = {
+    'positions': ('GetPositions', 'positions', 'GET', {}, None),
+    'positions-columnar': ('GetPositions', 'positions', 'GET', {'format': 'columnar', 'candidates': 'none'}, None),
+    'positions-query': ('GetPositions', 'positions', 'GET', {
+        'facilities': json.dumps(['Cooper University Hospital', 'Virtua Voorhees Hospital']),
+        'sort': '-date_added', 'pageSize': '100', 'candidates': 'none',
+    }, None),
+    'positions-ndjson': ('GetPositions', 'positions', 'GET', {'format': 'ndjson'}, None),
+    'candidates': ('GetCandidates', 'positions', 'GET', {'ids': 'B4-0000001,B4-0000002,VN-0000001'}, None),
+    'stats': ('GetStatsData', 'positions', 'GET', {}, None),
+    'stats-aggregates': ('GetStatsData', 'positions', 'GET', {'view': 'aggregates', 'tz': '300'}, None),
+    'changes': ('GetChanges', 'changes', 'GET', {'limit': '1000'}, None),
+    'changes-latest': ('GetChanges', 'changes', 'GET', {'mode': 'latest', 'limit': '5000'}, None),
+    'history': ('GetHistory', 'changes', 'GET', {}, None),
+    'history-snapshot': ('GetHistory', 'changes', 'GET', {'id': 'latest'}, None),
+    'save-history': ('SaveHistory', 'changes', 'POST', {}, {'timestamp': 'now'}),
+}
+
+# Fixed scale for the dimension a case doesn't follow
+BASE_POSITIONS = 1000
+BASE_CHANGES = 10000
+
+# Differences below these are noise, whatever the tolerance
+MIN_MS = 2.0
+MIN_MB = 5.0
+
+METRICS = (('appMs', MIN_MS), ('bytes', 0), ('rssGrowthMb', MIN_MB))
+
+
+def _rss_mb():
+    """Current resident set size, or None where /proc isn't available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def run_worker(spec):
+    """Run one case in this process and return its result."""
+    from benchmarks import standin
+
+    started = time.perf_counter()
+    dataset = standin.Dataset(
+        positions=spec['positions'], changes=spec['changes'], snapshots=spec['snapshots'],
+        checkpoint_every=int(os.environ.get('HISTORY_CHECKPOINT_EVERY', '25')), seed=spec['seed'],
+    )
+    standin.install(dataset)
+    generate_seconds = time.perf_counter() - started
+
+    for name in ('DB_HOST', 'DB_USER', 'DB_PASSWORD', 'POSITIONS_DB', 'CHANGES_DB'):
+        os.environ.setdefault(name, 'standin')
+
+    import importlib
+    import azure.functions as func
+
+    function, _, method, params, body = CASES[spec['case']]
+    main = importlib.import_module(f"api.{function}").main
+    params = dict(params)
+    if params.get('id') == 'latest':
+        replayed = [s['id'] for s in dataset.snapshots if not s['checkpoint']]
+        params['id'] = str(replayed[-1] if replayed else dataset.snapshots[-1]['id'])
+    headers = {'Accept-Encoding': spec['encoding']} if spec['encoding'] else {}
+
+    baseline_mb = _rss_mb() or _peak_rss_mb()
+    runs = []
+    for _ in range(spec['repeat']):
+        if body and body.get('timestamp') == 'now':
+            request_body = json.dumps({'timestamp': datetime.utcnow().isoformat()}).encode('utf-8')
+        else:
+            request_body = json.dumps(body).encode('utf-8') if body else b''
+        req = func.HttpRequest(method=method, url=f"/api/{function}", params=params, headers=headers, body=request_body)
+        standin.reset_clock()
+        started = time.perf_counter()
+        response = main(req)
+        elapsed = time.perf_counter() - started
+        runs.append((elapsed * 1000, standin.clock() * 1000, len(response.get_body() or b''), response.status_code))
+
+    peak_mb = _peak_rss_mb()
+    warm = runs[1:] or runs
+    warm_ms = statistics.median(r[0] for r in warm)
+    standin_ms = statistics.median(r[1] for r in warm)
+    return {
+        'case': spec['case'],
+        'function': function,
+        'positions': spec['positions'],
+        'changes': spec['changes'],
+        'status': runs[-1][3],
+        'coldMs': round(runs[0][0], 2),
+        'warmMs': round(warm_ms, 2),
+        'standinMs': round(standin_ms, 2),
+        'appMs': round(max(warm_ms - standin_ms, 0), 2),
+        'bytes': runs[-1][2],
+        'peakRssMb': round(peak_mb, 1) if peak_mb is not None else None,
+        'rssGrowthMb': round(peak_mb - baseline_mb, 1) if peak_mb is not None and baseline_mb is not None else None,
+        'generateSeconds': round(generate_seconds, 2),
+    }
+
+
+def _specs(args):
+    for case in args.cases:
+        scale = CASES[case][1]
+        sizes = args.positions if scale == 'positions' else args.changes
+        for size in sizes:
+            yield {
+                'case': case,
+                'positions': size if scale == 'positions' else min(args.positions + [BASE_POSITIONS]),
+                'changes': size if scale == 'changes' else min(args.changes + [BASE_CHANGES]),
+                'snapshots': args.snapshots,
+                'repeat': args.repeat,
+                'encoding': args.encoding,
+                'seed': args.seed,
+            }
+
+
+def _run_isolated(spec):
+    """Run one case in a fresh interpreter so its peak RSS is its own."""
+    completed = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_endpoints', '--worker', json.dumps(spec)],
+        capture_output=True, text=True
+    )
+    lines = [line for line in completed.stdout.splitlines() if line.startswith('{"case"')]
+    if completed.returncode != 0 or not lines:
+        return {**spec, 'error': (completed.stderr.strip().splitlines() or ['no output'])[-1]}
+    return json.loads(lines[-1])
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def _print_header():
+    print(f"{'case':<20} {'positions':>9} {'changes':>9} {'status':>6} {'cold ms':>9} {'warm ms':>9} "
+          f"{'app ms':>9} {'bytes':>11} {'peak MB':>8} {'+MB':>7}")
+
+
+def _print_result(r):
+    if 'error' in r:
+        print(f"{r['case']:<20} {r['positions']:>9} {r['changes']:>9} FAILED {r['error'][:80]}")
+        return
+    print(f"{r['case']:<20} {r['positions']:>9} {r['changes']:>9} {r['status']:>6} {r['coldMs']:>9.1f} "
+          f"{r['warmMs']:>9.1f} {r['appMs']:>9.1f} {r['bytes']:>11} {_fmt(r['peakRssMb'], '>8.1f')} "
+          f"{_fmt(r['rssGrowthMb'], '>7.1f')}")
+
+
+def compare(baseline, results, tolerance):
+    """Lines describing every metric that regressed past ``tolerance``."""
+    previous = {(r['case'], r['positions'], r['changes']): r for r in baseline['results'] if 'error' not in r}
+    regressions = []
+    for r in results:
+        old = previous.get((r['case'], r['positions'], r['changes']))
+        if old is None or 'error' in r:
+            continue
+        for metric, floor in METRICS:
+            before, after = old.get(metric), r.get(metric)
+            if before is None or after is None:
+                continue
+            if after > before * (1 + tolerance) and after - before > floor:
+                change = f"+{(after / before - 1) * 100:.0f}%" if before else 'new'
+                regressions.append(
+                    f"{r['case']} ({r['positions']} positions, {r['changes']} changes): "
+                    f"{metric} {before} -> {after} ({change})"
+                )
+    return regressions
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--positions', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--changes', type=int, nargs='+', default=[10000])
+    parser.add_argument('--snapshots', type=int, default=100)
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=5, help='calls per case; the first is the cold one')
+    parser.add_argument('--encoding', default=None, help="Accept-Encoding to send, e.g. 'gzip' or 'br'")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='results JSON from an earlier run to check against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative increase before a metric counts as a regression')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(json.loads(args.worker))))
+        return
+
+    _print_header()
+    results = []
+    for spec in _specs(args):
+        result = _run_isolated(spec)
+        results.append(result)
+        _print_result(result)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'revision': _revision(),
+                'python': platform.python_version(),
+                'recordedAt': datetime.utcnow().isoformat(),
+                'results': results,
+            }, f, indent=2)
+        print(f"\nSaved {len(results)} results to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.tolerance)
+        print(f"\nCompared with {args.compare} (revision {baseline.get('revision')}):")
+        for line in regressions:
+            print(f"  REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("  no regressions")
+
+
+if __name__ == '__main__':
+    main()
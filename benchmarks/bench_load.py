@@ -0,0 +1,381 @@
+"""
+Concurrent load test that replays recruiter sessions.
+
+Each virtual user repeats the session the page runs:
+
+1. dashboard load: get-config, system-mappings, get-positions (columnar,
+   without candidates), current-state and stats-data?view=aggregates, one
+   after another, revalidating with the ETags from the user's last load
+2. a burst of saves: each POSTs one change to changes/batch, then a
+   history snapshot, as saveChangesToDatabase and createHistorySnapshot do,
+   with a think time between saves
+3. a pause before the next session
+
+Unless --url is given the function app is started with
+benchmarks/local_host.py on the generated stand-in. The report gives
+throughput, error rate and latency percentiles per endpoint, and for the
+stand-in host the lock waits seen during the run: which statement waited,
+on what, behind which statement, SaveHistory's prune DELETE included.
+
+    python -m benchmarks.bench_load --users 50 --duration 120 --positions 10000 --changes 100000 --latency-ms 2
+
+--url http://localhost:7071/api runs the same sessions against ``func
+start`` or a deployed app; lock waits are only reported for the stand-in.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from benchmarks import local_host, standin
+
+DASHBOARD = (
+    ('get-config', 'get-config'),
+    ('system-mappings', 'system-mappings'),
+    ('get-positions', 'get-positions?format=columnar&candidates=none'),
+    ('current-state', 'current-state'),
+    ('stats-data', 'stats-data?view=aggregates'),
+)
+
+PERCENTILES = (50, 90, 95, 99)
+
+PRUNE = 'history prune DELETE'
+
+
+class Recorder:
+    """Latency and outcome of every request, per endpoint."""
+
+    def __init__(self):
+        self.samples = {}  # endpoint -> [(seconds, ok)]
+        self.errors = {}  # endpoint -> {message: count}
+        self.sessions = 0
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, seconds, error=None):
+        with self._lock:
+            self.samples.setdefault(endpoint, []).append((seconds, error is None))
+            if error is not None:
+                messages = self.errors.setdefault(endpoint, {})
+                messages[error] = messages.get(error, 0) + 1
+
+    def session_done(self):
+        with self._lock:
+            self.sessions += 1
+
+
+def _percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+
+
+class Client:
+    """One user's keep-alive connection and ETag cache, like a browser tab."""
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        self.prefix = url.path.rstrip('/')
+        self._connect = lambda: (http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection)(
+            url.netloc, timeout=timeout
+        )
+        self.conn = None
+        self.etags = {}
+
+    def request(self, method, path, body=None, revalidate=False):
+        """(status, parsed JSON body or None)."""
+        headers = {'Accept-Encoding': 'gzip'}
+        if body is not None:
+            body = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if revalidate and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        if self.conn is None:
+            self.conn = self._connect()
+        try:
+            self.conn.request(method, f"{self.prefix}/{path}", body=body, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        if response.getheader('ETag'):
+            self.etags[path] = response.getheader('ETag')
+        if response.getheader('Content-Encoding') == 'gzip':
+            data = gzip.decompress(data)
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def _job_ids(positions):
+    """Position ids from a columnar GetPositions body."""
+    column = ((positions or {}).get('positions') or {}).get('columns', {}).get('position_id') or []
+    if isinstance(column, dict):
+        return [column['dict'][code] for code in column['codes'] if code is not None]
+    return [value for value in column if value]
+
+
+def _change(rng, user, job_ids):
+    now = datetime.now(timezone.utc)
+    kind = rng.random()
+    if kind < 0.8:
+        change_type = 'lever_update'
+        data = {'leverKey': rng.choice(standin.LEVER_KEYS), 'done': rng.random() < 0.7, 'user': user,
+                'time': now.strftime('%m/%d/%Y %I:%M %p')}
+    elif kind < 0.9:
+        change_type = 'margin_update'
+        data = {'margin': str(rng.randint(15, 35))}
+    else:
+        change_type = 'next_step_update'
+        data = {'nextStep': {'date': now.date().isoformat(), 'text': 'Follow up with manager'}}
+    return {
+        'id': f"change-{int(now.timestamp() * 1000)}-{uuid.uuid4().hex[:9]}",
+        'timestamp': now.isoformat().replace('+00:00', 'Z'),
+        'jobId': rng.choice(job_ids),
+        'type': change_type,
+        'data': data,
+        'user': user,
+    }
+
+
+class User(threading.Thread):
+
+    def __init__(self, number, args, recorder, deadline):
+        super().__init__(name=f'user-{number}', daemon=True)
+        self.name_ = f'Load User {number}'
+        self.args = args
+        self.recorder = recorder
+        self.deadline = deadline
+        self.rng = random.Random(args.seed * 1000 + number)
+        self.client = Client(args.url, args.timeout)
+        self.job_ids = []
+
+    def _call(self, endpoint, method, path, body=None, revalidate=False):
+        started = time.perf_counter()
+        try:
+            status, data = self.client.request(method, path, body, revalidate)
+        except (OSError, http.client.HTTPException) as e:
+            self.recorder.add(endpoint, time.perf_counter() - started, type(e).__name__)
+            return None
+        error = None
+        if status >= 400:
+            error = f"HTTP {status}: {data.get('error')}" if isinstance(data, dict) and data.get('error') else f"HTTP {status}"
+        self.recorder.add(endpoint, time.perf_counter() - started, error)
+        return data
+
+    def _sleep(self, low, high):
+        time.sleep(max(0.0, min(self.rng.uniform(low, high), self.deadline - time.monotonic())))
+
+    def run(self):
+        save_endpoint = 'changes' if self.args.single else 'changes/batch'
+        while time.monotonic() < self.deadline:
+            for endpoint, path in DASHBOARD:
+                data = self._call(endpoint, 'GET', path, revalidate=True)
+                if endpoint == 'get-positions' and data is not None:
+                    self.job_ids = _job_ids(data) or self.job_ids
+            if not self.job_ids:
+                self._sleep(*self.args.pause)
+                continue
+
+            for _ in range(self.rng.randint(*self.args.saves)):
+                if time.monotonic() >= self.deadline:
+                    break
+                change = _change(self.rng, self.name_, self.job_ids)
+                saved = self._call(save_endpoint, 'POST', save_endpoint,
+                                   change if self.args.single else {'changes': [change]})
+                if saved is not None:
+                    timestamp = datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z')
+                    self._call('history', 'POST', 'history', {'timestamp': timestamp})
+                self._sleep(*self.args.think)
+            else:
+                self.recorder.session_done()
+            self._sleep(*self.args.pause)
+        self.client.close()
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _start_host(args):
+    port = _free_port()
+    command = [
+        sys.executable, '-m', 'benchmarks.local_host', '--port', str(port),
+        '--positions', str(args.positions), '--changes', str(args.changes), '--snapshots', str(args.snapshots),
+        '--latency-ms', str(args.latency_ms), '--threads', str(args.threads), '--seed', str(args.seed),
+    ]
+    host = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}/api"
+    for _ in range(600):
+        if host.poll() is not None:
+            raise SystemExit(f"The local host exited with status {host.returncode}; rerun with --verbose")
+        try:
+            _standin_request(url, 'GET', 'stats')
+            return host, url
+        except OSError:
+            time.sleep(0.1)
+    host.terminate()
+    raise SystemExit('The local host did not start within a minute')
+
+
+def _standin_request(url, method, action):
+    """A /_standin/ call on the local host, or None when the host isn't one."""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.netloc, timeout=10)
+    try:
+        conn.request(method, f"/_standin/{action}")
+        response = conn.getresponse()
+        body = response.read()
+        return json.loads(body) if response.status == 200 else None
+    finally:
+        conn.close()
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        ordered = sorted(seconds * 1000 for seconds, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        endpoints[endpoint] = {
+            'requests': len(samples),
+            'perSecond': round(len(samples) / elapsed, 2),
+            'errors': errors,
+            'errorRate': round(errors / len(samples), 4),
+            **{f'p{p}Ms': round(_percentile(ordered, p), 1) for p in PERCENTILES},
+            'maxMs': round(ordered[-1], 1),
+            'errorMessages': recorder.errors.get(endpoint, {}),
+        }
+    return endpoints
+
+
+def _print_report(endpoints, stats, sessions, elapsed):
+    print(f"\n{'endpoint':<16} {'requests':>8} {'req/s':>7} {'errors':>7} "
+          + ' '.join(f"{'p%d ms' % p:>8}" for p in PERCENTILES) + f" {'max ms':>8}")
+    for endpoint, e in endpoints.items():
+        print(f"{endpoint:<16} {e['requests']:>8} {e['perSecond']:>7.1f} {e['errorRate'] * 100:>6.1f}% "
+              + ' '.join(f"{e[f'p{p}Ms']:>8.1f}" for p in PERCENTILES) + f" {e['maxMs']:>8.1f}")
+    total = sum(e['requests'] for e in endpoints.values())
+    print(f"\n{sessions} sessions completed, {total} requests, {total / elapsed:.1f} req/s over {elapsed:.0f} s")
+
+    for endpoint, e in endpoints.items():
+        for message, count in sorted(e['errorMessages'].items(), key=lambda m: -m[1])[:3]:
+            print(f"  {endpoint}: {count} x {message[:120]}")
+
+    if stats is None:
+        print("\nLock waits: not available (the host is not the benchmark stand-in)")
+        return
+    print(f"\nLock waits ({stats['changes']} changes, {stats['snapshots']} snapshots at the end):")
+    if not stats['locks']:
+        print("  none")
+    else:
+        print(f"  {'resource':<28} {'waiting statement':<28} {'blocked by':<28} {'waits':>6} {'total ms':>9} {'max ms':>8}")
+        for w in stats['locks']:
+            print(f"  {w['resource']:<28} {w['statement']:<28} {w['blockedBy']:<28} {w['waits']:>6} "
+                  f"{w['totalMs']:>9.1f} {w['maxMs']:>8.1f}")
+    blocking = [w for w in stats['locks'] if w['blockedBy'] == PRUNE]
+    blocked = [w for w in stats['locks'] if w['statement'] == PRUNE]
+    print(f"  {PRUNE}: blocked others {sum(w['waits'] for w in blocking)} times "
+          f"({sum(w['totalMs'] for w in blocking):.1f} ms), waited {sum(w['waits'] for w in blocked)} times "
+          f"({sum(w['totalMs'] for w in blocked):.1f} ms)")
+    for database, pool in stats['pools'].items():
+        print(f"  {database} pool: {pool['misses']} opened of {pool['maxSize']}, {pool['hits']} reused")
+
+
+def _revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run after the last user starts')
+    parser.add_argument('--ramp-up', type=float, default=10, help='seconds over which users start')
+    parser.add_argument('--saves', type=int, nargs=2, default=(3, 8), metavar=('MIN', 'MAX'),
+                        help='saves per session')
+    parser.add_argument('--think', type=float, nargs=2, default=(0.5, 3.0), metavar=('MIN', 'MAX'),
+                        help='seconds between saves')
+    parser.add_argument('--pause', type=float, nargs=2, default=(5.0, 20.0), metavar=('MIN', 'MAX'),
+                        help='seconds between sessions')
+    parser.add_argument('--single', action='store_true', help='save through SaveChange instead of SaveChangeBatch')
+    parser.add_argument('--url', help='API base URL of a running host, e.g. http://localhost:7071/api')
+    parser.add_argument('--timeout', type=float, default=120, help='seconds before a request counts as failed')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--verbose', action='store_true', help="show the local host's output")
+    local_host.add_arguments(parser)
+    args = parser.parse_args()
+
+    host = None
+    if args.url is None:
+        print(f"Starting the local host ({args.positions} positions, {args.changes} changes, "
+              f"{args.latency_ms} ms round trips)...")
+        host, args.url = _start_host(args)
+    try:
+        try:
+            stats_available = _standin_request(args.url, 'POST', 'reset') is not None
+        except OSError:
+            stats_available = False
+
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.ramp_up + args.duration
+        users = []
+        print(f"Running {args.users} users for {args.ramp_up + args.duration:.0f} s against {args.url}")
+        for number in range(args.users):
+            user = User(number, args, recorder, deadline)
+            user.start()
+            users.append(user)
+            time.sleep(args.ramp_up / max(args.users, 1))
+        for user in users:
+            user.join(timeout=max(0.0, deadline - time.monotonic()) + args.timeout)
+        elapsed = time.monotonic() - started
+
+        stats = _standin_request(args.url, 'GET', 'stats') if stats_available else None
+        endpoints = summarize(recorder, elapsed)
+        _print_report(endpoints, stats, recorder.sessions, elapsed)
+    finally:
+        if host is not None:
+            host.terminate()
+            host.wait()
+
+    if args.save:
+        settings = {k: v for k, v in vars(args).items() if k not in ('save', 'verbose')}
+        with open(args.save, 'w') as f:
+            json.dump({
+                'revision': _revision(),
+                'python': platform.python_version(),
+                'recordedAt': datetime.utcnow().isoformat(),
+                'settings': settings,
+                'sessions': recorder.sessions,
+                'endpoints': endpoints,
+                'locks': stats['locks'] if stats else None,
+                'pools': stats['pools'] if stats else None,
+            }, f, indent=2)
+        print(f"\nSaved the results to {args.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Row encoder benchmark: dict(zip(...)) plus per-field conversion vs. the
+encoders compiled by api/shared_code/row_encoders.py.
+
+Generates B4 and VNDLY submission rows as pyodbc returns them and turns
+them into candidates the way open_positions did before the encoders
+(``dict(zip(columns, row))``, ``sub.get`` and ``hasattr(value,
+'isoformat')`` per field) and with the compiled encoders, as dicts and
+tuples. Then the whole list as JSON text both ways: ``json.dumps`` of the
+old records vs. the encoders' pre-encoded JSON joined. Every encoder's
+output is checked against the old one first. Prints rows/second for each
+and the speedup over the old way. No database needed:
+
+    python -m benchmarks.bench_row_encoders --rows 100000
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from benchmarks import standin
+
+# Installed before the function code is imported, which needs pyodbc
+_dataset = standin.Dataset(positions=0, changes=0, snapshots=0)
+standin.install(_dataset)
+
+from api.shared_code import open_positions  # noqa: E402
+
+
+# ============================================================
+# The per-field conversion open_positions used before row_encoders
+# ============================================================
+def _iso(value):
+    return value.isoformat() if value and hasattr(value, 'isoformat') else None
+
+
+def legacy_b4_candidate(sub):
+    is_declined = bool(
+        sub.get('Hospital_Decline_Date') or
+        sub.get('Agency_Decline_Date') or
+        sub.get('Agency_Retracted_Date')
+    )
+    decline_reason = None
+    if sub.get('Hospital_Decline_Date'):
+        decline_reason = sub.get('Hospital_Decline_Reason') or 'Hospital Declined'
+    elif sub.get('Agency_Decline_Date'):
+        decline_reason = sub.get('Offer_Decline_Reason') or 'Agency Declined'
+    elif sub.get('Agency_Retracted_Date'):
+        decline_reason = 'Agency Retracted'
+    agency = str(sub.get('Agency_Name') or '').lower()
+    is_ghr = 'ghr' in agency or 'planet healthcare' in agency
+    return {
+        'name': sub.get('Professional') or 'Unknown',
+        'agency': sub.get('Agency_Name') or 'Unknown',
+        'submitDate': _iso(sub.get('Submission_Date')),
+        'offerDate': _iso(sub.get('Offer_Date')),
+        'awardedDate': _iso(sub.get('Date_Awarded')),
+        'rto': sub.get('RTO'),
+        'isDeclined': is_declined,
+        'declineReason': decline_reason,
+        'hospDeclineDate': _iso(sub.get('Hospital_Decline_Date')),
+        'agencyDeclineDate': _iso(sub.get('Agency_Decline_Date')),
+        'agencyRetractedDate': _iso(sub.get('Agency_Retracted_Date')),
+        'isGHR': is_ghr,
+        'isActive': sub.get('IsActive') or False
+    }
+
+
+def legacy_vndly_candidate(sub):
+    status = str(sub.get('status') or '').lower()
+    is_declined = bool(
+        sub.get('client_rejected_date') or
+        sub.get('vendor_declined_date') or
+        sub.get('vendor_withdrawn_date') or
+        status in ('rejected', 'offer declined', 'job closed')
+    )
+    decline_reason = None
+    if sub.get('client_rejected_date') or status == 'rejected':
+        decline_reason = sub.get('reject_reason_choice') or sub.get('reject_reason_text') or 'Client Rejected'
+    elif sub.get('vendor_declined_date') or status == 'offer declined':
+        decline_reason = 'Vendor Declined Offer'
+    elif sub.get('vendor_withdrawn_date'):
+        decline_reason = sub.get('withdrawal_reason_choice') or sub.get('withdrawal_reason_text') or 'Vendor Withdrawn'
+    elif status == 'job closed':
+        decline_reason = 'Job Closed'
+    agency = str(sub.get('agency') or '').lower()
+    is_ghr = 'ghr' in agency or 'planet healthcare' in agency
+    return {
+        'name': sub.get('candidate_name') or 'Unknown',
+        'agency': sub.get('agency') or 'Unknown',
+        'submitDate': _iso(sub.get('submission_date')),
+        'offerDate': _iso(sub.get('offer_date')),
+        'awardedDate': _iso(sub.get('offer_accepted_date')),
+        'rto': _iso(sub.get('rto_date')),
+        'isDeclined': is_declined,
+        'declineReason': decline_reason,
+        'hospDeclineDate': _iso(sub.get('client_rejected_date')),
+        'agencyDeclineDate': _iso(sub.get('vendor_declined_date')),
+        'agencyRetractedDate': _iso(sub.get('vendor_withdrawn_date')),
+        'interviewDate': _iso(sub.get('interview_date')),
+        'isGHR': is_ghr,
+        'isActive': sub.get('status') == 'Active' if sub.get('status') else False,
+        'status': sub.get('status')
+    }
+
+
+SOURCES = {
+    'b4': (standin.B4_SUBMISSION_COLUMNS, _dataset._b4_submission, legacy_b4_candidate, 'B4'),
+    'vndly': (standin.VNDLY_SUBMISSION_COLUMNS, _dataset._vndly_submission, legacy_vndly_candidate, 'VN'),
+}
+
+
+def _rows(source, count, seed):
+    columns, generate, _, prefix = SOURCES[source]
+    rng = random.Random(seed)
+    rows = [generate(rng, f'{prefix}-{i // 4:07d}') for i in range(count)]
+    return standin.describe(columns, rows), rows
+
+
+def _timed(func, repeat):
+    """Median seconds of ``repeat`` runs."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def run(source, count, repeat, seed):
+    description, rows = _rows(source, count, seed)
+    columns = [column[0] for column in description]
+    legacy = SOURCES[source][2]
+    open_source = open_positions.SOURCES[source]
+    encode = open_positions._candidate_encoder(description, open_source)
+    encode_tuple = open_positions._candidate_encoder(description, open_source, 'tuple')
+    encode_json = open_positions._candidate_encoder(description, open_source, 'json')
+
+    expected = [legacy(dict(zip(columns, row))) for row in rows]
+    assert [encode(row) for row in rows] == expected
+    assert [encode_tuple(row) for row in rows] == [tuple(c.values()) for c in expected]
+    assert '[' + ', '.join(encode_json(row) for row in rows) + ']' == json.dumps(expected, default=str)
+
+    variants = {
+        'dict(zip) + per field': lambda: [legacy(dict(zip(columns, row))) for row in rows],
+        'compiled -> dict': lambda: [encode(row) for row in rows],
+        'compiled -> tuple': lambda: [encode_tuple(row) for row in rows],
+        'dict(zip) + json.dumps': lambda: json.dumps([legacy(dict(zip(columns, row))) for row in rows], default=str),
+        'compiled JSON + join': lambda: '[' + ', '.join([encode_json(row) for row in rows]) + ']',
+    }
+    return {name: _timed(func, repeat) for name, func in variants.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--rows', type=int, default=100000, help='submissions per source')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--sources', nargs='+', choices=sorted(SOURCES), default=list(SOURCES))
+    args = parser.parse_args()
+
+    for source in args.sources:
+        results = run(source, args.rows, args.repeat, args.seed)
+        baseline = results['dict(zip) + per field']
+        serialize_baseline = results['dict(zip) + json.dumps']
+        print(f"\n{source.upper()} submissions ({args.rows} rows, median of {args.repeat})")
+        print(f"{'variant':<26} {'ms':>9} {'rows/s':>12} {'speedup':>8}")
+        for name, seconds in results.items():
+            reference = serialize_baseline if 'JSON' in name or 'json' in name else baseline
+            print(f"{name:<26} {seconds * 1000:>9.1f} {args.rows / seconds:>12,.0f} {reference / seconds:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
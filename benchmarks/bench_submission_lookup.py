@@ -0,0 +1,136 @@
+"""
+Submission lookup benchmark: IN (?, ?, ...) parameter list vs. EXISTS join.
+
+Loads synthetic open orders and submissions into session temp tables on a
+SQL Server (nothing is written to real tables), then times the two ways
+GetPositions has fetched submissions for the open positions:
+
+- in_list:     WHERE RTRIM(LTRIM(id)) IN (?, ?, ...)  -- one ? per position
+- exists_join: WHERE EXISTS (SELECT 1 FROM open orders WHERE ...)
+
+It also counts how many distinct plans each variant leaves in the plan
+cache. Run from the repository root with the usual connection settings:
+
+    DB_HOST=... DB_USER=... DB_PASSWORD=... POSITIONS_DB=... \\
+        python -m benchmarks.bench_submission_lookup --sizes 500 2000 10000 50000
+"""
+import argparse
+import random
+import statistics
+import time
+
+import pyodbc
+
+from api.shared_code.db import connection_string
+
+SUBMISSIONS_PER_POSITION = 4
+
+IN_LIST_SQL = '''
+    SELECT RTRIM(LTRIM(s.assignment_id)) AS assignment_id, s.agency_name, s.submission_date
+    FROM #bench_submissions s
+    WHERE RTRIM(LTRIM(s.assignment_id)) IN ({placeholders})
+'''
+
+EXISTS_JOIN_SQL = '''
+    SELECT RTRIM(LTRIM(s.assignment_id)) AS assignment_id, s.agency_name, s.submission_date
+    FROM #bench_submissions s
+    WHERE EXISTS (
+        SELECT 1
+        FROM #bench_open_orders o
+        WHERE RTRIM(LTRIM(o.position_id)) = RTRIM(LTRIM(s.assignment_id))
+    )
+'''
+
+CACHED_PLANS_SQL = '''
+    SELECT COUNT(*)
+    FROM sys.dm_exec_cached_plans p
+    CROSS APPLY sys.dm_exec_sql_text(p.plan_handle) t
+    WHERE t.text LIKE ? AND t.text NOT LIKE '%dm_exec_cached_plans%'
+'''
+
+
+def load_fixture(cursor, positions):
+    cursor.execute('DROP TABLE IF EXISTS #bench_open_orders')
+    cursor.execute('DROP TABLE IF EXISTS #bench_submissions')
+    cursor.execute('CREATE TABLE #bench_open_orders (position_id NVARCHAR(50) NOT NULL)')
+    cursor.execute('''
+        CREATE TABLE #bench_submissions (
+            assignment_id NVARCHAR(50) NOT NULL,
+            agency_name NVARCHAR(200) NULL,
+            submission_date DATETIME NULL
+        )
+    ''')
+
+    # Padded IDs, like the staging tables, so the trims have work to do
+    ids = [f' {100000 + i} ' for i in range(positions)]
+    cursor.fast_executemany = True
+    cursor.executemany('INSERT INTO #bench_open_orders (position_id) VALUES (?)', [(i,) for i in ids])
+
+    # Closed positions' submissions are in the table too and must be skipped
+    submission_ids = ids + [f' {900000 + i} ' for i in range(positions)]
+    rows = [
+        (random.choice(submission_ids), random.choice(['GHR Healthcare', 'AMN', 'Aya', 'Cross Country']), None)
+        for _ in range(positions * SUBMISSIONS_PER_POSITION)
+    ]
+    cursor.executemany(
+        'INSERT INTO #bench_submissions (assignment_id, agency_name, submission_date) VALUES (?, ?, ?)',
+        rows
+    )
+    cursor.fast_executemany = False
+    return [i.strip() for i in ids]
+
+
+def time_query(cursor, sql, params, repeat):
+    timings = []
+    rows = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if params:
+            cursor.execute(sql, params)
+        else:
+            cursor.execute(sql)
+        rows = len(cursor.fetchall())
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), rows
+
+
+def cached_plans(cursor, marker):
+    cursor.execute(CACHED_PLANS_SQL, f'%{marker}%')
+    return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', default='POSITIONS_DB',
+                        help='environment variable naming the database to connect to')
+    args = parser.parse_args()
+
+    conn = pyodbc.connect(connection_string(args.database), autocommit=True)
+    cursor = conn.cursor()
+
+    print(f"{'positions':>10} {'variant':>12} {'median ms':>10} {'rows':>8}")
+    for size in args.sizes:
+        ids = load_fixture(cursor, size)
+
+        try:
+            placeholders = ','.join('?' for _ in ids)
+            in_ms, in_rows = time_query(cursor, IN_LIST_SQL.format(placeholders=placeholders), ids, args.repeat)
+            print(f"{size:>10} {'in_list':>12} {in_ms:>10.1f} {in_rows:>8}")
+        except pyodbc.Error as e:
+            # SQL Server rejects more than 2,100 parameters per request
+            print(f"{size:>10} {'in_list':>12} {'FAILED':>10} {str(e)[:60]}")
+
+        join_ms, join_rows = time_query(cursor, EXISTS_JOIN_SQL, None, args.repeat)
+        print(f"{size:>10} {'exists_join':>12} {join_ms:>10.1f} {join_rows:>8}")
+
+    print()
+    # pyodbc sends ? markers as @P1, @P2, ... so each list length is new text
+    print(f"cached plans  in_list: {cached_plans(cursor, 'IN (@P1')}  "
+          f"exists_join: {cached_plans(cursor, 'FROM #bench_open_orders o')}")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+Trimmed-ID join benchmark: RTRIM(LTRIM(...)) predicates vs. indexed key columns.
+
+Builds session temp copies of the open-order / submission join with padded
+IDs, once as plain columns and once with the persisted computed key column
+and index that sql/migrations/001_trimmed_id_keys.sql adds. Each join is run
+with SET STATISTICS XML ON so the actual plan comes back with the results;
+the script prints median latency, logical reads and the access operator used
+on the submissions table (Index Seek vs. Index/Table Scan) for both forms.
+
+    DB_HOST=... DB_USER=... DB_PASSWORD=... POSITIONS_DB=... \\
+        python -m benchmarks.bench_trimmed_keys --sizes 2000 10000 50000
+"""
+import argparse
+import random
+import statistics
+import time
+import xml.etree.ElementTree as ET
+
+import pyodbc
+
+from api.shared_code.db import connection_string
+
+SHOWPLAN_NS = {'sp': 'http://schemas.microsoft.com/sqlserver/2004/07/showplan'}
+SUBMISSIONS_PER_POSITION = 4
+
+# A single position, as the candidate lookups do, and the full open-order join
+VARIANTS = {
+    'trimmed_lookup': '''
+        SELECT s.agency_name FROM #bench_submissions s
+        WHERE RTRIM(LTRIM(s.assignment_id)) = ?
+    ''',
+    'key_lookup': '''
+        SELECT s.agency_name FROM #bench_submissions s
+        WHERE s.assignment_id_key = ?
+    ''',
+    'trimmed_join': '''
+        SELECT s.agency_name FROM #bench_submissions s
+        WHERE EXISTS (SELECT 1 FROM #bench_open_orders o
+                      WHERE RTRIM(LTRIM(o.position_id)) = RTRIM(LTRIM(s.assignment_id)))
+    ''',
+    'key_join': '''
+        SELECT s.agency_name FROM #bench_submissions s
+        WHERE EXISTS (SELECT 1 FROM #bench_open_orders o
+                      WHERE o.position_id_key = s.assignment_id_key)
+    ''',
+}
+
+
+def load_fixture(cursor, positions):
+    cursor.execute('DROP TABLE IF EXISTS #bench_open_orders')
+    cursor.execute('DROP TABLE IF EXISTS #bench_submissions')
+    cursor.execute('''
+        CREATE TABLE #bench_open_orders (
+            position_id NVARCHAR(50) NOT NULL,
+            position_id_key AS CAST(RTRIM(LTRIM(position_id)) AS NVARCHAR(100)) PERSISTED
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE #bench_submissions (
+            id INT IDENTITY PRIMARY KEY,
+            assignment_id NVARCHAR(50) NOT NULL,
+            agency_name NVARCHAR(200) NULL,
+            assignment_id_key AS CAST(RTRIM(LTRIM(assignment_id)) AS NVARCHAR(100)) PERSISTED
+        )
+    ''')
+
+    # Open positions are a small slice of all submissions, as in production
+    ids = [f' {100000 + i} ' for i in range(positions)]
+    all_ids = ids + [f' {900000 + i} ' for i in range(positions * 9)]
+    cursor.fast_executemany = True
+    cursor.executemany('INSERT INTO #bench_open_orders (position_id) VALUES (?)', [(i,) for i in ids])
+    cursor.executemany(
+        'INSERT INTO #bench_submissions (assignment_id, agency_name) VALUES (?, ?)',
+        [(random.choice(all_ids), random.choice(['GHR Healthcare', 'AMN', 'Aya']))
+         for _ in range(len(all_ids) * SUBMISSIONS_PER_POSITION)]
+    )
+    cursor.fast_executemany = False
+
+    cursor.execute('CREATE INDEX IX_bench_open_orders_key ON #bench_open_orders (position_id_key)')
+    cursor.execute('CREATE INDEX IX_bench_submissions_key ON #bench_submissions (assignment_id_key) INCLUDE (agency_name)')
+    cursor.execute('CREATE INDEX IX_bench_submissions_raw ON #bench_submissions (assignment_id) INCLUDE (agency_name)')
+    return [i.strip() for i in ids]
+
+
+def run_with_plan(cursor, sql, params):
+    """Execute ``sql`` and return (elapsed ms, row count, actual plan XML)."""
+    cursor.execute('SET STATISTICS XML ON')
+    try:
+        start = time.perf_counter()
+        cursor.execute(sql, *params)
+        rows = len(cursor.fetchall())
+        elapsed = (time.perf_counter() - start) * 1000
+        plan = None
+        while cursor.nextset():
+            row = cursor.fetchone()
+            if row and str(row[0]).lstrip().startswith('<ShowPlanXML'):
+                plan = row[0]
+    finally:
+        cursor.execute('SET STATISTICS XML OFF')
+    return elapsed, rows, plan
+
+
+def summarize_plan(plan):
+    """Access operators on the submissions table and total logical reads."""
+    if not plan:
+        return '-', 0
+    root = ET.fromstring(plan)
+    operators = set()
+    for relop in root.iterfind('.//sp:RelOp', SHOWPLAN_NS):
+        obj = relop.find('./*/sp:Object', SHOWPLAN_NS)
+        if obj is not None and 'bench_submissions' in obj.get('Table', ''):
+            operators.add(relop.get('PhysicalOp'))
+    reads = sum(
+        int(counter.get('ActualLogicalReads', 0))
+        for counter in root.iterfind('.//sp:RunTimeCountersPerThread', SHOWPLAN_NS)
+    )
+    return '/'.join(sorted(operators)) or '-', reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[2000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database', default='POSITIONS_DB',
+                        help='environment variable naming the database to connect to')
+    args = parser.parse_args()
+
+    conn = pyodbc.connect(connection_string(args.database), autocommit=True)
+    cursor = conn.cursor()
+
+    print(f"{'positions':>10} {'variant':>15} {'median ms':>10} {'rows':>8} {'reads':>9}  submissions access")
+    for size in args.sizes:
+        ids = load_fixture(cursor, size)
+        for name, sql in VARIANTS.items():
+            params = [] if name.endswith('join') else [random.choice(ids)]
+            timings = []
+            for _ in range(args.repeat):
+                elapsed, rows, plan = run_with_plan(cursor, sql, params)
+                timings.append(elapsed)
+            operators, reads = summarize_plan(plan)
+            print(f"{size:>10} {name:>15} {statistics.median(timings):>10.1f} {rows:>8} {reads:>9}  {operators}")
+
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+The function app served over HTTP from the benchmark stand-in.
+
+Loads every function under api/ the way the Functions host does, with the
+route and methods from its function.json, and serves it at /api/<route>
+with ``pyodbc`` replaced by benchmarks/standin.py. Like a single Python
+worker, one process runs the functions on at most --threads threads at
+once (PYTHON_THREADPOOL_THREAD_COUNT). bench_load.py starts it on its own
+unless given --url; it can also be run by hand and pointed at by the page
+or any other client:
+
+    python -m benchmarks.local_host --positions 10000 --changes 100000 --latency-ms 2
+
+Besides the functions it serves
+
+- GET /_standin/stats: lock waits recorded by the stand-in, connection
+  pool counters and table sizes
+- POST /_standin/reset: clear the lock wait counters
+"""
+import argparse
+import glob
+import importlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+
+DEFAULT_THREADS = int(os.environ.get('PYTHON_THREADPOOL_THREAD_COUNT') or min(32, (os.cpu_count() or 1) + 4))
+
+
+def load_routes():
+    """{(method, route): main} for every HTTP-triggered function under api/."""
+    routes = {}
+    for path in sorted(glob.glob(os.path.join(API_DIR, '*', 'function.json'))):
+        name = os.path.basename(os.path.dirname(path))
+        with open(path) as f:
+            bindings = json.load(f).get('bindings', [])
+        for binding in bindings:
+            if binding.get('type') != 'httpTrigger':
+                continue
+            main = importlib.import_module(f"api.{name}").main
+            for method in binding.get('methods') or ('get', 'post'):
+                routes[(method.upper(), binding.get('route') or name)] = main
+    return routes
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch()
+
+    do_POST = do_PUT = do_DELETE = do_GET
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if url.path.startswith('/_standin/'):
+            return self._standin(url.path[len('/_standin/'):])
+
+        main = self.server.routes.get((self.command, url.path[len('/api/'):])) if url.path.startswith('/api/') else None
+        if main is None:
+            return self._send(404, {'Content-Type': 'application/json'}, b'{"error": "Not found"}')
+
+        import azure.functions as func
+        req = func.HttpRequest(
+            method=self.command,
+            url=f"http://{self.headers.get('Host', 'localhost')}{self.path}",
+            headers=dict(self.headers.items()),
+            params=dict(parse_qsl(url.query, keep_blank_values=True)),
+            body=body,
+        )
+        with self.server.slots:
+            response = main(req)
+
+        headers = dict(response.headers.items())
+        if response.mimetype:
+            headers.setdefault('Content-Type', f"{response.mimetype}; charset={response.charset or 'utf-8'}")
+        self._send(response.status_code, headers, response.get_body() or b'')
+
+    def _standin(self, action):
+        if action == 'stats' and self.command == 'GET':
+            from api.shared_code import db
+            dataset = self.server.dataset
+            body = {
+                'locks': dataset.locks.waits(),
+                'pools': db.pool_stats(),
+                'changes': dataset.change_count,
+                'snapshots': len(dataset.snapshots),
+            }
+        elif action == 'reset' and self.command == 'POST':
+            self.server.dataset.locks.reset()
+            body = {'success': True}
+        else:
+            return self._send(404, {'Content-Type': 'application/json'}, b'{"error": "Not found"}')
+        self._send(200, {'Content-Type': 'application/json'}, json.dumps(body).encode('utf-8'))
+
+    def _send(self, status, headers, body):
+        self.send_response(status)
+        for name, value in headers.items():
+            if name.lower() not in ('content-length', 'connection'):
+                self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(args):
+    from benchmarks import standin
+
+    dataset = standin.Dataset(
+        positions=args.positions, changes=args.changes, snapshots=args.snapshots,
+        checkpoint_every=int(os.environ.get('HISTORY_CHECKPOINT_EVERY', '25')), seed=args.seed,
+        latency=args.latency_ms / 1000,
+    )
+    standin.install(dataset)
+    for name in ('DB_HOST', 'DB_USER', 'DB_PASSWORD', 'POSITIONS_DB', 'CHANGES_DB'):
+        os.environ.setdefault(name, 'standin')
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.routes = load_routes()
+    server.dataset = dataset
+    server.slots = threading.BoundedSemaphore(args.threads)
+    server.verbose = args.verbose
+    print(f"Serving {len(server.routes)} routes on http://{args.host}:{server.server_port}/api "
+          f"({args.positions} positions, {args.changes} changes, {args.threads} threads)", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def add_arguments(parser):
+    parser.add_argument('--positions', type=int, default=10000)
+    parser.add_argument('--changes', type=int, default=100000)
+    parser.add_argument('--snapshots', type=int, default=100)
+    parser.add_argument('--latency-ms', type=float, default=1.0, help='simulated database round trip')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS,
+                        help='functions running at once (PYTHON_THREADPOOL_THREAD_COUNT)')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    add_arguments(parser)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7071)
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    serve(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,871 @@
+"""
+In-process stand-in for SQL Server, for benchmarking without a database.
+
+``install(Dataset(...))`` registers a ``pyodbc`` module whose connections
+answer the function app's queries from generated data:
+
+- B4 open orders and VNDLY jobs with their submissions (GetPositions,
+  GetCandidates)
+- active and upcoming assignments (GetStatsData)
+- dbo.ghr_changes (GetChanges, SaveChange, SaveChangeBatch, history),
+  dbo.position_current_state (GetCurrentState) and
+  dbo.ghr_history_snapshots (GetHistory, SaveHistory), with a checkpoint
+  every HISTORY_CHECKPOINT_EVERY snapshots as history.py writes them
+
+Queries are recognised by their text, not parsed, so a statement the
+stand-in does not know raises ProgrammingError naming it. The change log
+is virtual: row ``i`` is computed on demand, so a million changes cost no
+memory until they are read.
+
+Time spent producing rows is added up by ``clock()``, so callers can tell the
+function's own time from the stand-in's.
+
+Statements take locks the way they would under READ COMMITTED, with key
+and range locks modelled as one lock per table (per job for
+position_current_state), so contention is an upper bound: reads hold a
+shared lock for the statement, writes an exclusive one until commit or
+rollback (see ``Cursor._locks``). Time spent waiting is recorded per
+resource, waiting statement and blocking statement in ``Dataset.locks``.
+``latency`` adds a round trip to every statement and commit, so locks are
+held about as long as they would be over the network.
+"""
+import bisect
+import json
+import random
+import sys
+import threading
+import time
+import types
+from datetime import datetime, time as clock_time, timedelta
+
+BASE_TIME = datetime(2025, 1, 6, 8, 0, 0)
+
+FACILITIES = (
+    ('Cooper University Hospital', 'Cooper'),
+    ('Cape Regional Medical Center', 'Cooper'),
+    ('Virtua Voorhees Hospital', 'Virtua'),
+    ('Virtua Marlton Hospital', 'Virtua'),
+    ('Inspira Medical Center Vineland', 'Inspira'),
+    ('Penn Presbyterian Medical Center', 'Penn Medicine'),
+    ('Lancaster General Hospital', 'Penn Medicine'),
+    ('Jefferson Einstein Philadelphia', 'Jefferson Health'),
+    ('Lankenau Medical Center', 'Main Line Health'),
+    ('Temple University Hospital', 'Temple'),
+    ("St. Luke's Anderson Campus", "St. Luke's"),
+    ('Hunterdon Medical Center', 'Hunterdon Healthcare'),
+    ('Capital Health Hopewell', 'Capital Health'),
+    ('Holy Redeemer Hospital', 'Redeemer Health'),
+    ('Tower Health Reading', 'Tower Health'),
+    ('Mercy Fitzgerald Hospital', 'Trinity Health'),
+) + tuple((f'Regional Medical Center {i}', f'Independent Health {i % 6}') for i in range(24))
+
+PROGRAMS = ('Travel Nursing', 'Per Diem Nursing', 'Local Contract Nursing', 'Travel Allied', 'Allied Per Diem')
+SPECIALTIES = (
+    'ICU', 'ICU - ICU', 'Med Surg', 'Emergency Department', 'Labor and Delivery', 'Cath Lab',
+    'Rad Tech', 'Respiratory Therapist', 'Sonographer', 'Physical Therapist', 'Pharmacy Tech', 'OR - OR',
+)
+AGENCIES = (
+    'GHR Healthcare', 'Planet Healthcare', 'AMN Healthcare', 'Aya Healthcare', 'Cross Country Nurses',
+    'Medical Solutions', 'Fastaff', 'TNAA',
+)
+USERS = ('Avery Recruiter', 'Blake Manager', 'Casey Lead', 'Devon Recruiter', 'Emerson Ops')
+LEVER_KEYS = (
+    'socialMedia', 'agencyOutreach', 'bonus', 'rateIncrease', 'openToAVs', 'hotSheet', 'hotJob',
+    'adjStartPeriod', 'flex48', 'autoOffer', 'relaxRequirements', 'additionalRecruiter',
+    'recruiterIncentive', 'payAdj',
+)
+
+B4_POSITION_COLUMNS = (
+    'source_system', 'position_id', 'program', 'facility', 'specialty', 'date_added', 'unit',
+    'cost_center', 'bill_rate', 'shift_hours', 'shift_time', 'hiring_manager', 'num_submissions',
+    'num_positions', 'requisition_reason', 'shift_diff', 'min_hours', 'open_start_date', 'time_type',
+    'start_time', 'end_time', 'status', 'health_system',
+)
+VNDLY_POSITION_COLUMNS = (
+    'source_system', 'position_id', 'program', 'facility', 'specialty', 'date_added', 'unit',
+    'cost_center', 'bill_rate', 'bill_rate_estimated', 'shift_hours', 'shift_time', 'hiring_manager',
+    'num_submissions', 'num_positions', 'requisition_reason', 'shift_diff', 'min_hours',
+    'open_start_date', 'time_type', 'start_time', 'end_time', 'status', 'health_system',
+)
+B4_SUBMISSION_COLUMNS = (
+    'Contract_Assignment_ID', 'Agency_Name', 'Professional', 'Submission_Date', 'Agency_Retracted_Date',
+    'Hospital_Decline_Date', 'Hospital_Decline_Reason', 'Offer_Date', 'Agency_Decline_Date',
+    'Offer_Decline_Reason', 'Date_Awarded', 'RTO', 'IsActive',
+)
+VNDLY_SUBMISSION_COLUMNS = (
+    'job_id', 'candidate_name', 'agency', 'submission_date', 'status', 'interview_date',
+    'client_rejected_date', 'reject_reason_choice', 'reject_reason_text', 'vendor_declined_date',
+    'vendor_withdrawn_date', 'withdrawal_reason_choice', 'withdrawal_reason_text', 'offer_date',
+    'offer_accepted_date', 'onboarded_date', 'rto_date', 'candidate_id',
+)
+ASSIGNMENT_COLUMNS = (
+    'source_system', 'position_id', 'candidate_name', 'agency', 'facility', 'system', 'specialty',
+    'startDate', 'endDate', 'status',
+)
+CHANGE_COLUMNS = ('id', 'timestamp', 'jobid', 'change_type', 'change_data', 'user_name', 'change_blob')
+HISTORY_CHANGE_COLUMNS = ('seq',) + CHANGE_COLUMNS
+SNAPSHOT_COLUMNS = (
+    'id', 'snapshot_timestamp', 'change_count', 'snapshot_data', 'high_water_seq', 'is_checkpoint',
+    'snapshot_blob',
+)
+
+# GetChanges' filter predicates, in the order their parameters are bound
+CHANGE_FILTERS = (
+    ('jobid = ?', 'jobid'),
+    ('change_type = ?', 'change_type'),
+    ('user_name = ?', 'user_name'),
+    ('timestamp >= ?', 'from'),
+    ('timestamp < ?', 'to'),
+)
+KEYSET = '(timestamp > ? OR (timestamp = ? AND id > ?))'
+
+_clock = {}  # thread id -> seconds spent producing rows
+_clock_lock = threading.Lock()
+
+
+def clock():
+    """
+    Seconds spent producing stand-in rows since ``reset_clock``, on the
+    busiest thread. Queries started with db.run_parallel overlap, so the
+    longest branch is what they add to the request.
+    """
+    with _clock_lock:
+        return max(_clock.values(), default=0.0)
+
+
+def reset_clock():
+    with _clock_lock:
+        _clock.clear()
+
+
+def _charge(started):
+    elapsed = time.perf_counter() - started
+    thread = threading.get_ident()
+    with _clock_lock:
+        _clock[thread] = _clock.get(thread, 0.0) + elapsed
+
+
+# Lock modes that can be held together by different connections
+COMPATIBLE = {('S', 'S'), ('IX', 'IX')}
+
+# Labels for lock reports; other statements show as "<verb> <table>"
+STATEMENT_NAMES = (
+    ('DELETE FROM dbo.ghr_history_snapshots', 'history prune DELETE'),
+    ('INSERT INTO dbo.ghr_history_snapshots', 'history snapshot INSERT'),
+    ('SELECT c.id, (SELECT COUNT(*) FROM dbo.ghr_history_snapshots', 'history checkpoint count'),
+    ('SELECT MAX(seq)', 'change log high water'),
+    ('INSERT INTO dbo.ghr_changes', 'change INSERT'),
+    ('SELECT s.jobid, s.state_json FROM dbo.position_current_state s WITH (UPDLOCK', 'current state UPDLOCK read'),
+    ('UPDATE dbo.position_current_state', 'current state UPDATE'),
+    ('INSERT INTO dbo.position_current_state', 'current state INSERT'),
+    ('SELECT jobid, state_json FROM dbo.position_current_state', 'current state read'),
+)
+
+
+def statement_name(sql):
+    for prefix, name in STATEMENT_NAMES:
+        if sql.startswith(prefix):
+            return name
+    words = sql.split()
+    table = next((w for w in words if w.startswith(('dbo.', 'dhc.'))), '')
+    return f"{words[0]} {table}".strip()
+
+
+class LockTable:
+    """
+    Locks on named resources, each held by a connection. A request waits
+    while another connection holds an incompatible mode; every wait is
+    recorded against the statement that waited and the one holding the lock.
+    """
+
+    def __init__(self, timeout=30.0):
+        self.timeout = timeout
+        self._held = {}  # resource -> {owner: (mode, statement name)}
+        self._condition = threading.Condition()
+        self._waits = {}  # (table, statement, blocker) -> [count, seconds, max seconds]
+
+    def _blocker(self, resource, owner, mode):
+        for other, (held_mode, statement) in self._held.get(resource, {}).items():
+            if other is not owner and (held_mode, mode) not in COMPATIBLE:
+                return statement
+        return None
+
+    def acquire(self, owner, locks, statement):
+        """Take every (resource, mode) in ``locks``, in order."""
+        with self._condition:
+            for resource, mode in locks:
+                blocker = self._blocker(resource, owner, mode)
+                if blocker is not None:
+                    started = time.perf_counter()
+                    deadline = started + self.timeout
+                    while self._blocker(resource, owner, mode) is not None:
+                        if not self._condition.wait(deadline - time.perf_counter()):
+                            self._record(resource, statement, blocker, time.perf_counter() - started)
+                            raise OperationalError(f"Lock request time out period exceeded ({statement} on {resource})")
+                    self._record(resource, statement, blocker, time.perf_counter() - started)
+                holders = self._held.setdefault(resource, {})
+                held = holders.get(owner)
+                # Holding two different modes is as strong as X
+                holders[owner] = (mode if held is None or held[0] == mode else 'X', statement)
+
+    def release(self, owner, shared_only=False):
+        """Drop ``owner``'s locks: all of them, or only the statement-long S locks."""
+        with self._condition:
+            for resource in [r for r, holders in self._held.items() if owner in holders]:
+                holders = self._held[resource]
+                if shared_only and holders[owner][0] != 'S':
+                    continue
+                del holders[owner]
+                if not holders:
+                    del self._held[resource]
+            self._condition.notify_all()
+
+    def held(self, prefix):
+        with self._condition:
+            return sorted(r for r in self._held if r.startswith(prefix))
+
+    def _record(self, resource, statement, blocker, seconds):
+        key = (resource.partition(':')[0], statement, blocker)
+        wait = self._waits.setdefault(key, [0, 0.0, 0.0])
+        wait[0] += 1
+        wait[1] += seconds
+        wait[2] = max(wait[2], seconds)
+
+    def waits(self):
+        """Recorded waits, longest total first."""
+        with self._condition:
+            waits = [
+                {'resource': resource, 'statement': statement, 'blockedBy': blocker, 'waits': count,
+                 'totalMs': round(seconds * 1000, 1), 'maxMs': round(longest * 1000, 1)}
+                for (resource, statement, blocker), (count, seconds, longest) in self._waits.items()
+            ]
+        return sorted(waits, key=lambda w: w['totalMs'], reverse=True)
+
+    def reset(self):
+        with self._condition:
+            self._waits.clear()
+
+
+class Dataset:
+    """
+    Generated tables at a given scale. ``positions`` open positions split
+    evenly between B4 and VNDLY, about ``submissions_per_position``
+    submissions each, ``changes`` saved changes against those positions,
+    and ``snapshots`` history snapshots spread over the change log.
+    Changes saved through the stand-in are appended after the generated
+    ones. ``latency`` is the simulated round trip, in seconds.
+    """
+
+    def __init__(self, positions=1000, changes=10000, snapshots=100, submissions_per_position=4,
+                 checkpoint_every=25, seed=1, latency=0.0):
+        rng = random.Random(seed)
+        self._lock = threading.RLock()
+        self.latency = latency
+        self.locks = LockTable()
+        self.loaded_at = BASE_TIME
+        self.checkpoint_every = checkpoint_every
+
+        b4_count = positions // 2
+        self.b4_positions = [self._b4_position(rng, i) for i in range(b4_count)]
+        self.vndly_positions = [self._vndly_position(rng, i) for i in range(positions - b4_count)]
+        self.b4_submissions = sorted(
+            (self._b4_submission(rng, p[1]) for p in self.b4_positions
+             for _ in range(rng.randint(0, 2 * submissions_per_position))),
+            key=lambda s: s[0]
+        )
+        self.vndly_submissions = sorted(
+            (self._vndly_submission(rng, p[1]) for p in self.vndly_positions
+             for _ in range(rng.randint(0, 2 * submissions_per_position))),
+            key=lambda s: s[0]
+        )
+        self.assignments = {
+            key: [self._assignment(rng, source, i, upcoming) for i in range(count)]
+            for key, source, count, upcoming in (
+                ('b4_active', 'B4', positions // 4, False),
+                ('b4_upcoming', 'B4', positions // 20, True),
+                ('vndly_active', 'VNDLY', positions // 4, False),
+                ('vndly_upcoming', 'VNDLY', positions // 20, True),
+            )
+        }
+
+        self.job_ids = [p[1] for p in self.b4_positions + self.vndly_positions] or ['none']
+        self.change_count = changes
+        self._generated = changes
+        self._saved = []
+        self._saved_ids = set()
+        self._latest_keys = None
+        self._latest = None
+        self._current_state = None
+        self.snapshots = [self._snapshot(k, snapshots) for k in range(snapshots)]
+
+    # -- generated rows ------------------------------------------------
+
+    @staticmethod
+    def _facility(rng):
+        return rng.choice(FACILITIES)
+
+    def _b4_position(self, rng, i):
+        facility, system = self._facility(rng)
+        added = BASE_TIME - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440))
+        return (
+            'B4', f'B4-{i:07d}', rng.choice(PROGRAMS), facility, rng.choice(SPECIALTIES), added,
+            f'Unit {rng.randint(1, 30)}', f'CC-{rng.randint(1000, 9999)}', f'${rng.randint(55, 140)}.{rng.randint(0, 99):02d}',
+            rng.choice(('8', '10', '12')), rng.choice(('Days', 'Nights', 'Rotating')), f'Manager {rng.randint(1, 400)}',
+            rng.randint(0, 12), rng.randint(1, 3), rng.choice(('Vacancy', 'Leave', 'Census')), None, None,
+            added + timedelta(days=21), rng.choice(('Full Time', 'Part Time')),
+            clock_time(7), clock_time(19), 'Open', system,
+        )
+
+    def _vndly_position(self, rng, i):
+        facility, system = self._facility(rng)
+        added = BASE_TIME - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440))
+        estimated = rng.random() < 0.3
+        return (
+            'VNDLY', f'VN-{i:07d}', rng.choice(PROGRAMS), facility, rng.choice(SPECIALTIES), added,
+            f'Org Unit {rng.randint(1, 30)}', f'CC-{rng.randint(1000, 9999)}', round(rng.uniform(55, 140), 2),
+            1 if estimated else 0, 36, rng.choice(('Day', 'Night')), f'Manager {rng.randint(1, 400)}',
+            rng.randint(0, 6), rng.randint(1, 3), rng.choice(('Vacancy', 'Leave', 'Census')), None, None,
+            added + timedelta(days=21), rng.choice(('Travel', 'Local', 'Per Diem')), None, None, 'Active', system,
+        )
+
+    def _b4_submission(self, rng, position_id):
+        submitted = BASE_TIME - timedelta(days=rng.randint(0, 60))
+        declined = rng.random() < 0.25
+        return (
+            position_id, rng.choice(AGENCIES), f'Candidate {rng.randint(1, 50000)}', submitted,
+            None, submitted + timedelta(days=3) if declined else None, 'Skills mismatch' if declined else None,
+            submitted + timedelta(days=5) if rng.random() < 0.1 else None, None, None, None, None,
+            0 if declined else 1,
+        )
+
+    def _vndly_submission(self, rng, position_id):
+        submitted = BASE_TIME - timedelta(days=rng.randint(0, 60))
+        status = rng.choice(('Active', 'Active', 'Submitted', 'Rejected', 'Interview Scheduled'))
+        return (
+            position_id, f'Candidate {rng.randint(1, 50000)}', rng.choice(AGENCIES), submitted, status,
+            submitted + timedelta(days=4) if status == 'Interview Scheduled' else None,
+            submitted + timedelta(days=2) if status == 'Rejected' else None,
+            'Skills' if status == 'Rejected' else None, None, None, None, None, None, None, None, None, None,
+            rng.randint(1, 10 ** 6),
+        )
+
+    def _assignment(self, rng, source, i, upcoming):
+        facility, system = self._facility(rng)
+        if upcoming:
+            start = BASE_TIME + timedelta(days=rng.randint(1, 30))
+        else:
+            start = BASE_TIME - timedelta(days=rng.randint(0, 90))
+        end = start + timedelta(weeks=13) if rng.random() < 0.9 else None
+        return (
+            source, f'{source}-A{i:07d}', f'Clinician {i}', rng.choice(AGENCIES), facility, system,
+            rng.choice(SPECIALTIES), start, end,
+            ('Closed And Awarded' if source == 'B4' else ('Applied' if upcoming else 'Active')),
+        )
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def change(self, i):
+        """Row ``i`` (0-based) of dbo.ghr_changes, ordered by timestamp and seq."""
+        if i >= self._generated:
+            return self._saved[i - self._generated]
+        kind = i % 10
+        user = USERS[i % len(USERS)]
+        timestamp = BASE_TIME + timedelta(seconds=i)
+        if kind < 6:
+            change_type = 'lever_update'
+            data = {'leverKey': LEVER_KEYS[i % len(LEVER_KEYS)], 'done': i % 3 != 0, 'user': user,
+                    'time': timestamp.strftime('%m/%d/%Y %I:%M %p')}
+        elif kind == 6:
+            change_type = 'margin_update'
+            data = {'margin': str(15 + i % 20)}
+        elif kind == 7:
+            change_type = 'next_step_update'
+            data = {'nextStep': {'date': timestamp.date().isoformat(), 'text': f'Follow up with manager ({i})'}}
+        elif kind == 8:
+            change_type = 'av_open_date_update'
+            data = {'avOpenDate': (timestamp + timedelta(days=7)).date().isoformat()}
+        else:
+            change_type = 'interview_scheduled'
+            data = {'candidateName': f'Candidate {i % 50000}', 'candidateAgency': AGENCIES[i % len(AGENCIES)],
+                    'interviewDate': (timestamp + timedelta(days=2)).date().isoformat()}
+        return (
+            i + 1, f'bench-{i:08d}', timestamp, self.job_ids[(i * 7919) % len(self.job_ids)],
+            change_type, json.dumps(data), user, None,
+        )
+
+    def _change_index(self, timestamp, change_id):
+        """Index of the first change after (timestamp, id) in timestamp, id order."""
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        key = (timestamp, change_id)
+        return bisect.bisect_right(_ChangeKeys(self), key)
+
+    def has_change(self, change_id):
+        if change_id in self._saved_ids:
+            return True
+        if change_id.startswith('bench-') and change_id[6:].isdigit():
+            return int(change_id[6:]) < self._generated
+        return False
+
+    def save_change(self, change_id, timestamp, job_id, change_type, text, user, blob):
+        """INSERT INTO dbo.ghr_changes; ``timestamp`` must not be older than the log."""
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00')).replace(tzinfo=None)
+        with self._lock:
+            if self.has_change(change_id):
+                raise IntegrityError(f"Cannot insert duplicate key in object 'dbo.ghr_changes': {change_id}")
+            self.change_count += 1
+            self._saved.append((self.change_count, change_id, timestamp, job_id, change_type, text, user, blob))
+            self._saved_ids.add(change_id)
+            if self._latest_keys is not None:
+                self._latest_keys[self._latest_key(self._saved[-1])] = self.change_count - 1
+                self._latest = None
+
+    @staticmethod
+    def _latest_key(row):
+        data = json.loads(row[5] or '{}')
+        if data.get('leverKey') is not None:
+            state_key = data['leverKey']
+        elif data.get('candidateName') is not None and data.get('candidateAgency') is not None:
+            state_key = f"{data['candidateName']}|{data['candidateAgency']}"
+        else:
+            state_key = ''
+        return (row[3], row[4], state_key)
+
+    def latest_changes(self):
+        """Indexes of the newest change per job, type and state key (GetChanges ?mode=latest)."""
+        with self._lock:
+            if self._latest_keys is None:
+                self._latest_keys = {self._latest_key(self.change(i)): i for i in range(self.change_count)}
+            if self._latest is None:
+                self._latest = sorted(self._latest_keys.values())
+            return self._latest
+
+    # -- position_current_state ----------------------------------------
+
+    def _current_states(self):
+        """Seeded from the change log on first use, as current_state.rebuild would."""
+        if self._current_state is None:
+            from api.shared_code import history
+            states = {}
+            for i in self.latest_changes():
+                change = history._change(self.change(i))
+                states.setdefault(change['jobId'], []).append(change)
+            self._current_state = {job_id: json.dumps(changes) for job_id, changes in states.items()}
+        return self._current_state
+
+    def current_state_rows(self, job_ids=None):
+        with self._lock:
+            states = self._current_states()
+            if job_ids is None:
+                return sorted(states.items())
+            return [(job_id, states[job_id]) for job_id in job_ids if job_id in states]
+
+    def set_current_state(self, job_id, state_json):
+        with self._lock:
+            self._current_states()[job_id] = state_json
+
+    # -- history -------------------------------------------------------
+
+    def _snapshot(self, k, total):
+        high_water = round(self.change_count * (k + 1) / total) if total else 0
+        return {
+            'id': k + 1,
+            'timestamp': (BASE_TIME + timedelta(seconds=high_water)).isoformat(),
+            'change_count': high_water,
+            'data': None,
+            'blob': None,
+            'high_water': high_water,
+            'checkpoint': k % self.checkpoint_every == 0,
+        }
+
+    def snapshot_row(self, snapshot, metadata_only=False):
+        if snapshot['checkpoint'] and snapshot['data'] is None and snapshot['blob'] is None and not metadata_only:
+            # Written the way history.save_snapshot writes checkpoints
+            from api.shared_code import history, payloads
+            changes = [history._change(self.change(i)) for i in range(snapshot['high_water'])]
+            snapshot['blob'], snapshot['data'] = payloads.split(
+                json.dumps(history._document(snapshot['timestamp'], changes))
+            )
+        return (
+            snapshot['id'], snapshot['timestamp'], snapshot['change_count'],
+            None if metadata_only else snapshot['data'], snapshot['high_water'],
+            1 if snapshot['checkpoint'] else 0, None if metadata_only else snapshot['blob'],
+        )
+
+    def insert_snapshot(self, timestamp, change_count, data, blob, high_water, is_checkpoint):
+        with self._lock:
+            self.snapshots.append({
+                'id': (self.snapshots[-1]['id'] if self.snapshots else 0) + 1,
+                'timestamp': timestamp,
+                'change_count': change_count,
+                'data': data,
+                'blob': blob,
+                'high_water': high_water,
+                'checkpoint': bool(is_checkpoint),
+            })
+
+    def prune_snapshots(self, keep):
+        with self._lock:
+            kept = self.snapshots[-keep:]
+            if not kept:
+                return
+            checkpoints = [s['id'] for s in self.snapshots if s['checkpoint'] and s['id'] <= kept[0]['id']]
+            if checkpoints:
+                self.snapshots = [s for s in self.snapshots if s['id'] >= max(checkpoints)]
+
+
+class _ChangeKeys:
+    """(timestamp, id) of every change, as a sequence bisect can search."""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __len__(self):
+        return self.dataset.change_count
+
+    def __getitem__(self, i):
+        row = self.dataset.change(i)
+        return (row[2], row[1])
+
+
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+def describe(columns, rows):
+    """
+    ``cursor.description`` for ``rows``. pyodbc reports each column's Python
+    type; here it is taken from the first non-null value, and left as None
+    for results generated lazily.
+    """
+    types = [None] * len(columns)
+    if isinstance(rows, list):
+        for i in range(len(columns)):
+            types[i] = next((type(row[i]) for row in rows if row[i] is not None), None)
+    return [(name, types[i], None, None, None, None, True) for i, name in enumerate(columns)]
+
+
+def _filter_ids(rows, params, key=0):
+    """Rows whose ID is in the STRING_SPLIT list parameter, if there is one."""
+    if not params:
+        return rows
+    wanted = set(params[-1].split(','))
+    return [row for row in rows if row[key] in wanted]
+
+
+class Cursor:
+
+    def __init__(self, dataset, connection):
+        self.dataset = dataset
+        self.connection = connection
+        self.description = None
+        self.rowcount = -1
+        self.fast_executemany = False
+        self._rows = iter(())
+
+    def _result(self, columns, rows):
+        self.description = describe(columns, rows)
+        self._rows = iter(rows)
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = tuple(params[0])
+        return self._execute(sql, [params])
+
+    def executemany(self, sql, seq_of_params):
+        # One round trip for the whole batch, as with fast_executemany
+        self._execute(sql, [tuple(params) for params in seq_of_params])
+
+    def _execute(self, sql, param_sets):
+        started = time.perf_counter()
+        try:
+            self.description = None
+            self._rows = iter(())
+            sql = ' '.join(sql.split())
+            locks = self._locks(sql, param_sets)
+            if locks:
+                self.dataset.locks.acquire(self.connection, locks, statement_name(sql))
+            try:
+                self.dataset.round_trip()
+                for params in param_sets:
+                    self._route(sql, params)
+            finally:
+                if locks:
+                    self.dataset.locks.release(self.connection, shared_only=True)
+        finally:
+            _charge(started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return next(self._rows, None)
+        finally:
+            _charge(started)
+
+    def fetchmany(self, size=1):
+        started = time.perf_counter()
+        try:
+            rows = []
+            for row in self._rows:
+                rows.append(row)
+                if len(rows) >= size:
+                    break
+            return rows
+        finally:
+            _charge(started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return list(self._rows)
+        finally:
+            _charge(started)
+
+    def close(self):
+        pass
+
+    # -- locking -------------------------------------------------------
+
+    def _locks(self, sql, param_sets):
+        """
+        (resource, mode) pairs ``sql`` locks. Inserts into the change log
+        take IX, so they don't block each other but do block readers at the
+        tail of the log, as uncommitted key locks would.
+        """
+        verb = sql.split(' ', 1)[0]
+        if 'dbo.ghr_history_snapshots' in sql:
+            return [('dbo.ghr_history_snapshots', 'X' if verb in ('INSERT', 'DELETE') else 'S')]
+        if 'dbo.position_current_state' in sql:
+            if 'UPDLOCK' in sql:
+                job_ids = json.loads(param_sets[0][0])
+            elif verb == 'UPDATE':
+                job_ids = [params[2] for params in param_sets]
+            elif verb == 'INSERT':
+                job_ids = [params[0] for params in param_sets]
+            else:
+                # A full read waits for every job row being written
+                return [(resource, 'S') for resource in self.dataset.locks.held('dbo.position_current_state:')]
+            return [(f'dbo.position_current_state:{job_id}', 'X') for job_id in sorted(set(job_ids))]
+        if 'dbo.ghr_changes' in sql and 'UPDLOCK' not in sql:
+            return [('dbo.ghr_changes', {'INSERT': 'IX', 'DELETE': 'X'}.get(verb, 'S'))]
+        return []
+
+    # -- query routing -------------------------------------------------
+
+    def _route(self, sql, params):
+        data = self.dataset
+        if sql == 'SELECT 1':
+            return self._result(('x',), [(1,)])
+        if sql.startswith('SELECT COL_LENGTH('):
+            count = sql.count('COL_LENGTH(')
+            return self._result(tuple(f'k{i}' for i in range(count)), [(100,) * count])
+        if "OBJECT_ID('dbo.ghr_submission_summary_state')" in sql and sql.startswith('SELECT OBJECT_ID'):
+            # No precomputed summaries: submissions are classified in Python
+            return self._result(('id',), [(None,)])
+        if 'sys.dm_db_index_usage_stats' in sql and 'sys.partitions' in sql:
+            rows = len(data.b4_positions) + len(data.vndly_positions)
+            return self._result(('last_update', 'row_count'), [(data.loaded_at, rows)])
+        if 'CHECKSUM_AGG' in sql and 'dbo.system_mappings' in sql:
+            return self._result(('count', 'checksum'), [(0, None)])
+        if 'FROM dbo.system_mappings_state' in sql:
+            return self._result(('version',), [(0,)])
+        if sql.startswith('SELECT id, keywords, system_name, sort_order FROM dbo.system_mappings'):
+            return self._result(('id', 'keywords', 'system_name', 'sort_order'), [])
+        if 'FROM dbo.system_mappings' in sql:
+            return self._result(('keywords', 'system_name'), [])
+
+        if 'FROM dhc.B4HEALTHOPENORDER o LEFT JOIN' in sql:
+            rows = data.b4_positions
+            if 'COLLATE' not in sql:
+                rows = sorted(rows, key=lambda r: r[5], reverse=True)
+            return self._result(B4_POSITION_COLUMNS, rows)
+        if "FROM dbo.STAGING_VNDLY_JOBS WHERE [Job Status] = 'Active'" in sql:
+            rows = data.vndly_positions
+            if 'COLLATE' not in sql:
+                rows = sorted(rows, key=lambda r: r[5], reverse=True)
+            return self._result(VNDLY_POSITION_COLUMNS, rows)
+        if 'FROM dhc.B4Health_Contract_Submissions s' in sql:
+            return self._result(B4_SUBMISSION_COLUMNS, _filter_ids(data.b4_submissions, params))
+        if 'FROM dbo.STAGING_VNDLY_SUBMISSIONS s' in sql:
+            return self._result(VNDLY_SUBMISSION_COLUMNS, _filter_ids(data.vndly_submissions, params))
+
+        if "FROM dhc.B4HealthOrder WHERE Contract_Status = 'Closed And Awarded'" in sql:
+            key = 'b4_active' if 'Start_Date <= GETDATE()' in sql else 'b4_upcoming'
+            return self._result(ASSIGNMENT_COLUMNS, data.assignments[key])
+        if "[Work Order Current Status] = 'Active'" in sql:
+            return self._result(ASSIGNMENT_COLUMNS, data.assignments['vndly_active'])
+        if "[Work Order Current Status] IN ('Verification In Progress', 'Applied')" in sql:
+            return self._result(ASSIGNMENT_COLUMNS, data.assignments['vndly_upcoming'])
+
+        if 'dbo.ghr_history_snapshots' in sql:
+            return self._route_history(sql, params)
+        if 'dbo.position_current_state' in sql:
+            return self._route_current_state(sql, params)
+        if sql.startswith('INSERT INTO dbo.ghr_changes'):
+            data.save_change(*params)
+            self.rowcount = 1
+            return None
+        if 'FROM dbo.ghr_changes' in sql:
+            return self._route_changes(sql, params)
+
+        raise ProgrammingError(f"The benchmark stand-in does not know this statement: {sql[:200]}")
+
+    def _route_changes(self, sql, params):
+        data = self.dataset
+        count = data.change_count
+        if 'WITH (UPDLOCK, HOLDLOCK) JOIN OPENJSON(?)' in sql:
+            return self._result(('id',), [(i,) for i in json.loads(params[0]) if data.has_change(i)])
+        if sql.startswith('SELECT MAX(seq), COUNT(*)'):
+            return self._result(('seq', 'count'), [(count or None, count)])
+        if sql.startswith('SELECT MAX(seq)'):
+            return self._result(('seq',), [(count or None,)])
+        if 'WHERE seq > ? AND seq <= ?' in sql:
+            low, high = params
+            return self._result(HISTORY_CHANGE_COLUMNS, (data.change(i) for i in range(low, min(high, count))))
+
+        latest = sql.startswith('WITH ranked AS')
+        params = list(params)
+        if latest:
+            filter_sql, _, where_sql = sql.partition(') SELECT TOP (?)')
+        else:
+            filter_sql = where_sql = sql
+        filters = []
+        if not latest:
+            top = params.pop(0)
+        for predicate, name in CHANGE_FILTERS:
+            if predicate in filter_sql:
+                filters.append((name, params.pop(0)))
+        if latest:
+            top = params.pop(0)
+        start = 0
+        if KEYSET in where_sql:
+            start = data._change_index(params[0], params[2])
+
+        indexes = data.latest_changes() if latest else range(count)
+        indexes = indexes[bisect.bisect_left(indexes, start):] if latest else range(start, count)
+        return self._result(CHANGE_COLUMNS, _matching_changes(data, indexes, filters, top))
+
+    def _route_current_state(self, sql, params):
+        data = self.dataset
+        if 'JOIN OPENJSON(?)' in sql:
+            return self._result(('jobid', 'state_json'), data.current_state_rows(json.loads(params[0])))
+        if sql.startswith('UPDATE dbo.position_current_state'):
+            data.set_current_state(params[2], params[0])
+            self.rowcount = 1
+            return None
+        if sql.startswith('INSERT INTO dbo.position_current_state'):
+            data.set_current_state(params[0], params[1])
+            self.rowcount = 1
+            return None
+        if sql.startswith('SELECT jobid, state_json FROM dbo.position_current_state'):
+            return self._result(('jobid', 'state_json'), data.current_state_rows())
+        raise ProgrammingError(f"The benchmark stand-in does not know this statement: {sql[:200]}")
+
+    def _route_history(self, sql, params):
+        data = self.dataset
+        snapshots = data.snapshots
+        if sql.startswith('INSERT INTO dbo.ghr_history_snapshots'):
+            data.insert_snapshot(*params)
+            self.rowcount = 1
+            return None
+        if sql.startswith('DELETE FROM dbo.ghr_history_snapshots'):
+            data.prune_snapshots(params[0])
+            return None
+        if sql.startswith('SELECT c.id, (SELECT COUNT(*)'):
+            checkpoints = [s['id'] for s in snapshots if s['checkpoint'] and s['high_water'] is not None]
+            if not checkpoints:
+                return self._result(('id', 'count'), [(None, 0)])
+            newest = max(checkpoints)
+            return self._result(('id', 'count'), [(newest, sum(1 for s in snapshots if s['id'] > newest))])
+        if 'change_count, NULL, high_water_seq' in sql:
+            rows = [data.snapshot_row(s, metadata_only=True) for s in reversed(snapshots[-params[0]:])]
+            return self._result(SNAPSHOT_COLUMNS, rows)
+        if 'WHERE is_checkpoint = 1 AND id < ?' in sql:
+            anchors = [s for s in snapshots if s['checkpoint'] and s['id'] < params[0]]
+            return self._result(SNAPSHOT_COLUMNS, [data.snapshot_row(anchors[-1])] if anchors else [])
+        if 'WHERE id = ?' in sql:
+            found = [s for s in snapshots if s['id'] == params[0]]
+            return self._result(SNAPSHOT_COLUMNS, [data.snapshot_row(found[0])] if found else [])
+        if 'ORDER BY id' in sql:
+            return self._result(SNAPSHOT_COLUMNS, [data.snapshot_row(s) for s in snapshots])
+        raise ProgrammingError(f"The benchmark stand-in does not know this statement: {sql[:200]}")
+
+
+def _matching_changes(data, indexes, filters, top):
+    rows = []
+    for i in indexes:
+        row = data.change(i)
+        if all(_change_matches(row, name, value) for name, value in filters):
+            rows.append(row[1:])
+            if len(rows) >= top:
+                break
+    return rows
+
+
+def _change_matches(row, name, value):
+    if name == 'jobid':
+        return row[3] == value
+    if name == 'change_type':
+        return row[4] == value
+    if name == 'user_name':
+        return row[6] == value
+    timestamp = datetime.fromisoformat(str(value))
+    return row[2] >= timestamp if name == 'from' else row[2] < timestamp
+
+
+class Connection:
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.autocommit = False
+
+    def cursor(self):
+        return Cursor(self.dataset, self)
+
+    def commit(self):
+        self.dataset.round_trip()
+        self.dataset.locks.release(self)
+
+    def rollback(self):
+        self.dataset.locks.release(self)
+
+    def close(self):
+        self.dataset.locks.release(self)
+
+
+def install(dataset):
+    """
+    Register a ``pyodbc`` module backed by ``dataset``. Call before the
+    function code is imported.
+    """
+    module = types.ModuleType('pyodbc')
+    module.__doc__ = 'Benchmark stand-in for pyodbc (benchmarks/standin.py)'
+    for error in (Error, InterfaceError, DatabaseError, OperationalError, ProgrammingError, IntegrityError):
+        setattr(module, error.__name__, error)
+    module.connect = lambda connection_string, **kwargs: Connection(dataset)
+    sys.modules['pyodbc'] = module
+    return module
@@ -0,0 +1,73 @@
+/*
+    Trimmed ID keys for the GetPositions joins (POSITIONS_DB).
+
+    The source tables store IDs with stray leading/trailing spaces, so the
+    joins compared RTRIM(LTRIM(...)) on both sides. A function on the column
+    hides it from any index and forces a scan of every row. This adds a
+    persisted computed column holding the trimmed ID to each table and
+    indexes it, so the joins can seek on the key instead.
+
+    GetPositions checks for these columns on every rebuild and falls back to
+    the RTRIM(LTRIM(...)) predicates for any table that does not have them,
+    so it is safe to run this before or after deploying the API.
+
+    The script is idempotent. If an ETL load drops and recreates one of
+    these tables, run it again after the load to restore the key column.
+*/
+
+-- dhc.B4HEALTHOPENORDER.[Position ID]
+IF COL_LENGTH('dhc.B4HEALTHOPENORDER', 'position_id_key') IS NULL
+    ALTER TABLE dhc.B4HEALTHOPENORDER
+        ADD position_id_key AS CAST(RTRIM(LTRIM([Position ID])) AS NVARCHAR(100)) PERSISTED;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_B4HEALTHOPENORDER_position_id_key'
+               AND object_id = OBJECT_ID('dhc.B4HEALTHOPENORDER'))
+    CREATE INDEX IX_B4HEALTHOPENORDER_position_id_key
+        ON dhc.B4HEALTHOPENORDER (position_id_key);
+GO
+
+-- dhc.B4HealthOrder.Contract_ID
+IF COL_LENGTH('dhc.B4HealthOrder', 'contract_id_key') IS NULL
+    ALTER TABLE dhc.B4HealthOrder
+        ADD contract_id_key AS CAST(RTRIM(LTRIM(Contract_ID)) AS NVARCHAR(100)) PERSISTED;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_B4HealthOrder_contract_id_key'
+               AND object_id = OBJECT_ID('dhc.B4HealthOrder'))
+    CREATE INDEX IX_B4HealthOrder_contract_id_key
+        ON dhc.B4HealthOrder (contract_id_key)
+        INCLUDE (Time_Type, Start_Time, End_Time, Contract_Status, Health_System);
+GO
+
+-- dhc.B4Health_Contract_Submissions.Contract_Assignment_ID
+IF COL_LENGTH('dhc.B4Health_Contract_Submissions', 'contract_assignment_id_key') IS NULL
+    ALTER TABLE dhc.B4Health_Contract_Submissions
+        ADD contract_assignment_id_key AS CAST(RTRIM(LTRIM(Contract_Assignment_ID)) AS NVARCHAR(100)) PERSISTED;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_B4Health_Contract_Submissions_contract_assignment_id_key'
+               AND object_id = OBJECT_ID('dhc.B4Health_Contract_Submissions'))
+    CREATE INDEX IX_B4Health_Contract_Submissions_contract_assignment_id_key
+        ON dhc.B4Health_Contract_Submissions (contract_assignment_id_key);
+GO
+
+-- dbo.STAGING_VNDLY_JOBS.[Job Id]
+IF COL_LENGTH('dbo.STAGING_VNDLY_JOBS', 'job_id_key') IS NULL
+    ALTER TABLE dbo.STAGING_VNDLY_JOBS
+        ADD job_id_key AS CAST(RTRIM(LTRIM([Job Id])) AS NVARCHAR(100)) PERSISTED;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_STAGING_VNDLY_JOBS_job_id_key'
+               AND object_id = OBJECT_ID('dbo.STAGING_VNDLY_JOBS'))
+    CREATE INDEX IX_STAGING_VNDLY_JOBS_job_id_key
+        ON dbo.STAGING_VNDLY_JOBS (job_id_key)
+        INCLUDE ([Job Status]);
+GO
+
+-- dbo.STAGING_VNDLY_SUBMISSIONS.[Job Id]
+IF COL_LENGTH('dbo.STAGING_VNDLY_SUBMISSIONS', 'job_id_key') IS NULL
+    ALTER TABLE dbo.STAGING_VNDLY_SUBMISSIONS
+        ADD job_id_key AS CAST(RTRIM(LTRIM([Job Id])) AS NVARCHAR(100)) PERSISTED;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_STAGING_VNDLY_SUBMISSIONS_job_id_key'
+               AND object_id = OBJECT_ID('dbo.STAGING_VNDLY_SUBMISSIONS'))
+    CREATE INDEX IX_STAGING_VNDLY_SUBMISSIONS_job_id_key
+        ON dbo.STAGING_VNDLY_SUBMISSIONS (job_id_key);
+GO
@@ -0,0 +1,201 @@
+/*
+    Precomputed submission summaries for GetPositions (POSITIONS_DB).
+
+    GetPositions used to classify every submission in Python on each
+    rebuild: declined or not, decline reason, GHR or not (agency name
+    contains 'ghr' or 'planet healthcare'), then count per position.
+    dbo.ghr_refresh_submission_summary does that once, in SQL, into:
+
+    - dbo.ghr_position_candidates: one normalized row per submission to an
+      open position, in the shape the API returns
+    - dbo.ghr_position_submission_summary: per-position counts
+    - dbo.ghr_submission_summary_state: when the summaries were last built
+
+    Run the procedure at the end of every ETL load:
+
+        EXEC dbo.ghr_refresh_submission_summary;
+
+    or POST /api/submission-summary/refresh. GetPositions only reads the
+    summaries when they were refreshed after the last write to the source
+    tables; otherwise it falls back to computing the counts itself.
+
+    Requires 001_trimmed_id_keys.sql.
+*/
+
+IF OBJECT_ID('dbo.ghr_position_candidates') IS NULL
+    CREATE TABLE dbo.ghr_position_candidates (
+        source_system NVARCHAR(10) NOT NULL,
+        position_id NVARCHAR(100) NOT NULL,
+        candidate_seq INT NOT NULL,
+        name NVARCHAR(400) NOT NULL,
+        agency NVARCHAR(400) NOT NULL,
+        submit_date DATETIME2 NULL,
+        offer_date DATETIME2 NULL,
+        awarded_date DATETIME2 NULL,
+        rto NVARCHAR(100) NULL,
+        rto_date DATETIME2 NULL,
+        is_declined BIT NOT NULL,
+        decline_reason NVARCHAR(400) NULL,
+        hosp_decline_date DATETIME2 NULL,
+        agency_decline_date DATETIME2 NULL,
+        agency_retracted_date DATETIME2 NULL,
+        interview_date DATETIME2 NULL,
+        is_ghr BIT NOT NULL,
+        is_active BIT NOT NULL,
+        status NVARCHAR(100) NULL,
+        CONSTRAINT PK_ghr_position_candidates PRIMARY KEY (source_system, position_id, candidate_seq)
+    );
+GO
+
+IF OBJECT_ID('dbo.ghr_position_submission_summary') IS NULL
+    CREATE TABLE dbo.ghr_position_submission_summary (
+        source_system NVARCHAR(10) NOT NULL,
+        position_id NVARCHAR(100) NOT NULL,
+        ghr_subs INT NOT NULL,
+        av_subs INT NOT NULL,
+        ghr_declines INT NOT NULL,
+        av_declines INT NOT NULL,
+        CONSTRAINT PK_ghr_position_submission_summary PRIMARY KEY (source_system, position_id)
+    );
+GO
+
+IF OBJECT_ID('dbo.ghr_submission_summary_state') IS NULL
+    CREATE TABLE dbo.ghr_submission_summary_state (
+        id INT NOT NULL CONSTRAINT PK_ghr_submission_summary_state PRIMARY KEY,
+        refreshed_at DATETIME NOT NULL,
+        candidate_count INT NOT NULL,
+        position_count INT NOT NULL
+    );
+GO
+
+CREATE OR ALTER PROCEDURE dbo.ghr_refresh_submission_summary
+AS
+BEGIN
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    BEGIN TRANSACTION;
+
+    DELETE FROM dbo.ghr_position_candidates;
+    DELETE FROM dbo.ghr_position_submission_summary;
+
+    -- B4Health: same rules as _b4_candidate in api/GetPositions
+    INSERT INTO dbo.ghr_position_candidates (
+        source_system, position_id, candidate_seq, name, agency, submit_date, offer_date,
+        awarded_date, rto, is_declined, decline_reason, hosp_decline_date,
+        agency_decline_date, agency_retracted_date, is_ghr, is_active
+    )
+    SELECT
+        'B4',
+        s.contract_assignment_id_key,
+        ROW_NUMBER() OVER (PARTITION BY s.contract_assignment_id_key ORDER BY s.Submission_Date, s.Professional),
+        COALESCE(NULLIF(s.Professional, ''), 'Unknown'),
+        COALESCE(NULLIF(s.Agency_Name, ''), 'Unknown'),
+        s.Submission_Date,
+        s.Offer_Date,
+        s.Date_Awarded,
+        CAST(s.RTO AS NVARCHAR(100)),
+        CASE WHEN s.Hospital_Decline_Date IS NOT NULL
+                OR s.Agency_Decline_Date IS NOT NULL
+                OR s.Agency_Retracted_Date IS NOT NULL THEN 1 ELSE 0 END,
+        CASE
+            WHEN s.Hospital_Decline_Date IS NOT NULL THEN COALESCE(NULLIF(s.Hospital_Decline_Reason, ''), 'Hospital Declined')
+            WHEN s.Agency_Decline_Date IS NOT NULL THEN COALESCE(NULLIF(s.Offer_Decline_Reason, ''), 'Agency Declined')
+            WHEN s.Agency_Retracted_Date IS NOT NULL THEN 'Agency Retracted'
+        END,
+        s.Hospital_Decline_Date,
+        s.Agency_Decline_Date,
+        s.Agency_Retracted_Date,
+        CASE WHEN LOWER(s.Agency_Name) LIKE '%ghr%'
+                OR LOWER(s.Agency_Name) LIKE '%planet healthcare%' THEN 1 ELSE 0 END,
+        CASE WHEN s.IsActive = 1 THEN 1 ELSE 0 END
+    FROM dhc.B4Health_Contract_Submissions s
+    WHERE s.contract_assignment_id_key <> ''
+        AND EXISTS (
+            SELECT 1
+            FROM dhc.B4HEALTHOPENORDER o
+            WHERE o.position_id_key = s.contract_assignment_id_key
+        );
+
+    -- VNDLY: same rules as _vndly_candidate in api/GetPositions
+    INSERT INTO dbo.ghr_position_candidates (
+        source_system, position_id, candidate_seq, name, agency, submit_date, offer_date,
+        awarded_date, rto_date, is_declined, decline_reason, hosp_decline_date,
+        agency_decline_date, agency_retracted_date, interview_date, is_ghr, is_active, status
+    )
+    SELECT
+        'VNDLY',
+        s.job_id_key,
+        ROW_NUMBER() OVER (PARTITION BY s.job_id_key ORDER BY s.[Application Date], s.[Full Name]),
+        COALESCE(NULLIF(s.[Full Name], ''), 'Unknown'),
+        COALESCE(NULLIF(s.[Vendor Company Name], ''), 'Unknown'),
+        s.[Application Date],
+        s.[Offer Release Date],
+        s.[Offer Accepted Date],
+        s.[Ready To Onboard Date],
+        CASE WHEN s.[Client Rejected Date] IS NOT NULL
+                OR s.[Vendor Offer Declined Date] IS NOT NULL
+                OR s.[Vendor Withdrawn Date] IS NOT NULL
+                OR LOWER(s.[Status]) IN ('rejected', 'offer declined', 'job closed') THEN 1 ELSE 0 END,
+        CASE
+            WHEN s.[Client Rejected Date] IS NOT NULL OR LOWER(s.[Status]) = 'rejected'
+                THEN COALESCE(NULLIF(s.[Rejected Reason - Choice], ''), NULLIF(s.[Rejected Reason - Text], ''), 'Client Rejected')
+            WHEN s.[Vendor Offer Declined Date] IS NOT NULL OR LOWER(s.[Status]) = 'offer declined'
+                THEN 'Vendor Declined Offer'
+            WHEN s.[Vendor Withdrawn Date] IS NOT NULL
+                THEN COALESCE(NULLIF(s.[Withdrawal Reason - Choice], ''), NULLIF(s.[Withdrawal Reason - Text], ''), 'Vendor Withdrawn')
+            WHEN LOWER(s.[Status]) = 'job closed' THEN 'Job Closed'
+        END,
+        s.[Client Rejected Date],
+        s.[Vendor Offer Declined Date],
+        s.[Vendor Withdrawn Date],
+        s.[Client Interview Date],
+        CASE WHEN LOWER(s.[Vendor Company Name]) LIKE '%ghr%'
+                OR LOWER(s.[Vendor Company Name]) LIKE '%planet healthcare%' THEN 1 ELSE 0 END,
+        -- The API compares the status case-sensitively
+        CASE WHEN s.[Status] = 'Active' COLLATE Latin1_General_CS_AS THEN 1 ELSE 0 END,
+        s.[Status]
+    FROM dbo.STAGING_VNDLY_SUBMISSIONS s
+    WHERE s.job_id_key <> ''
+        AND EXISTS (
+            SELECT 1
+            FROM dbo.STAGING_VNDLY_JOBS j
+            WHERE j.[Job Status] = 'Active'
+                AND j.job_id_key = s.job_id_key
+        );
+
+    INSERT INTO dbo.ghr_position_submission_summary (
+        source_system, position_id, ghr_subs, av_subs, ghr_declines, av_declines
+    )
+    SELECT
+        source_system,
+        position_id,
+        SUM(CASE WHEN is_declined = 0 AND is_ghr = 1 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN is_declined = 0 AND is_ghr = 0 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN is_declined = 1 AND is_ghr = 1 THEN 1 ELSE 0 END),
+        SUM(CASE WHEN is_declined = 1 AND is_ghr = 0 THEN 1 ELSE 0 END)
+    FROM dbo.ghr_position_candidates
+    GROUP BY source_system, position_id;
+
+    MERGE dbo.ghr_submission_summary_state AS t
+    USING (
+        SELECT
+            1 AS id,
+            GETDATE() AS refreshed_at,
+            (SELECT COUNT(*) FROM dbo.ghr_position_candidates) AS candidate_count,
+            (SELECT COUNT(*) FROM dbo.ghr_position_submission_summary) AS position_count
+    ) AS s
+    ON t.id = s.id
+    WHEN MATCHED THEN
+        UPDATE SET refreshed_at = s.refreshed_at, candidate_count = s.candidate_count, position_count = s.position_count
+    WHEN NOT MATCHED THEN
+        INSERT (id, refreshed_at, candidate_count, position_count)
+        VALUES (s.id, s.refreshed_at, s.candidate_count, s.position_count);
+
+    COMMIT TRANSACTION;
+
+    SELECT refreshed_at, candidate_count, position_count
+    FROM dbo.ghr_submission_summary_state
+    WHERE id = 1;
+END
+GO
@@ -0,0 +1,52 @@
+/*
+    History snapshots as checkpoints plus change-log offsets (CHANGES_DB).
+
+    Every saved change used to write a history snapshot holding the whole
+    change log as JSON, so history writes grew with the square of the
+    number of changes. Now:
+
+    - dbo.ghr_changes.seq numbers changes in the order they were saved
+    - a snapshot stores only high_water_seq, the last seq it includes
+    - every HISTORY_CHECKPOINT_EVERY snapshots (and on restore) a
+      checkpoint stores the full change list in snapshot_data as before
+
+    A snapshot's changes are its nearest earlier checkpoint plus the
+    ghr_changes rows after that checkpoint's high_water_seq, up to its own
+    (see api/shared_code/history.py). Existing snapshots keep their full
+    snapshot_data and become checkpoints. The first snapshot saved after
+    this runs is a checkpoint, so existing changes need no backfill.
+
+    The script is idempotent.
+*/
+
+IF COL_LENGTH('dbo.ghr_changes', 'seq') IS NULL
+    ALTER TABLE dbo.ghr_changes
+        ADD seq BIGINT IDENTITY(1, 1) NOT NULL;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_ghr_changes_seq'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+    CREATE UNIQUE INDEX UX_ghr_changes_seq
+        ON dbo.ghr_changes (seq);
+GO
+
+IF COL_LENGTH('dbo.ghr_history_snapshots', 'high_water_seq') IS NULL
+    ALTER TABLE dbo.ghr_history_snapshots
+        ADD high_water_seq BIGINT NULL;
+GO
+IF COL_LENGTH('dbo.ghr_history_snapshots', 'is_checkpoint') IS NULL
+    ALTER TABLE dbo.ghr_history_snapshots
+        ADD is_checkpoint BIT NOT NULL
+            CONSTRAINT DF_ghr_history_snapshots_is_checkpoint DEFAULT 1;
+GO
+
+-- Snapshots between checkpoints have no snapshot_data
+ALTER TABLE dbo.ghr_history_snapshots
+    ALTER COLUMN snapshot_data NVARCHAR(MAX) NULL;
+GO
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_history_snapshots_checkpoint'
+               AND object_id = OBJECT_ID('dbo.ghr_history_snapshots'))
+    CREATE INDEX IX_ghr_history_snapshots_checkpoint
+        ON dbo.ghr_history_snapshots (is_checkpoint, id)
+        INCLUDE (high_water_seq);
+GO
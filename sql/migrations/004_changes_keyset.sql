@@ -0,0 +1,58 @@
+/*
+    Indexes for paging and filtering GetChanges (CHANGES_DB).
+
+    GetChanges used to read the whole of dbo.ghr_changes on every page load.
+    It now pages on (timestamp, id) and filters by job, type, user and time,
+    so each of those reads needs an index that can seek on it:
+
+    - IX_ghr_changes_timestamp_id: keyset paging, and ?from= / ?to=
+    - IX_ghr_changes_jobid: ?jobId= (and ?type= within a job)
+    - IX_ghr_changes_type / IX_ghr_changes_user: ?type= / ?user= alone
+
+    ?mode=latest keeps the newest change per (jobid, change_type, state_key).
+    state_key is the lever for lever_update and the candidate for
+    interview_scheduled / candidate_removed. It is persisted here with the
+    same expression GetChanges uses (STATE_KEY_SQL in
+    api/shared_code/current_state.py), so the optimizer can match the
+    expression to the column and read the partitions pre-sorted from
+    IX_ghr_changes_latest. GetChanges works without this script; it just
+    scans.
+
+    The script is idempotent.
+*/
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_changes_timestamp_id'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+    CREATE INDEX IX_ghr_changes_timestamp_id
+        ON dbo.ghr_changes (timestamp, id)
+        INCLUDE (jobid, change_type, user_name);
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_changes_jobid'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+    CREATE INDEX IX_ghr_changes_jobid
+        ON dbo.ghr_changes (jobid, change_type, timestamp, id);
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_changes_type'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+    CREATE INDEX IX_ghr_changes_type
+        ON dbo.ghr_changes (change_type, timestamp, id);
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_changes_user'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+    CREATE INDEX IX_ghr_changes_user
+        ON dbo.ghr_changes (user_name, timestamp, id);
+GO
+
+IF COL_LENGTH('dbo.ghr_changes', 'state_key') IS NULL
+    ALTER TABLE dbo.ghr_changes
+        ADD state_key AS CAST(COALESCE(
+            JSON_VALUE(change_data, '$.leverKey'),
+            JSON_VALUE(change_data, '$.candidateName') + N'|' + JSON_VALUE(change_data, '$.candidateAgency'),
+            N''
+        ) AS NVARCHAR(450)) PERSISTED;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_changes_latest'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+    CREATE INDEX IX_ghr_changes_latest
+        ON dbo.ghr_changes (jobid, change_type, state_key, timestamp DESC, id DESC);
+GO
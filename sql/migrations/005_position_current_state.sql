@@ -0,0 +1,63 @@
+/*
+    Materialized current state per position (CHANGES_DB).
+
+    The front end used to rebuild every position's levers, margin, next
+    step and candidate actions by replaying the whole of dbo.ghr_changes.
+    dbo.position_current_state keeps, per job, only the newest change for
+    each of those (state_json: a JSON array in the GetChanges format), so
+    a page load reads one row per job that has ever been changed.
+
+    SaveChange upserts the job's row in the same transaction as the change,
+    and RestoreHistory rebuilds the table after replacing the changes. This
+    script seeds the table from the existing changes; to regenerate it
+    later, call:
+
+        POST /api/current-state/rebuild
+
+    Run it before deploying the API that writes to the table (SaveChange
+    fails without it). The page falls back to GetChanges ?mode=latest if
+    the read endpoint fails. The script is idempotent.
+*/
+
+IF OBJECT_ID('dbo.position_current_state') IS NULL
+    CREATE TABLE dbo.position_current_state (
+        jobid NVARCHAR(100) NOT NULL,
+        state_json NVARCHAR(MAX) NOT NULL,
+        change_count INT NOT NULL,
+        updated_at DATETIME2 NOT NULL,
+        CONSTRAINT PK_position_current_state PRIMARY KEY (jobid)
+    );
+GO
+
+-- Seed: the newest change per (job, type, state key), as in GetChanges ?mode=latest
+IF NOT EXISTS (SELECT 1 FROM dbo.position_current_state)
+BEGIN
+    WITH ranked AS (
+        SELECT id, timestamp, jobid, change_type, change_data, user_name,
+               ROW_NUMBER() OVER (
+                   PARTITION BY jobid, change_type, CAST(COALESCE(
+                       JSON_VALUE(change_data, '$.leverKey'),
+                       JSON_VALUE(change_data, '$.candidateName') + N'|' + JSON_VALUE(change_data, '$.candidateAgency'),
+                       N''
+                   ) AS NVARCHAR(450))
+                   ORDER BY timestamp DESC, id DESC
+               ) AS rn
+        FROM dbo.ghr_changes
+    )
+    INSERT INTO dbo.position_current_state (jobid, state_json, change_count, updated_at)
+    SELECT j.jobid,
+           (
+               SELECT r.id, r.timestamp, r.jobid AS jobId, r.change_type AS type,
+                      JSON_QUERY(ISNULL(r.change_data, '{}')) AS data, r.user_name AS [user]
+               FROM ranked r
+               WHERE r.rn = 1 AND r.jobid = j.jobid
+               ORDER BY r.timestamp, r.id
+               FOR JSON PATH, INCLUDE_NULL_VALUES
+           ),
+           COUNT(*),
+           SYSUTCDATETIME()
+    FROM ranked j
+    WHERE j.rn = 1
+    GROUP BY j.jobid;
+END
+GO
@@ -0,0 +1,27 @@
+/*
+    Unique change IDs (CHANGES_DB).
+
+    SaveChange and SaveChangeBatch skip changes whose id is already saved,
+    so a client retry after a dropped response cannot insert a change
+    twice. The duplicate check looks the batch's IDs up in one query; this
+    index makes that a seek, and makes a duplicate that slips past the
+    check fail instead of being stored.
+
+    The index is only created when the table holds no duplicate IDs yet.
+    If the SELECT at the end returns rows, remove those duplicates and
+    run the script again. The script is idempotent.
+*/
+
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'UX_ghr_changes_id'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+   AND NOT EXISTS (SELECT id FROM dbo.ghr_changes GROUP BY id HAVING COUNT(*) > 1)
+    CREATE UNIQUE INDEX UX_ghr_changes_id
+        ON dbo.ghr_changes (id);
+GO
+
+-- Any duplicate IDs that kept the index from being created
+SELECT id, COUNT(*) AS copies
+FROM dbo.ghr_changes
+GROUP BY id
+HAVING COUNT(*) > 1;
+GO
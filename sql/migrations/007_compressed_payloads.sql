@@ -0,0 +1,58 @@
+/*
+    Compressed payload columns (CHANGES_DB).
+
+    History checkpoints and large change payloads are written to new
+    VARBINARY(MAX) columns as a format version byte plus zlib (or zstd)
+    compressed JSON; see api/shared_code/payloads.py. Rows written before
+    keep their plain text in snapshot_data / change_data and are read as
+    before, so nothing needs converting. Set PAYLOAD_COMPRESSION=none to
+    keep writing plain text.
+
+    Change payloads under CHANGE_COMPRESS_MIN_BYTES (lever, margin, next
+    step and candidate changes) stay in change_data, where the state_key
+    column from 004_changes_keyset.sql reads them. Only large payloads
+    such as history_update lists are compressed, and their state_key is
+    empty either way.
+
+    Requires 003 and 004. Run it before deploying the API that writes to
+    these columns. The script is idempotent.
+*/
+
+IF COL_LENGTH('dbo.ghr_history_snapshots', 'snapshot_blob') IS NULL
+    ALTER TABLE dbo.ghr_history_snapshots
+        ADD snapshot_blob VARBINARY(MAX) NULL;
+GO
+
+IF COL_LENGTH('dbo.ghr_changes', 'change_blob') IS NULL
+    ALTER TABLE dbo.ghr_changes
+        ADD change_blob VARBINARY(MAX) NULL;
+GO
+
+-- Compressed changes have no change_data. The computed state_key column
+-- depends on it, so it is dropped and re-added around the change.
+IF COLUMNPROPERTY(OBJECT_ID('dbo.ghr_changes'), 'change_data', 'AllowsNull') = 0
+BEGIN
+    IF EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_changes_latest'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+        DROP INDEX IX_ghr_changes_latest ON dbo.ghr_changes;
+    IF COL_LENGTH('dbo.ghr_changes', 'state_key') IS NOT NULL
+        ALTER TABLE dbo.ghr_changes DROP COLUMN state_key;
+
+    ALTER TABLE dbo.ghr_changes
+        ALTER COLUMN change_data NVARCHAR(MAX) NULL;
+END
+GO
+
+IF COL_LENGTH('dbo.ghr_changes', 'state_key') IS NULL
+    ALTER TABLE dbo.ghr_changes
+        ADD state_key AS CAST(COALESCE(
+            JSON_VALUE(change_data, '$.leverKey'),
+            JSON_VALUE(change_data, '$.candidateName') + N'|' + JSON_VALUE(change_data, '$.candidateAgency'),
+            N''
+        ) AS NVARCHAR(450)) PERSISTED;
+GO
+IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = 'IX_ghr_changes_latest'
+               AND object_id = OBJECT_ID('dbo.ghr_changes'))
+    CREATE INDEX IX_ghr_changes_latest
+        ON dbo.ghr_changes (jobid, change_type, state_key, timestamp DESC, id DESC);
+GO
@@ -0,0 +1,28 @@
+/*
+    Version number for the health system mappings (CHANGES_DB).
+
+    Saving mappings used to delete every row of dbo.system_mappings and
+    insert the list again, so a GET in between could see an empty table.
+    The POST now applies only the inserts, updates and deletes that differ,
+    in one transaction, and bumps dbo.system_mappings_state.version when
+    anything changed.
+
+    GET /api/system-mappings returns the version and the page sends it back
+    with its save. A save made against an older version than the stored
+    one is refused with 409 instead of overwriting the other edit.
+
+    The script is idempotent.
+*/
+
+IF OBJECT_ID('dbo.system_mappings_state') IS NULL
+    CREATE TABLE dbo.system_mappings_state (
+        id INT NOT NULL CONSTRAINT PK_system_mappings_state PRIMARY KEY,
+        version INT NOT NULL,
+        updated_at DATETIME2 NOT NULL
+    );
+GO
+
+IF NOT EXISTS (SELECT 1 FROM dbo.system_mappings_state WHERE id = 1)
+    INSERT INTO dbo.system_mappings_state (id, version, updated_at)
+    VALUES (1, 1, SYSUTCDATETIME());
+GO